@@ -9,6 +9,12 @@ __version__ = "0.1.0"
 __author__ = "Your Name"
 __email__ = "your.email@example.com"
 
-from lambda_mcp import main, query_elasticsearch_via_kibana
+__all__ = ["main"]
 
-__all__ = ["main", "query_elasticsearch_via_kibana"]
\ No newline at end of file
+
+def __getattr__(name):
+    # Imported lazily: lambda_mcp loads the tokenizer and all tools on import
+    if name == "main":
+        from lambda_mcp import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
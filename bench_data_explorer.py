@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark of DataExplorer request preparation: per-call HMAC/URL/JSON building
+(the previous implementation) versus the prepared-request path.
+
+Only the client-side work done before a request is sent is measured; no
+network requests are made.
+"""
+import hashlib
+import hmac
+import json
+import time
+import timeit
+import uuid
+
+from lib.data_explorer_client import DataExplorer
+
+SECRET = "example-secret-not-a-real-key"
+MODULE_NAME = "example_module"
+BASE_URL = "https://data-service.example.com/api/v1/service/"
+DBNAME = "order_db"
+SQL = """
+    SELECT shop_id, COUNT(*) AS orders
+    FROM orders
+    WHERE status = "paid"
+    GROUP BY shop_id
+"""
+NUMBER = 50000
+
+
+def legacy_request(base_url: str, module_name: str, secret: str, dbname: str, sql: str):
+    """Headers, URL and body as built per call before prepared requests."""
+    timestamp = str(int(time.time() * 1000))
+    token = hmac.new(secret.encode('utf-8'), timestamp.encode('utf-8'), hashlib.sha256).hexdigest()
+    headers = {
+        "content-type": "application/json",
+        "module-name": module_name,
+        "timestamp": timestamp,
+        "api-token": token,
+        "trace-id": str(uuid.uuid4()),
+    }
+    sql = sql.replace('\n', ' ').replace('"', '%22').replace('\t', ' ').strip()
+    url = f"{base_url.rstrip('/')}{DataExplorer.ENDPOINT_QUERY}/{dbname}"
+    # requests serializes json= payloads like this
+    body = json.dumps({"sql": sql}, allow_nan=False).encode('utf-8')
+    return url, headers, body
+
+
+def check_equivalence(explorer: DataExplorer) -> None:
+    """The prepared path must produce the same token, URL and body as the legacy path."""
+    timestamp = "1700000000000"
+    expected = hmac.new(SECRET.encode('utf-8'), timestamp.encode('utf-8'), hashlib.sha256).hexdigest()
+    assert explorer._sign(timestamp) == expected, "api-token mismatch"
+
+    url, _, body = legacy_request(BASE_URL, MODULE_NAME, SECRET, DBNAME, SQL)
+    prepared = explorer.prepare_query(DBNAME, SQL)
+    assert prepared.url == url, "URL mismatch"
+    assert json.loads(prepared.body) == json.loads(body), "body mismatch"
+
+
+def report(name: str, seconds: float, baseline: float) -> None:
+    per_call_us = seconds / NUMBER * 1e6
+    print(f"{name:<44} {per_call_us:8.2f} us/request  {baseline / seconds:5.2f}x")
+
+
+def main():
+    """Run the benchmark."""
+    explorer = DataExplorer(secret=SECRET, module_name=MODULE_NAME, base_url=BASE_URL)
+    reusing_explorer = DataExplorer(secret=SECRET, module_name=MODULE_NAME, base_url=BASE_URL, token_reuse_ms=1000)
+    check_equivalence(explorer)
+    prepared = explorer.prepare_query(DBNAME, SQL)
+
+    cases = [
+        ("legacy (per-call HMAC/URL/json=)",
+         lambda: legacy_request(BASE_URL, MODULE_NAME, SECRET, DBNAME, SQL)),
+        ("prepared: query_db path",
+         lambda: (explorer._generate_auth_headers(), explorer.prepare_query(DBNAME, SQL))),
+        ("prepared: query_db path + token reuse",
+         lambda: (reusing_explorer._generate_auth_headers(), reusing_explorer.prepare_query(DBNAME, SQL))),
+        ("prepared: execute(prepared) only",
+         lambda: (explorer._generate_auth_headers(), prepared)),
+        ("prepared: execute(prepared) + token reuse",
+         lambda: (reusing_explorer._generate_auth_headers(), prepared)),
+    ]
+
+    print("=" * 70)
+    print(f"DataExplorer request preparation benchmark ({NUMBER} requests, best of 5)")
+    print("=" * 70)
+    baseline = None
+    for name, fn in cases:
+        seconds = min(timeit.repeat(fn, number=NUMBER, repeat=5))
+        if baseline is None:
+            baseline = seconds
+        report(name, seconds, baseline)
+
+
+if __name__ == "__main__":
+    main()
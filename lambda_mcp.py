@@ -5,22 +5,118 @@ Lambda MCP Server - Main Entry Point
 A Model Context Protocol (MCP) server providing various development tools.
 """
 
+import argparse
+import json
+import os
 from fastmcp import FastMCP
+from lib.admission import admission
+from lib.config import registry
+from lib.profiling import get_profiling_reports
 from tools.elasticsearch import register_elasticsearch_tool
 from tools.data_explorer import register_data_explorer_tool
+from tools.schema_search import register_schema_search_tool
+from tools.jobs import register_jobs_tool
 
 
-def main():
-    """Main entry point for the lambda-mcp server."""
+def get_admission_stats() -> str:
+    """
+    Get per-backend admission control usage of this server process.
+
+    Returns:
+        JSON string mapping backend key to limits, active, waiting and rejected request counts
+    """
+    return json.dumps(admission.stats(), indent=2)
+
+
+def get_config_status() -> str:
+    """
+    Get the loaded configuration registry, without secrets.
+
+    Returns:
+        JSON string with the config file path, the last load error, cache TTLs,
+        and the Data Explorer environments and Kibana clusters with their limits
+    """
+    config = registry.get()
+    hidden = ("secret", "username", "password")
+    return json.dumps({
+        "path": registry.path,
+        "loaded_from": config.source,
+        "error": registry.last_error,
+        "cache": config.cache,
+        "data_explorer": {
+            name: {k: v for k, v in env.items() if k not in hidden}
+            for name, env in config.data_explorer.items()
+        },
+        "kibana": {
+            name: {k: v for k, v in cluster.items() if k not in hidden}
+            for name, cluster in config.kibana.items()
+        },
+    }, indent=2)
+
+
+def create_server() -> FastMCP:
+    """Create the FastMCP server with all tools registered."""
+    # Load the configuration registry up front so a broken config file fails at startup
+    registry.get()
+
     # Create FastMCP server
     mcp = FastMCP("Lambda Development Tools")
-    
+
     # Register all tools
     register_elasticsearch_tool(mcp)
     register_data_explorer_tool(mcp)
-    
-    # Run the server
-    mcp.run()
+    register_schema_search_tool(mcp)
+    register_jobs_tool(mcp)
+    mcp.resource("data://server/admission")(get_admission_stats)
+    mcp.resource("data://server/profiling")(get_profiling_reports)
+    mcp.resource("data://server/config")(get_config_status)
+
+    return mcp
+
+
+def create_http_app():
+    """
+    Create the ASGI app for the streamable HTTP transport.
+
+    Used as a uvicorn factory so that every worker process builds its own server.
+    Sessions are stateless so any worker can serve any request.
+    """
+    return create_server().http_app(stateless_http=True)
+
+
+def main():
+    """Main entry point for the lambda-mcp server."""
+    parser = argparse.ArgumentParser(description="Lambda MCP server")
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "http"],
+        default=os.environ.get("LAMBDA_MCP_TRANSPORT", "stdio"),
+        help="Transport to serve (default: stdio)",
+    )
+    parser.add_argument("--host", default=os.environ.get("LAMBDA_MCP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LAMBDA_MCP_PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("LAMBDA_MCP_WORKERS", "1")),
+        help="Worker processes for the http transport (default: 1)",
+    )
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        # Run the server
+        create_server().run()
+        return
+
+    import uvicorn
+
+    uvicorn.run(
+        "lambda_mcp:create_http_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,254 @@
+"""
+Per-backend admission control.
+
+Every backend (a Data Explorer environment or a Kibana cluster) gets a
+concurrency cap and a bounded wait queue, so a burst of agents cannot
+overload a single backend.
+
+The concurrency cap is shared by all server processes on a host: each
+running request holds one of max_concurrency slot files under
+LAMBDA_MCP_CACHE_DIR/admission with an exclusive flock, so `--workers N`
+still sends at most max_concurrency requests to a backend. Locks of a
+crashed process are released by the OS. The wait queue (max_queue) is
+kept per process. Without flock support (Windows) or with
+LAMBDA_MCP_ADMISSION_SCOPE=process the cap applies per process.
+"""
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+from lib.cache_utils import get_cache_dir
+
+# Maximum concurrent requests per backend
+BACKEND_MAX_CONCURRENCY = int(os.environ.get("LAMBDA_MCP_BACKEND_MAX_CONCURRENCY", "4"))
+
+# Maximum requests waiting for a slot per backend before new ones are rejected
+BACKEND_MAX_QUEUE = int(os.environ.get("LAMBDA_MCP_BACKEND_MAX_QUEUE", "16"))
+
+# Seconds a request waits for a slot before it is rejected
+BACKEND_QUEUE_TIMEOUT = float(os.environ.get("LAMBDA_MCP_BACKEND_QUEUE_TIMEOUT", "60"))
+
+# "host": share the concurrency cap across processes via slot files, "process": cap per process
+ADMISSION_SCOPE = os.environ.get("LAMBDA_MCP_ADMISSION_SCOPE", "host").lower()
+
+# Seconds between attempts to take a shared slot held by another process
+_SLOT_POLL_INTERVAL = 0.05
+
+
+class BackendBusy(Exception):
+    """Raised when a backend's queue is full or waiting for a slot timed out."""
+
+
+class SharedSlots:
+    """max_concurrency slot files of one backend, each held with an exclusive flock."""
+
+    def __init__(self, key: str, directory: str):
+        self.prefix = os.path.join(directory, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+    def try_acquire(self, slots: int):
+        """Take a free slot, returning its open file descriptor, or None if all are held."""
+        for index in range(slots):
+            fd = os.open(f"{self.prefix}.{index}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except OSError:
+                os.close(fd)
+        return None
+
+    @staticmethod
+    def release(fd) -> None:
+        # Closing the descriptor releases the flock
+        os.close(fd)
+
+
+class BackendLimiter:
+    """Concurrency cap with a bounded wait queue, usable as a context manager."""
+
+    def __init__(self, key: str, max_concurrency: int, max_queue: int, queue_timeout: float, shared: SharedSlots = None):
+        self.key = key
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.shared = shared
+        self._cond = threading.Condition()
+        self._held = threading.local()
+        # Requests of this process holding or taking a shared slot
+        self._reserved = 0
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _reject(self, message: str):
+        with self._cond:
+            self.rejected += 1
+        raise BackendBusy(message)
+
+    def __enter__(self):
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        with self._cond:
+            if self.waiting >= self.max_queue and self._reserved >= self.max_concurrency:
+                self.rejected += 1
+                raise BackendBusy(
+                    f"Backend '{self.key}' is busy ({self.active} running, {self.waiting} queued). Retry later."
+                )
+            self.waiting += 1
+            acquired = False
+            try:
+                # This process never takes more slots than the cap
+                acquired = self._cond.wait_for(
+                    lambda: self._reserved < self.max_concurrency, timeout=max(0.0, deadline - time.monotonic())
+                )
+                if acquired:
+                    self._reserved += 1
+            finally:
+                if not acquired:
+                    self.waiting -= 1
+
+        if not acquired:
+            self._reject(f"Backend '{self.key}' is busy: no slot after {time.monotonic() - start:.1f}s. Retry later.")
+
+        fd = None
+        if self.shared is not None:
+            # Take one of the slots shared with the other processes on this host
+            while True:
+                fd = self.shared.try_acquire(self.max_concurrency)
+                if fd is not None or time.monotonic() >= deadline:
+                    break
+                time.sleep(min(_SLOT_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+
+        with self._cond:
+            self.waiting -= 1
+            if self.shared is not None and fd is None:
+                self._reserved -= 1
+                self._cond.notify()
+            else:
+                self.active += 1
+        if self.shared is not None and fd is None:
+            self._reject(
+                f"Backend '{self.key}' is busy: all {self.max_concurrency} slots held by server processes "
+                f"after {time.monotonic() - start:.1f}s. Retry later."
+            )
+
+        self._held.fds = getattr(self._held, "fds", []) + [fd]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        fd = self._held.fds.pop()
+        if fd is not None:
+            self.shared.release(fd)
+        with self._cond:
+            self.active -= 1
+            self._reserved -= 1
+            self._cond.notify()
+        return False
+
+    def resize(self, max_concurrency: int, max_queue: int, queue_timeout: float) -> None:
+        """
+        Change the limits in place. Running and queued requests are kept and
+        count against the new limits; when the cap shrinks, new requests wait
+        until enough running ones finish.
+        """
+        with self._cond:
+            self.max_concurrency = max_concurrency
+            self.max_queue = max_queue
+            self.queue_timeout = queue_timeout
+            # A larger cap may admit waiting requests right away
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Return current usage of this backend in this process."""
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "shared": self.shared is not None,
+                "active": self.active,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+            }
+
+
+class AdmissionController:
+    """Registry of per-backend limiters."""
+
+    def __init__(
+        self,
+        max_concurrency: int = BACKEND_MAX_CONCURRENCY,
+        max_queue: int = BACKEND_MAX_QUEUE,
+        queue_timeout: float = BACKEND_QUEUE_TIMEOUT,
+        shared: bool = ADMISSION_SCOPE == "host" and fcntl is not None,
+    ):
+        """
+        Initialize AdmissionController.
+
+        Args:
+            max_concurrency: Default concurrent requests per backend
+            max_queue: Default waiting requests per backend
+            queue_timeout: Default seconds to wait for a slot
+            shared: Share the concurrency cap with other processes via slot files
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._limiters = {}
+        self._overrides = {}
+
+    def configure(self, key: str, max_concurrency: int = None, max_queue: int = None, queue_timeout: float = None) -> None:
+        """
+        Override the limits of one backend.
+
+        An existing limiter is resized in place, so requests that are running
+        or queued when the configuration is reloaded keep counting against the cap.
+        """
+        with self._lock:
+            self._overrides[key] = {
+                "max_concurrency": max_concurrency,
+                "max_queue": max_queue,
+                "queue_timeout": queue_timeout,
+            }
+            limiter = self._limiters.get(key)
+            if limiter is not None:
+                limiter.resize(*self._limits(key))
+
+    def _limits(self, key: str) -> tuple:
+        """(max_concurrency, max_queue, queue_timeout) of a backend, overrides first."""
+        override = self._overrides.get(key, {})
+        return (
+            override.get("max_concurrency") or self.max_concurrency,
+            override.get("max_queue") if override.get("max_queue") is not None else self.max_queue,
+            override.get("queue_timeout") or self.queue_timeout,
+        )
+
+    def limiter(self, key: str) -> BackendLimiter:
+        """Get (or create) the limiter of a backend."""
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = BackendLimiter(
+                    key,
+                    *self._limits(key),
+                    SharedSlots(key, get_cache_dir("admission")) if self.shared else None,
+                )
+                self._limiters[key] = limiter
+            return limiter
+
+    def stats(self) -> dict:
+        """Return usage of every backend seen so far."""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.key: limiter.stats() for limiter in limiters}
+
+
+# Shared admission controller for this process
+admission = AdmissionController()
@@ -0,0 +1,56 @@
+"""
+Common utilities for on-disk caches.
+"""
+import json
+import os
+import tempfile
+
+# Root directory for persisted caches
+CACHE_DIR = os.environ.get(
+    "LAMBDA_MCP_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "lambda-mcp"),
+)
+
+# Directory for results too large to return inline (system temp dir by default).
+# Point all server workers at the same directory when serving over HTTP.
+SPILL_DIR = os.environ.get("LAMBDA_MCP_SPILL_DIR") or None
+if SPILL_DIR:
+    os.makedirs(SPILL_DIR, exist_ok=True)
+
+
+def get_cache_dir(name: str) -> str:
+    """
+    Get (and create) a cache subdirectory.
+
+    Args:
+        name: Subdirectory name under CACHE_DIR
+
+    Returns:
+        Absolute path of the cache subdirectory
+    """
+    path = os.path.join(CACHE_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_json(path: str, default=None):
+    """Read a JSON file, returning default if it does not exist or is corrupt."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json_atomic(path: str, data) -> None:
+    """Write JSON to a file atomically so concurrent readers never see partial content."""
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,327 @@
+"""
+Declarative registry of Data Service environments and Kibana clusters.
+
+The registry is loaded from a TOML file (LAMBDA_MCP_CONFIG, default
+~/.config/lambda-mcp/config.toml) and reloaded when the file changes. It
+describes backends, their connection pool sizes, timeouts, concurrency caps
+and cache TTLs, and holds pre-built Data Explorer clients.
+
+Example config.toml:
+
+    [defaults]
+    timeout = 60            # seconds per request
+    pool_size = 10          # HTTP connections kept per backend
+    max_concurrency = 4     # concurrent requests per backend
+    max_queue = 16          # requests waiting per backend
+    queue_timeout = 60      # seconds a request waits for a slot
+
+    [cache]
+    ddl_ttl = 600
+    schema_index_ttl = 86400
+    es_field_ttl = 3600
+
+    [data_explorer.shopee_sg_test]
+    url = "https://data-service.test.sz.shopee.io/api/v1/service"
+    module_name = "my_module"
+    secret_env = "SG_TEST_SECRET"   # or: secret = "..."
+    max_concurrency = 8
+    token_reuse_ms = 1000           # reuse api-token within 1s buckets (0: sign every request)
+
+    [kibana.sg]
+    url = "https://kibana.sg.example.com"
+    username = "reader"
+    password_env = "KIBANA_SG_PASSWORD"
+    timeout = 120
+
+Without a config file, the built-in environments below are used with
+credentials from environment variables, as before.
+"""
+import json
+import os
+import threading
+import time
+import tomllib
+from typing import Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lib.admission import BACKEND_MAX_CONCURRENCY, BACKEND_MAX_QUEUE, BACKEND_QUEUE_TIMEOUT, admission
+from lib.data_explorer_client import DataExplorer
+
+# Built-in Data Service environments, used when the config file does not define them
+DEFAULT_DATA_EXPLORER_ENVS = {
+    "shopee_sg_test": ("https://data-service.test.sz.shopee.io/api/v1/service"),
+    "shopee_sg_staging": ("https://data-service.staging.sz.shopee.io/api/v1/service"),
+    "shopee_sg_uat": ("https://data-service.uat.sz.shopee.io/api/v1/service"),
+    "shopee_sg_live": ("https://data-service.sz.shopee.io/api/v1/service"),
+    "shopee_cn_live": ("https://cn.entrance.csinfra.shopee.io/dataservice"),
+    "tutid_live": ("http://data-service.sz.tutid.io/api/v1/service"),
+}
+
+CONFIG_PATH = os.environ.get(
+    "LAMBDA_MCP_CONFIG",
+    os.path.join(os.path.expanduser("~"), ".config", "lambda-mcp", "config.toml"),
+)
+
+# Minimum seconds between checks of the config file for changes
+RELOAD_CHECK_INTERVAL = float(os.environ.get("LAMBDA_MCP_CONFIG_RELOAD_INTERVAL", "2"))
+
+_DEFAULTS = {
+    "timeout": 60,
+    "pool_size": 10,
+    "max_concurrency": BACKEND_MAX_CONCURRENCY,
+    "max_queue": BACKEND_MAX_QUEUE,
+    "queue_timeout": BACKEND_QUEUE_TIMEOUT,
+}
+
+_CACHE_DEFAULTS = {
+    "ddl_ttl": int(os.environ.get("LAMBDA_MCP_DDL_CACHE_TTL", "600")),
+    "schema_index_ttl": int(os.environ.get("LAMBDA_MCP_SCHEMA_INDEX_TTL", "86400")),
+    "es_field_ttl": int(os.environ.get("LAMBDA_MCP_ES_FIELD_CACHE_TTL", "3600")),
+}
+
+
+def get_auth_config_from_env(env_name: str) -> Tuple[str, str]:
+    """Get Data Explorer auth config from environment name."""
+    GENERAL_MODULE_NAME_KEY = "DATA_EXPLORER_MODULE_NAME"
+    GENERAL_SECRET_KEY = "DATA_EXPLORER_SECRET"
+    ENV_MODULE_NAME_KEY = f"{env_name.upper()}_DATA_EXPLORER_MODULE_NAME"
+    ENV_SECRET_KEY = f"{env_name.upper()}_DATA_EXPLORER_SECRET"
+
+    general_module_name = os.getenv(GENERAL_MODULE_NAME_KEY, "")
+    general_secret = os.getenv(GENERAL_SECRET_KEY, "")
+    env_module_name = os.getenv(ENV_MODULE_NAME_KEY, general_module_name)
+    env_secret = os.getenv(ENV_SECRET_KEY, general_secret)
+
+    if not env_module_name or not env_secret:
+        if not general_module_name or not general_secret:
+            raise ValueError("Data Explorer authentication configuration is missing.")
+        else:
+            return general_module_name, general_secret
+    else:
+        return env_module_name, env_secret
+
+
+def _secret(entry: dict, key: str) -> str:
+    """Read a secret either inline (key) or from the environment variable named by key_env."""
+    if entry.get(f"{key}_env"):
+        return os.getenv(entry[f"{key}_env"], "")
+    return entry.get(key, "")
+
+
+def _backend_settings(entry: dict, defaults: dict) -> dict:
+    return {name: entry.get(name, default) for name, default in defaults.items()}
+
+
+def _make_session(pool_size: int) -> requests.Session:
+    """Create a requests session with a connection pool of the given size."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class RegistryConfig:
+    """An immutable snapshot of the loaded configuration with pre-built clients."""
+
+    def __init__(self, raw: dict, source: str = None, previous: "RegistryConfig" = None):
+        """
+        Build a configuration snapshot.
+
+        Args:
+            raw: Parsed config file content (empty dict for built-in defaults)
+            source: Path the configuration was loaded from, if any
+            previous: Snapshot being replaced; its connection pools are reused
+                for environments whose pool_size is unchanged
+        """
+        self.source = source
+        defaults = dict(_DEFAULTS, **raw.get("defaults", {}))
+        self.cache = dict(_CACHE_DEFAULTS, **raw.get("cache", {}))
+
+        # Data Service environments: built-ins overridden/extended by the file
+        self.data_explorer = {}
+        entries = {name: {"url": url} for name, url in DEFAULT_DATA_EXPLORER_ENVS.items()}
+        for name, entry in raw.get("data_explorer", {}).items():
+            entries[name] = dict(entries.get(name, {}), **entry)
+        for name, entry in entries.items():
+            env = _backend_settings(entry, defaults)
+            env["url"] = entry["url"]
+            env["module_name"] = entry.get("module_name", "")
+            env["secret"] = _secret(entry, "secret")
+            env["token_reuse_ms"] = entry.get("token_reuse_ms", defaults.get("token_reuse_ms", 0))
+            if not env["module_name"] or not env["secret"]:
+                try:
+                    env["module_name"], env["secret"] = get_auth_config_from_env(name)
+                    env["auth_error"] = None
+                except ValueError as e:
+                    env["auth_error"] = str(e)
+            else:
+                env["auth_error"] = None
+            self.data_explorer[name] = env
+
+        # Kibana clusters from the file, plus LAMBDA_MCP_KIBANA_CLUSTERS for compatibility
+        cluster_entries = {}
+        raw_env_clusters = os.environ.get("LAMBDA_MCP_KIBANA_CLUSTERS", "")
+        if raw_env_clusters:
+            try:
+                cluster_entries.update(json.loads(raw_env_clusters))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON in LAMBDA_MCP_KIBANA_CLUSTERS: {e}")
+        cluster_entries.update(raw.get("kibana", {}))
+        self.kibana = {}
+        for name, entry in cluster_entries.items():
+            cluster = _backend_settings(entry, defaults)
+            cluster["url"] = entry["url"].rstrip("/")
+            cluster["username"] = _secret(entry, "username")
+            cluster["password"] = _secret(entry, "password")
+            self.kibana[name] = cluster
+
+        # Pre-built clients, created after their admission limits are configured
+        self.apply_limits()
+        previous_sessions = previous._sessions if previous is not None else {}
+        self._sessions = {}
+        self._explorers = {}
+        for name, env in self.data_explorer.items():
+            if env["auth_error"]:
+                continue
+            pool_size, session = previous_sessions.get(name, (None, None))
+            if session is None or pool_size != env["pool_size"]:
+                session = _make_session(env["pool_size"])
+            self._sessions[name] = (env["pool_size"], session)
+            self._explorers[name] = DataExplorer(
+                secret=env["secret"],
+                module_name=env["module_name"],
+                base_url=env["url"],
+                limiter=admission.limiter(f"data_explorer:{name}"),
+                session=session,
+                timeout=env["timeout"],
+                token_reuse_ms=env["token_reuse_ms"],
+            )
+
+    def apply_limits(self) -> None:
+        """Configure admission control for every backend in this snapshot."""
+        for name, env in self.data_explorer.items():
+            admission.configure(f"data_explorer:{name}", env["max_concurrency"], env["max_queue"], env["queue_timeout"])
+        for cluster in self.kibana.values():
+            admission.configure(
+                f"elasticsearch:{cluster['url']}", cluster["max_concurrency"], cluster["max_queue"], cluster["queue_timeout"]
+            )
+
+    def close_sessions(self, keep: "RegistryConfig" = None) -> None:
+        """Close the connection pools of this snapshot that are not reused by keep."""
+        kept = {id(session) for _, session in keep._sessions.values()} if keep is not None else set()
+        for _, session in self._sessions.values():
+            if id(session) not in kept:
+                session.close()
+
+    def env_names(self) -> list:
+        """Names of configured Data Service environments."""
+        return list(self.data_explorer.keys())
+
+    def explorer(self, env_name: str) -> DataExplorer:
+        """
+        Get the pre-built DataExplorer client of an environment.
+
+        Raises:
+            ValueError: If the environment is unknown or has no credentials
+        """
+        if env_name not in self.data_explorer:
+            available_envs = ", ".join(self.data_explorer.keys())
+            raise ValueError(f"Invalid env_name '{env_name}'. Available environments: {available_envs}")
+        if env_name not in self._explorers:
+            raise ValueError(self.data_explorer[env_name]["auth_error"])
+        return self._explorers[env_name]
+
+    def kibana_cluster(self, name_or_url: str):
+        """Find a Kibana cluster by name or base URL, or None."""
+        if name_or_url in self.kibana:
+            return self.kibana[name_or_url]
+        url = name_or_url.rstrip("/")
+        for cluster in self.kibana.values():
+            if cluster["url"] == url:
+                return cluster
+        return None
+
+
+class Registry:
+    """Loads the configuration once and hot-reloads it when the file changes."""
+
+    def __init__(self, path: str = CONFIG_PATH, check_interval: float = RELOAD_CHECK_INTERVAL):
+        """
+        Initialize Registry.
+
+        Args:
+            path: Path of the TOML config file (may not exist)
+            check_interval: Minimum seconds between checks for file changes
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._config = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self.last_error = None
+
+    def on_reload(self, callback) -> None:
+        """Register a callback invoked with the new RegistryConfig after every (re)load."""
+        with self._lock:
+            self._listeners.append(callback)
+            config = self._config
+        if config is not None:
+            callback(config)
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def _load(self, mtime, previous: RegistryConfig = None) -> RegistryConfig:
+        if mtime is None:
+            return RegistryConfig({}, previous=previous)
+        with open(self.path, "rb") as f:
+            return RegistryConfig(tomllib.load(f), source=self.path, previous=previous)
+
+    def get(self) -> RegistryConfig:
+        """
+        Get the current configuration, reloading it if the file changed.
+
+        A config file that fails to parse is reported in last_error and the
+        previous configuration is kept.
+        """
+        now = time.monotonic()
+        config = self._config
+        if config is not None and now - self._checked_at < self.check_interval:
+            return config
+
+        with self._lock:
+            self._checked_at = now
+            mtime = self._file_mtime()
+            if self._config is not None and mtime == self._mtime:
+                return self._config
+            previous = self._config
+            try:
+                new_config = self._load(mtime, previous)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                self.last_error = f"Failed to load {self.path}: {e}"
+                if self._config is None:
+                    raise ValueError(self.last_error)
+                return self._config
+            self.last_error = None
+            self._config = new_config
+            self._mtime = mtime
+            listeners = list(self._listeners)
+
+        if previous is not None:
+            # Requests still running on the old snapshot finish; closing only drops pooled connections
+            previous.close_sessions(keep=new_config)
+        for callback in listeners:
+            callback(new_config)
+        return new_config
+
+
+# Shared registry for this process
+registry = Registry()
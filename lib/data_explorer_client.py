@@ -4,10 +4,20 @@ Data Explorer client for querying databases through Data Service API.
 import time
 import hmac
 import hashlib
+import json
 import requests
 import uuid
+from contextlib import nullcontext
 
 
+class PreparedQuery:
+    """A query with its URL and serialized JSON body built once, executable many times."""
+    __slots__ = ("dbname", "url", "body")
+
+    def __init__(self, dbname: str, url: str, body: bytes):
+        self.dbname = dbname
+        self.url = url
+        self.body = body
 
 
 class DataExplorer:
@@ -15,7 +25,8 @@ class DataExplorer:
     ENDPOINT_QUERY = "/query"
     ENDPOINT_EXPLORE = "/explore_db"
 
-    def __init__(self, secret: str, module_name: str, base_url: str):
+    def __init__(self, secret: str, module_name: str, base_url: str, limiter=None, session=None, timeout=None,
+                 token_reuse_ms: int = 0):
         """
         Initialize DataExplorer client.
         
@@ -23,10 +34,38 @@ class DataExplorer:
             secret: Secret key for HMAC authentication
             module_name: Module name for the API request
             base_url: Base URL of the Data Service API
+            limiter: Optional context manager entered around every HTTP request
+                (e.g. a BackendLimiter for admission control)
+            session: Optional requests.Session whose connection pool is reused across requests
+            timeout: Optional request timeout in seconds
+            token_reuse_ms: Reuse the timestamp and api-token within buckets of this many milliseconds
+                instead of signing every request (0 disables; only if the server tolerates timestamps this old)
         """
         self.secret = secret
         self.module_name = module_name
         self.base_url = base_url
+        self.limiter = limiter if limiter is not None else nullcontext()
+        self.http = session if session is not None else requests
+        self.timeout = timeout
+        self.token_reuse_ms = token_reuse_ms
+
+        # Prepared state reused by every request
+        self._hmac = hmac.new(secret.encode('utf-8'), digestmod=hashlib.sha256)
+        self._base_url = base_url.rstrip('/')
+        self._explore_url = f"{self._base_url}{self.ENDPOINT_EXPLORE}"
+        self._query_urls = {}
+        self._headers = {
+            "content-type": "application/json",
+            "module-name": module_name,
+        }
+        # (bucket start in ms, timestamp, token) of the last signed bucket when token_reuse_ms is set
+        self._signed = (None, None, None)
+
+    def _sign(self, timestamp: str) -> str:
+        """HMAC-SHA256 of the timestamp, copied from the pre-keyed state."""
+        hash_obj = self._hmac.copy()
+        hash_obj.update(timestamp.encode('utf-8'))
+        return hash_obj.hexdigest()
 
     def _generate_auth_headers(self) -> dict:
         """
@@ -36,27 +75,43 @@ class DataExplorer:
             Dictionary containing authentication headers
         """
         # Generate timestamp (milliseconds)
-        timestamp = str(int(time.time() * 1000))
-        
-        # Generate HMAC-SHA256 hash as api-token
-        hash_obj = hmac.new(
-            self.secret.encode('utf-8'),
-            timestamp.encode('utf-8'),
-            hashlib.sha256
-        )
-        token = hash_obj.hexdigest()
-        
-        # Generate trace-id
-        trace_id = str(uuid.uuid4())
+        now_ms = int(time.time() * 1000)
+        if self.token_reuse_ms:
+            bucket = now_ms - now_ms % self.token_reuse_ms
+            signed_bucket, timestamp, token = self._signed
+            if signed_bucket != bucket:
+                timestamp = str(bucket)
+                token = self._sign(timestamp)
+                self._signed = (bucket, timestamp, token)
+        else:
+            timestamp = str(now_ms)
+            token = self._sign(timestamp)
+
+        headers = self._headers.copy()
+        headers["timestamp"] = timestamp
+        headers["api-token"] = token
+        headers["trace-id"] = str(uuid.uuid4())
+        return headers
+
+    def prepare_query(self, dbname: str, sql: str) -> PreparedQuery:
+        """
+        Build the URL and JSON body of a query once, for execution with execute().
         
-        # Return headers
-        return {
-            "content-type": "application/json",
-            "module-name": self.module_name,
-            "timestamp": timestamp,
-            "api-token": token,
-            "trace-id": trace_id
-        }
+        Args:
+            dbname: Database name to query
+            sql: SQL query string
+            
+        Returns:
+            PreparedQuery to pass to execute()
+        """
+        # Format SQL (normalize whitespace and quotes)
+        sql = sql.replace('\n', ' ').replace('"', '%22').replace('\t', ' ').strip()
+
+        url = self._query_urls.get(dbname)
+        if url is None:
+            url = self._query_urls.setdefault(dbname, f"{self._base_url}{self.ENDPOINT_QUERY}/{dbname}")
+
+        return PreparedQuery(dbname, url, json.dumps({"sql": sql}).encode('utf-8'))
 
     def query_db(self, dbname: str, sql: str) -> list:
         """
@@ -79,23 +134,27 @@ class DataExplorer:
         Raises:
             Exception: If query fails or returns error
         """
-        # Format SQL (normalize whitespace and quotes)
-        sql = sql.replace('\n', ' ').replace('"', '%22').replace('\t', ' ').strip()
-        
-        # Build URL
-        url = f"{self.base_url.rstrip('/')}{self.ENDPOINT_QUERY}/{dbname}"
+        return self.execute(self.prepare_query(dbname, sql))
+
+    def execute(self, prepared: PreparedQuery) -> list:
+        """
+        Execute a prepared query. Only the auth headers are generated per call.
         
-        # Get authentication headers
+        Args:
+            prepared: Query returned by prepare_query()
+            
+        Returns:
+            List of query results (dict records), as returned by query_db()
+            
+        Raises:
+            Exception: If query fails or returns error
+        """
         headers = self._generate_auth_headers()
         
-        # Set request body
-        payload = {
-            "sql": sql
-        }
-        
         # Send POST request
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            with self.limiter:
+                response = self.http.post(prepared.url, headers=headers, data=prepared.body, timeout=self.timeout)
             if response.status_code != 200:
                 raise Exception(
                     f"HTTP error: {response.status_code}, msg: {response.text}"
@@ -130,15 +189,13 @@ class DataExplorer:
         Raises:
             Exception: If request fails or returns error
         """
-        # Build URL
-        url = f"{self.base_url.rstrip('/')}{self.ENDPOINT_EXPLORE}"
-        
         # Get authentication headers
         headers = self._generate_auth_headers()
         
         # Send GET request
         try:
-            response = requests.get(url, headers=headers)
+            with self.limiter:
+                response = self.http.get(self._explore_url, headers=headers, timeout=self.timeout)
             if response.status_code != 200:
                 raise Exception(
                     f"HTTP error: {response.status_code}, msg: {response.text}"
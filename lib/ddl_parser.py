@@ -0,0 +1,74 @@
+"""
+Parser for MySQL SHOW CREATE TABLE output.
+"""
+import re
+
+_COLUMN_RE = re.compile(r"^\s*`((?:[^`]|``)+)`\s+([A-Za-z]+(?:\s*\([^)]*\))?(?:\s+unsigned)?)(.*)$", re.I)
+_PRIMARY_KEY_RE = re.compile(r"^\s*PRIMARY\s+KEY\s*\((.*)\)", re.I)
+_INDEX_RE = re.compile(r"^\s*(UNIQUE\s+)?(?:KEY|INDEX)\s+`((?:[^`]|``)+)`\s*\((.*)\)", re.I)
+_TABLE_NAME_RE = re.compile(r"CREATE\s+(?:TEMPORARY\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`((?:[^`]|``)+)`", re.I)
+_COMMENT_RE = re.compile(r"COMMENT\s+'((?:[^'\\]|\\.|'')*)'", re.I)
+
+
+def _split_columns(column_list: str) -> list:
+    """Split an index column list like "`a`,`b`(10)" into column names."""
+    return [name.replace("``", "`") for name in re.findall(r"`((?:[^`]|``)+)`", column_list)]
+
+
+def parse_create_table(ddl: str) -> dict:
+    """
+    Parse a CREATE TABLE statement.
+
+    Args:
+        ddl: CREATE TABLE statement as returned by SHOW CREATE TABLE
+
+    Returns:
+        Dictionary with table name, columns, primary key and indexes.
+
+        Example return value:
+        {
+            "table": "users",
+            "columns": [
+                {"name": "id", "type": "int", "nullable": False, "comment": ""},
+                {"name": "name", "type": "varchar(255)", "nullable": True, "comment": "user name"}
+            ],
+            "primary_key": ["id"],
+            "indexes": [{"name": "idx_name", "unique": False, "columns": ["name"]}]
+        }
+    """
+    table_match = _TABLE_NAME_RE.search(ddl or "")
+    result = {
+        "table": table_match.group(1).replace("``", "`") if table_match else "",
+        "columns": [],
+        "primary_key": [],
+        "indexes": [],
+    }
+
+    for line in (ddl or "").splitlines()[1:]:
+        line = line.strip().rstrip(",")
+        column_match = _COLUMN_RE.match(line)
+        if column_match:
+            rest = column_match.group(3)
+            comment_match = _COMMENT_RE.search(rest)
+            result["columns"].append({
+                "name": column_match.group(1).replace("``", "`"),
+                "type": re.sub(r"\s+", " ", column_match.group(2)).lower(),
+                "nullable": "NOT NULL" not in rest.upper(),
+                "comment": comment_match.group(1) if comment_match else "",
+            })
+            continue
+
+        pk_match = _PRIMARY_KEY_RE.match(line)
+        if pk_match:
+            result["primary_key"] = _split_columns(pk_match.group(1))
+            continue
+
+        index_match = _INDEX_RE.match(line)
+        if index_match:
+            result["indexes"].append({
+                "name": index_match.group(2).replace("``", "`"),
+                "unique": bool(index_match.group(1)),
+                "columns": _split_columns(index_match.group(3)),
+            })
+
+    return result
@@ -0,0 +1,44 @@
+"""
+Dispatch of blocking tool functions to worker threads.
+
+FastMCP calls synchronous tools inline on the event loop, so a long query
+would block every other request served by the process. Tools are wrapped
+with run_in_thread so they run on a bounded thread pool instead.
+"""
+import functools
+import os
+
+import anyio
+import anyio.to_thread
+
+# Maximum tool calls running concurrently per server process
+TOOL_MAX_THREADS = int(os.environ.get("LAMBDA_MCP_TOOL_MAX_THREADS", "64"))
+
+# Created on first use, inside the event loop
+_limiter = None
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(TOOL_MAX_THREADS)
+    return _limiter
+
+
+def run_in_thread(fn):
+    """
+    Wrap a blocking function as a coroutine function that runs it on a worker thread.
+
+    The wrapper keeps the signature, annotations and docstring of fn, so it can
+    be registered as a tool in place of fn.
+
+    Example:
+        mcp.tool(run_in_thread(profiled(query_data_explorer)))
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await anyio.to_thread.run_sync(
+            functools.partial(fn, *args, **kwargs), limiter=_get_limiter()
+        )
+
+    return wrapper
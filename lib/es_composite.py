@@ -0,0 +1,162 @@
+"""
+Composite aggregation helpers for exhaustive Elasticsearch bucket retrieval.
+
+A terms/grouping request is rewritten into a composite aggregation and paged
+through with after_key, streaming buckets to a JSON Lines file so memory and
+response size stay bounded regardless of cardinality.
+"""
+import heapq
+import json
+import os
+import tempfile
+
+from lib.cache_utils import SPILL_DIR
+
+COMPOSITE_AGG_NAME = "composite_buckets"
+
+
+def terms_to_composite(body: dict, page_size: int = 1000) -> dict:
+    """
+    Rewrite a (possibly nested) terms aggregation into a composite aggregation.
+
+    The first aggregation of "aggs"/"aggregations" and any single nested terms
+    sub-aggregations become composite sources; sub-aggregations of the
+    innermost terms aggregation are kept as per-bucket metrics.
+
+    Args:
+        body: Search request body with a terms aggregation
+        page_size: Composite page size
+
+    Returns:
+        Dictionary with "sources" (list of {name: {"terms": {...}}}) and "aggs"
+        (metric sub-aggregations)
+
+    Raises:
+        ValueError: If the request has no terms aggregation to rewrite
+    """
+    aggs = body.get("aggs", body.get("aggregations"))
+    if not isinstance(aggs, dict) or len(aggs) != 1:
+        raise ValueError("Request must contain exactly one top-level aggregation")
+
+    sources = []
+    metrics = {}
+    while aggs:
+        if len(aggs) != 1:
+            metrics = aggs
+            break
+        name, agg = next(iter(aggs.items()))
+        if "terms" not in agg:
+            metrics = aggs
+            break
+        terms = {k: v for k, v in agg["terms"].items() if k in ("field", "script", "missing_bucket", "order")}
+        if agg["terms"].get("missing") is not None:
+            terms["missing_bucket"] = True
+        if terms.get("order") not in (None, "asc", "desc"):
+            # Composite sources only support key order
+            terms.pop("order")
+        sources.append({name: {"terms": terms}})
+        aggs = agg.get("aggs", agg.get("aggregations", {}))
+
+    if not sources:
+        raise ValueError("Top-level aggregation is not a terms aggregation")
+    return {"sources": sources, "aggs": metrics, "size": page_size}
+
+
+def build_composite_body(body: dict, composite: dict, after_key: dict = None) -> dict:
+    """Build a search body for one composite page."""
+    agg = {
+        "composite": {
+            "size": composite["size"],
+            "sources": composite["sources"],
+        }
+    }
+    if after_key:
+        agg["composite"]["after"] = after_key
+    if composite["aggs"]:
+        agg["aggs"] = composite["aggs"]
+
+    page_body = {k: v for k, v in body.items() if k not in ("aggs", "aggregations", "size", "from", "sort")}
+    page_body["size"] = 0
+    page_body["track_total_hits"] = False
+    page_body["aggs"] = {COMPOSITE_AGG_NAME: agg}
+    return page_body
+
+
+def stream_composite(run_page, body: dict, composite: dict, max_buckets: int = 0, top_n: int = 20) -> dict:
+    """
+    Page through a composite aggregation and stream all buckets to a JSON Lines file.
+
+    Args:
+        run_page: Callable taking a search body (JSON string) and returning the response
+        body: Original search body (query, runtime mappings, ...)
+        composite: Composite definition from terms_to_composite
+        max_buckets: Stop after this many buckets (0 for no limit)
+        top_n: Number of buckets by doc_count to include in the summary
+
+    Returns:
+        Summary with bucket and page counts, the file path, whether retrieval was
+        complete, and the top buckets by doc_count
+
+    Raises:
+        Exception: Whatever run_page raises; the partially written file is removed
+    """
+    after_key = None
+    bucket_count = 0
+    page_count = 0
+    doc_count = 0
+    complete = True
+    top = []
+
+    out = tempfile.NamedTemporaryFile(
+        mode='w',
+        suffix='.jsonl',
+        delete=False,
+        encoding='utf-8',
+        dir=SPILL_DIR
+    )
+    try:
+        with out:
+            while True:
+                response = run_page(json.dumps(build_composite_body(body, composite, after_key)))
+                page_count += 1
+                result = response.get("aggregations", {}).get(COMPOSITE_AGG_NAME, {})
+                buckets = result.get("buckets", [])
+                consumed = 0
+                for bucket in buckets:
+                    out.write(json.dumps(bucket, ensure_ascii=False))
+                    out.write("\n")
+                    bucket_count += 1
+                    doc_count += bucket.get("doc_count", 0)
+                    entry = (bucket.get("doc_count", 0), bucket_count, bucket)
+                    if len(top) < top_n:
+                        heapq.heappush(top, entry)
+                    elif top_n > 0:
+                        heapq.heappushpop(top, entry)
+                    consumed += 1
+                    if max_buckets and bucket_count >= max_buckets:
+                        break
+
+                after_key = result.get("after_key")
+                last_page = len(buckets) < composite["size"] or after_key is None
+                if max_buckets and bucket_count >= max_buckets:
+                    # Complete only if the cap fell on the last bucket of the last page
+                    complete = consumed == len(buckets) and last_page
+                    break
+                if last_page:
+                    break
+    except BaseException:
+        # A failed page (HTTP error, busy backend) leaves a partial file nobody reports; remove it
+        os.remove(out.name)
+        raise
+    path = out.name
+
+    return {
+        "buckets": bucket_count,
+        "pages": page_count,
+        "doc_count": doc_count,
+        "complete": complete,
+        "path": path,
+        "format": "jsonl",
+        "sources": [next(iter(source)) for source in composite["sources"]],
+        "top_buckets": [entry[2] for entry in sorted(top, key=lambda e: (-e[0], e[1]))],
+    }
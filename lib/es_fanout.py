@@ -0,0 +1,131 @@
+"""
+Concurrent fan-out of one Elasticsearch request to several clusters and
+merging of the per-cluster results.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_fanout(clusters: list, run_one, max_workers: int = 8) -> list:
+    """
+    Run a request on several clusters concurrently.
+
+    Args:
+        clusters: List of cluster dicts with at least a "name" key
+        run_one: Callable taking a cluster dict and returning its result
+        max_workers: Maximum concurrent requests
+
+    Returns:
+        List of {"cluster", "took_ms", "result"} or {"cluster", "took_ms", "error"}, in input order
+    """
+    def timed(cluster):
+        start = time.perf_counter()
+        try:
+            outcome = {"result": run_one(cluster)}
+        except Exception as e:
+            outcome = {"error": str(e)}
+        outcome["cluster"] = cluster["name"]
+        outcome["took_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return outcome
+
+    if not clusters:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(clusters))) as executor:
+        return list(executor.map(timed, clusters))
+
+
+def _total_hits(hits: dict) -> int:
+    total = hits.get("total", 0)
+    if isinstance(total, dict):
+        return total.get("value", 0)
+    return total or 0
+
+
+def _merge_aggregations(per_cluster: dict) -> dict:
+    """Merge bucket aggregations by key, summing doc_count across clusters."""
+    merged = {}
+    for cluster, aggregations in per_cluster.items():
+        for name, agg in aggregations.items():
+            if not isinstance(agg, dict) or not isinstance(agg.get("buckets"), list):
+                continue
+            buckets = merged.setdefault(name, {})
+            for bucket in agg["buckets"]:
+                key = bucket.get("key_as_string", bucket.get("key"))
+                key_id = repr(key)
+                entry = buckets.setdefault(key_id, {"key": key, "doc_count": 0, "clusters": {}})
+                entry["doc_count"] += bucket.get("doc_count", 0)
+                entry["clusters"][cluster] = bucket.get("doc_count", 0)
+    return {
+        name: {"buckets": sorted(buckets.values(), key=lambda b: -b["doc_count"])}
+        for name, buckets in merged.items()
+    }
+
+
+def merge_results(outcomes: list) -> dict:
+    """
+    Merge per-cluster results.
+
+    - Lists (jq output) are concatenated; dict items get a "_cluster" tag
+    - Search responses have their hits concatenated with a "_cluster" tag (sorted by
+      _score when every hit has one) and hit totals summed
+    - _count responses have their counts summed
+    - Bucket aggregations are merged by key with doc_count summed; all aggregations
+      are also kept per cluster
+
+    Returns:
+        Dictionary with "clusters" (per-cluster timing/errors) and the merged fields
+    """
+    merged = {
+        "clusters": [
+            {k: outcome[k] for k in ("cluster", "took_ms", "error") if k in outcome}
+            for outcome in outcomes
+        ]
+    }
+    successes = [outcome for outcome in outcomes if "result" in outcome]
+
+    if successes and all(isinstance(o["result"], list) for o in successes):
+        rows = []
+        for outcome in successes:
+            for item in outcome["result"]:
+                if isinstance(item, dict):
+                    rows.append(dict(item, _cluster=outcome["cluster"]))
+                else:
+                    rows.append({"_cluster": outcome["cluster"], "value": item})
+        merged["results"] = rows
+        return merged
+
+    hits = []
+    total = 0
+    has_hits = False
+    count = None
+    aggregations = {}
+    other = {}
+    for outcome in successes:
+        result = outcome["result"]
+        cluster = outcome["cluster"]
+        if not isinstance(result, dict):
+            other[cluster] = result
+            continue
+        if isinstance(result.get("hits"), dict):
+            has_hits = True
+            total += _total_hits(result["hits"])
+            hits.extend(dict(hit, _cluster=cluster) for hit in result["hits"].get("hits", []))
+        if "count" in result:
+            count = (count or 0) + result["count"]
+        if isinstance(result.get("aggregations"), dict):
+            aggregations[cluster] = result["aggregations"]
+        if not any(k in result for k in ("hits", "count", "aggregations")):
+            other[cluster] = result
+
+    if has_hits:
+        if hits and all(isinstance(hit.get("_score"), (int, float)) for hit in hits):
+            hits.sort(key=lambda hit: -hit["_score"])
+        merged["hits"] = {"total": total, "hits": hits}
+    if count is not None:
+        merged["count"] = count
+    if aggregations:
+        merged["aggregations"] = _merge_aggregations(aggregations)
+        merged["aggregations_by_cluster"] = aggregations
+    if other:
+        merged["results_by_cluster"] = other
+    return merged
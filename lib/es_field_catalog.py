@@ -0,0 +1,156 @@
+"""
+Flattened Elasticsearch field catalog built from _mapping responses.
+
+Catalogs are cached per (Kibana base URL, index pattern), in memory and on
+disk, and refreshed once older than the TTL.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from lib.cache_utils import get_cache_dir, read_json, write_json_atomic
+
+# Seconds before a cached field catalog is rebuilt from _mapping
+ES_FIELD_CACHE_TTL = int(os.environ.get("LAMBDA_MCP_ES_FIELD_CACHE_TTL", "3600"))
+
+
+def _flatten_properties(properties: dict, prefix: str, fields: dict) -> None:
+    """Recursively flatten mapping properties into {path: type}."""
+    for name, definition in (properties or {}).items():
+        path = f"{prefix}{name}"
+        field_type = definition.get("type", "object" if "properties" in definition else "unknown")
+        fields[path] = field_type
+        if "properties" in definition:
+            _flatten_properties(definition["properties"], f"{path}.", fields)
+        # Multi-fields, e.g. "name.keyword"
+        for sub_name, sub_definition in definition.get("fields", {}).items():
+            fields[f"{path}.{sub_name}"] = sub_definition.get("type", "unknown")
+
+
+def flatten_mapping(mapping_response: dict) -> dict:
+    """
+    Flatten a _mapping response.
+
+    Args:
+        mapping_response: Response of GET <index_pattern>/_mapping
+
+    Returns:
+        Dictionary of index name -> {field path: type}
+
+        Example return value:
+        {
+            "logs-2024.01.01": {"message": "text", "message.keyword": "keyword", "user.id": "long"}
+        }
+    """
+    result = {}
+    for index_name, index_body in (mapping_response or {}).items():
+        if not isinstance(index_body, dict):
+            continue
+        mappings = index_body.get("mappings", {})
+        # Pre-7.x mappings are nested under a document type
+        if "properties" not in mappings and len(mappings) == 1:
+            only_value = next(iter(mappings.values()))
+            if isinstance(only_value, dict) and "properties" in only_value:
+                mappings = only_value
+        fields = {}
+        _flatten_properties(mappings.get("properties", {}), "", fields)
+        result[index_name] = fields
+    return result
+
+
+def merge_fields(index_fields: dict) -> dict:
+    """
+    Merge per-index fields into one catalog.
+
+    Returns:
+        Dictionary of field path -> type. Fields mapped with different types in
+        different indices get the types joined with "|" (e.g. "long|keyword").
+    """
+    merged = {}
+    for fields in index_fields.values():
+        for path, field_type in fields.items():
+            merged.setdefault(path, set()).add(field_type)
+    return {path: "|".join(sorted(types)) for path, types in sorted(merged.items())}
+
+
+class FieldCatalog:
+    """Cache of flattened field catalogs per Kibana cluster and index pattern."""
+
+    def __init__(self, cache_dir: str = None, ttl: int = ES_FIELD_CACHE_TTL):
+        """
+        Initialize FieldCatalog.
+
+        Args:
+            cache_dir: Directory where catalogs are persisted
+            ttl: Seconds before a catalog is rebuilt
+        """
+        self.cache_dir = cache_dir or get_cache_dir("es_fields")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._catalogs = {}
+
+    def _path(self, base_url: str, index_pattern: str) -> str:
+        key = hashlib.sha256(f"{base_url.rstrip('/')}\n{index_pattern}".encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, base_url: str, index_pattern: str, fetch_mapping, refresh: bool = False) -> dict:
+        """
+        Get the catalog for an index pattern, rebuilding it when missing or expired.
+
+        Args:
+            base_url: Kibana base URL
+            index_pattern: Index name or pattern (e.g., logs-*)
+            fetch_mapping: Callable returning the _mapping response for index_pattern
+            refresh: Rebuild the catalog regardless of its age
+
+        Returns:
+            Dictionary with "fetched_at", "indices" (index count) and "fields" ({path: type})
+        """
+        key = (base_url.rstrip("/"), index_pattern)
+        path = self._path(base_url, index_pattern)
+        now = time.time()
+
+        if not refresh:
+            with self._lock:
+                catalog = self._catalogs.get(key)
+            if catalog is None or now - catalog.get("fetched_at", 0) >= self.ttl:
+                # Another server process may have rebuilt it meanwhile
+                catalog = read_json(path)
+            if catalog and now - catalog.get("fetched_at", 0) < self.ttl:
+                with self._lock:
+                    self._catalogs[key] = catalog
+                return catalog
+
+        index_fields = flatten_mapping(fetch_mapping())
+        catalog = {
+            "fetched_at": now,
+            "indices": len(index_fields),
+            "fields": merge_fields(index_fields),
+        }
+        write_json_atomic(path, catalog)
+        with self._lock:
+            self._catalogs[key] = catalog
+        return catalog
+
+
+def search_fields(fields: dict, query: str = "", match: str = "substring") -> dict:
+    """
+    Filter a field catalog.
+
+    Args:
+        fields: Dictionary of field path -> type
+        query: Text to match against field paths (case-insensitive), empty matches all
+        match: "prefix" or "substring"
+
+    Returns:
+        Matching subset of fields
+    """
+    if match not in ("prefix", "substring"):
+        raise ValueError(f"Invalid match '{match}', expected 'prefix' or 'substring'")
+    if not query:
+        return fields
+    query = query.lower()
+    if match == "prefix":
+        return {path: t for path, t in fields.items() if path.lower().startswith(query)}
+    return {path: t for path, t in fields.items() if query in path.lower()}
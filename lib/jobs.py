@@ -0,0 +1,293 @@
+"""
+Background job execution for long-running queries.
+
+Jobs run on a bounded thread pool. Each backend key (e.g. a Data Explorer
+environment or a Kibana URL) has its own FIFO queue and a concurrency cap, so
+one busy backend cannot starve the others.
+
+When a state directory is given, job status and results are also written to
+disk so that other server processes sharing the directory can serve
+job_status/job_result for jobs they did not run. State files older than the
+ttl are removed by whichever process sweeps the directory first, including
+files of jobs run by other processes or before a restart.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.cache_utils import read_json, write_json_atomic
+
+# Total worker threads shared by all backends
+JOB_MAX_WORKERS = int(os.environ.get("LAMBDA_MCP_JOB_MAX_WORKERS", "8"))
+
+# Maximum concurrently running jobs per backend key
+JOB_MAX_PER_KEY = int(os.environ.get("LAMBDA_MCP_JOB_MAX_PER_KEY", "2"))
+
+# Seconds finished jobs (and their results) are kept
+JOB_TTL = int(os.environ.get("LAMBDA_MCP_JOB_TTL", "3600"))
+
+# Minimum seconds between scans of the state directory for expired files
+_SWEEP_INTERVAL = 60
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+
+class JobManager:
+    """Bounded worker pool with per-key queues."""
+
+    def __init__(
+        self,
+        max_workers: int = JOB_MAX_WORKERS,
+        max_per_key: int = JOB_MAX_PER_KEY,
+        ttl: int = JOB_TTL,
+        state_dir: str = None,
+    ):
+        """
+        Initialize JobManager.
+
+        Args:
+            max_workers: Total worker threads
+            max_per_key: Maximum running jobs per backend key
+            ttl: Seconds to keep finished jobs
+            state_dir: Optional directory where job state and results are persisted
+        """
+        self.max_per_key = max_per_key
+        self.ttl = ttl
+        self.state_dir = state_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lambda-mcp-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queues = {}
+        self._running = {}
+        self._last_sweep = 0.0
+        self._sweep_state_dir()
+
+    def submit(self, key: str, description: str, func, *args, **kwargs) -> str:
+        """
+        Submit a job.
+
+        Args:
+            key: Backend key used for per-backend queueing
+            description: Human readable description reported by status
+            func: Callable executed on a worker thread; its return value is the job result
+
+        Returns:
+            Job id
+
+        Raises:
+            OSError: If the job state cannot be written to the state directory
+            RuntimeError: If the worker pool is shut down
+        """
+        job_id = uuid.uuid4().hex[:16]
+        job = {
+            "id": job_id,
+            "key": key,
+            "description": description,
+            "status": STATUS_QUEUED,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+            "call": (func, args, kwargs),
+        }
+        self._sweep_state_dir()
+        # Written before the job is queued: if this fails, the job never existed
+        self._persist(self._state(job))
+        with self._lock:
+            self._expire()
+            self._jobs[job_id] = job
+            self._queues.setdefault(key, deque()).append(job_id)
+            try:
+                self._dispatch(key)
+            except Exception:
+                self._discard(job_id)
+                raise
+        return job_id
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    @staticmethod
+    def _state(job: dict) -> dict:
+        """Copy of the persisted fields of a job, safe to serialize without the lock."""
+        return {k: v for k, v in job.items() if k != "call"}
+
+    def _persist(self, state: dict) -> None:
+        """
+        Write job state to the state directory, if any.
+
+        Called without the lock held: serializing a large result must not
+        block status and result calls.
+        """
+        if self.state_dir:
+            write_json_atomic(self._state_path(state["id"]), state)
+
+    def _discard(self, job_id: str) -> None:
+        """Forget a job that could not be started. Caller holds the lock."""
+        job = self._jobs.pop(job_id)
+        queue = self._queues.get(job["key"])
+        if queue and job_id in queue:
+            queue.remove(job_id)
+        if self.state_dir:
+            try:
+                os.remove(self._state_path(job_id))
+            except OSError:
+                pass
+
+    def _dispatch(self, key: str) -> None:
+        """Start queued jobs of a key while under its concurrency cap. Caller holds the lock."""
+        queue = self._queues.get(key)
+        while queue and self._running.get(key, 0) < self.max_per_key:
+            job_id = queue.popleft()
+            self._running[key] = self._running.get(key, 0) + 1
+            try:
+                self._executor.submit(self._run, job_id)
+            except Exception:
+                # e.g. the executor was shut down; leave the job queued
+                self._running[key] -= 1
+                queue.appendleft(job_id)
+                raise
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job["status"] = STATUS_RUNNING
+            job["started_at"] = time.time()
+            func, args, kwargs = job.pop("call")
+            state = self._state(job)
+        try:
+            self._persist(state)
+        except (TypeError, ValueError, OSError):
+            # Other processes see the job as queued until it finishes
+            pass
+        try:
+            result = func(*args, **kwargs)
+            status, error = STATUS_SUCCEEDED, None
+        except Exception as e:
+            result, status, error = None, STATUS_FAILED, str(e)
+
+        # Fields other than these do not change once the job runs
+        finished = {"result": result, "status": status, "error": error, "finished_at": time.time()}
+        try:
+            self._persist(dict(state, **finished))
+        except (TypeError, ValueError, OSError):
+            # Result is not serializable; it is still served from memory
+            pass
+        with self._lock:
+            job.update(finished)
+            self._running[job["key"]] -= 1
+            self._dispatch(job["key"])
+
+    def _expire(self) -> None:
+        """Drop finished jobs older than ttl. Caller holds the lock."""
+        now = time.time()
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and now - job["finished_at"] > self.ttl
+        ]:
+            del self._jobs[job_id]
+            if self.state_dir:
+                try:
+                    os.remove(self._state_path(job_id))
+                except OSError:
+                    pass
+
+    def _sweep_state_dir(self) -> None:
+        """
+        Remove state files not written for ttl seconds, at most every _SWEEP_INTERVAL.
+
+        Covers files of jobs this process does not track: jobs run by other
+        processes and jobs left over from before a restart. Jobs tracked here
+        are expired by _expire. Runs without the lock held.
+        """
+        if not self.state_dir:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < _SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+            tracked = set(self._jobs)
+        try:
+            entries = list(os.scandir(self.state_dir))
+        except OSError:
+            return
+        for entry in entries:
+            job_id, ext = os.path.splitext(entry.name)
+            if ext != ".json" or job_id in tracked:
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+            except OSError:
+                # Removed concurrently by another process
+                continue
+
+    def _get(self, job_id: str) -> dict:
+        job = self._jobs.get(job_id)
+        if job is None and self.state_dir and job_id.isalnum():
+            # Job submitted by another process sharing the state directory
+            job = read_json(self._state_path(job_id))
+            if job and job["finished_at"] is not None and time.time() - job["finished_at"] > self.ttl:
+                job = None
+        if job is None:
+            raise ValueError(f"Unknown or expired job id '{job_id}'")
+        return job
+
+    def status(self, job_id: str) -> dict:
+        """
+        Get job status.
+
+        Returns:
+            Dictionary with status, timestamps, elapsed seconds, queue position
+            (for queued jobs), error and result size (for finished jobs)
+        """
+        with self._lock:
+            job = self._get(job_id)
+            info = {k: job[k] for k in ("id", "key", "description", "status", "submitted_at", "started_at", "finished_at", "error")}
+            queue = self._queues.get(job["key"], ())
+            if job["status"] == STATUS_QUEUED and job_id in self._jobs and job_id in queue:
+                # Dispatched jobs are no longer queued but not marked running yet
+                info["queue_position"] = list(queue).index(job_id) + 1
+            result = job["result"]
+
+        end = info["finished_at"] or time.time()
+        info["elapsed_seconds"] = round(end - (info["started_at"] or info["submitted_at"]), 3)
+        if info["status"] == STATUS_SUCCEEDED:
+            info["result_rows"] = len(result) if isinstance(result, list) else None
+        return info
+
+    def result(self, job_id: str):
+        """
+        Get the result of a finished job.
+
+        Raises:
+            ValueError: If the job is unknown, not finished yet, or failed
+        """
+        with self._lock:
+            job = self._get(job_id)
+            if job["status"] in (STATUS_QUEUED, STATUS_RUNNING):
+                raise ValueError(f"Job '{job_id}' is still {job['status']}")
+            if job["status"] == STATUS_FAILED:
+                raise ValueError(f"Job '{job_id}' failed: {job['error']}")
+            return job["result"]
+
+    def list(self) -> list:
+        """List all known jobs with their status."""
+        with self._lock:
+            job_ids = list(self._jobs)
+        jobs = []
+        for job_id in job_ids:
+            try:
+                jobs.append(self.status(job_id))
+            except ValueError:
+                # Expired meanwhile
+                continue
+        return jobs
@@ -0,0 +1,220 @@
+"""
+Projection pushdown of simple jq filters into Elasticsearch requests.
+
+Simple jq path expressions over search hits are translated into _source
+includes, so only the document fields the filter reads are transferred.
+Anything that cannot be translated safely returns None and the caller falls
+back to fetching the full response. The jq filter is always applied locally
+afterwards and yields exactly what it yields on the full response.
+
+filter_path is deliberately not generated: it drops objects and arrays left
+empty by the projection (e.g. "hits" of a search without hits, or hits
+without any of the requested fields), which changes what jq sees.
+"""
+import json
+import re
+
+# Tokens: identifiers after ".", array iterators/indexes, pipes, commas, braces, colons
+_TOKEN_RE = re.compile(r"""
+    \s*(?:
+        (?P<field>\.[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<quoted>\."(?:[^"\\]|\\.)*")
+      | (?P<iter>\[\])
+      | (?P<index>\[-?\d+\])
+      | (?P<dot>\.)
+      | (?P<pipe>\|)
+      | (?P<comma>,)
+      | (?P<lbrace>\{)
+      | (?P<rbrace>\})
+      | (?P<colon>:)
+      | (?P<key>[A-Za-z_][A-Za-z0-9_]*)
+    )""", re.X)
+
+
+def _tokenize(expression: str):
+    """Tokenize a jq expression, returning None on unsupported syntax."""
+    tokens = []
+    pos = 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if not match or match.end() == pos:
+            return None
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "quoted":
+            kind, value = "field", "." + value[2:-1]
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+def _parse_path(tokens: list, i: int):
+    """
+    Parse a path starting at tokens[i] (".a.b[].c", "." or ".[0]").
+
+    Returns:
+        Tuple of (segments, next index) or (None, i) if no path starts at i.
+        Segments are field names; array steps are recorded as "[]".
+    """
+    segments = []
+    start = i
+    if i < len(tokens) and tokens[i][0] == "dot":
+        i += 1
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "field":
+            segments.append(value[1:])
+        elif kind in ("iter", "index"):
+            segments.append("[]")
+        else:
+            break
+        i += 1
+    if i == start:
+        return None, start
+    return segments, i
+
+
+def extract_paths(expression: str):
+    """
+    Extract absolute field paths read by a simple jq expression.
+
+    Supported grammar:
+        pipeline := stage ("|" stage)*
+        stage    := path ("," path)* | "{" key ":" path ("," key ":" path)* "}"
+
+    Each stage is relative to the previous one, so only the last stage may
+    produce more than one path.
+
+    Returns:
+        List of paths (each a list of segments), or None if the expression
+        is not translatable.
+    """
+    tokens = _tokenize(expression or "")
+    if not tokens:
+        return None
+
+    prefix = []
+    i = 0
+    while True:
+        stage_paths = []
+        if tokens[i][0] == "lbrace":
+            i += 1
+            while True:
+                if i + 1 >= len(tokens) or tokens[i][0] != "key" or tokens[i + 1][0] != "colon":
+                    return None
+                path, i = _parse_path(tokens, i + 2)
+                if path is None:
+                    return None
+                stage_paths.append(path)
+                if i < len(tokens) and tokens[i][0] == "comma":
+                    i += 1
+                    continue
+                if i < len(tokens) and tokens[i][0] == "rbrace":
+                    i += 1
+                    break
+                return None
+        else:
+            while True:
+                path, i = _parse_path(tokens, i)
+                if path is None:
+                    return None
+                stage_paths.append(path)
+                if i < len(tokens) and tokens[i][0] == "comma":
+                    i += 1
+                    continue
+                break
+
+        if i == len(tokens):
+            return [prefix + path for path in stage_paths]
+        if tokens[i][0] != "pipe" or len(stage_paths) != 1:
+            return None
+        prefix = prefix + stage_paths[0]
+        i += 1
+        if i == len(tokens):
+            return None
+
+
+def build_pushdown(paths: list, is_search: bool = True) -> dict:
+    """
+    Translate extracted paths into Elasticsearch request options.
+
+    Only paths under the top-level hits (hits.hits[]._source.<field>...)
+    restrict _source, to their top-level field; any path reading a whole hit,
+    the whole _source or the root of the response keeps the full _source.
+
+    Args:
+        paths: Paths returned by extract_paths
+        is_search: Whether the request is a _search (enables _source includes)
+
+    Returns:
+        Dictionary with "source_includes" (list of _source fields, or None if
+        the whole _source is needed or nothing can be pushed down).
+    """
+    source_includes = []
+    for path in paths:
+        if not path or path[0] == "[]":
+            # Root of the response is required
+            return {"source_includes": None}
+        if path[:2] != ["hits", "hits"]:
+            continue
+        hit_path = path[2:]
+        if hit_path[:1] == ["[]"]:
+            hit_path = hit_path[1:]
+        if not hit_path:
+            # Whole hits are read
+            return {"source_includes": None}
+        if hit_path[0] != "_source":
+            continue
+        if len(hit_path) < 2 or hit_path[1] == "[]":
+            # The whole _source is read
+            return {"source_includes": None}
+        # Include the whole top-level field: filtering deeper would let Elasticsearch
+        # drop array elements left empty by the projection, changing what jq sees
+        source_includes.append(hit_path[1])
+
+    if not is_search or not source_includes:
+        return {"source_includes": None}
+    return {"source_includes": list(dict.fromkeys(source_includes))}
+
+
+def apply_pushdown(path: str, query_json: str, jq_query: str = "", fields: list = None):
+    """
+    Rewrite an Elasticsearch path and query body to push down a projection.
+
+    Args:
+        path: Elasticsearch request path (e.g., index/_search)
+        query_json: JSON query body as string
+        jq_query: jq filter applied to the result afterwards
+        fields: Explicit list of _source fields to fetch
+
+    Returns:
+        Tuple of (path, query_json, applied) where applied describes what was pushed down
+    """
+    applied = {}
+    bare_path = path.split("?", 1)[0]
+    if bare_path.lstrip("/").startswith("_cat"):
+        return path, query_json, applied
+    is_search = bare_path.rstrip("/").endswith("_search")
+
+    pushdown = None
+    if jq_query:
+        paths = extract_paths(jq_query)
+        if paths is not None:
+            pushdown = build_pushdown(paths, is_search)
+
+    source_includes = list(fields) if fields else None
+    if source_includes and pushdown and pushdown["source_includes"]:
+        # Explicit fields plus whatever the jq filter reads
+        source_includes = list(dict.fromkeys(source_includes + pushdown["source_includes"]))
+    elif pushdown and pushdown["source_includes"]:
+        source_includes = pushdown["source_includes"]
+
+    if is_search and source_includes:
+        body = json.loads(query_json or "{}")
+        if isinstance(body, dict) and "_source" not in body:
+            body["_source"] = {"includes": source_includes}
+            query_json = json.dumps(body)
+            applied["_source"] = source_includes
+
+    return path, query_json, applied
@@ -0,0 +1,232 @@
+"""
+Opt-in memory and CPU profiling hooks for tool calls.
+
+When LAMBDA_MCP_PROFILE is enabled, a sampled fraction of tool calls is
+traced with tracemalloc (and optionally cProfile). Each profiled call writes
+a JSON report with duration, traced peak memory, top allocating lines, peak
+RSS and nested phases (e.g. handle_large_response) to the report directory.
+
+tracemalloc is process-wide, so traced peaks of calls running concurrently
+include each other's allocations; use a low concurrency while profiling.
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+from lib.cache_utils import CACHE_DIR
+
+# Enable profiling hooks
+PROFILE_ENABLED = os.environ.get("LAMBDA_MCP_PROFILE", "").lower() in ("1", "true", "yes")
+
+# Fraction of tool calls that are profiled
+PROFILE_SAMPLE_RATE = float(os.environ.get("LAMBDA_MCP_PROFILE_SAMPLE_RATE", "1.0"))
+
+# Also run cProfile on profiled calls
+PROFILE_CPROFILE = os.environ.get("LAMBDA_MCP_PROFILE_CPROFILE", "").lower() in ("1", "true", "yes")
+
+# Directory where per-call reports are written
+PROFILE_DIR = os.environ.get("LAMBDA_MCP_PROFILE_DIR", os.path.join(CACHE_DIR, "profiles"))
+
+# Number of top allocators / functions kept per report
+PROFILE_TOP = int(os.environ.get("LAMBDA_MCP_PROFILE_TOP", "10"))
+
+_local = threading.local()
+_lock = threading.Lock()
+_active_calls = 0
+_started_tracing = False
+_recent = deque(maxlen=50)
+
+
+def _peak_rss_kb():
+    """Peak resident set size of the process in KB, or None if unavailable."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _start_tracing() -> None:
+    global _active_calls, _started_tracing
+    with _lock:
+        _active_calls += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+
+
+def _stop_tracing() -> None:
+    global _active_calls, _started_tracing
+    with _lock:
+        _active_calls -= 1
+        if _active_calls == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def _top_allocators(before, after) -> list:
+    """Lines with the largest net allocation growth between two snapshots."""
+    stats = after.compare_to(before, "lineno")
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff_bytes": stat.size_diff,
+            "count_diff": stat.count_diff,
+        }
+        for stat in stats[:PROFILE_TOP]
+    ]
+
+
+def _write_report(report: dict) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{int(report['started_at'])}-{report['name']}-{report['id']}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def _profile_call(name: str, fn, args, kwargs):
+    """Run fn as the outermost profiled call and write its report."""
+    report = {
+        "id": uuid.uuid4().hex[:8],
+        "name": name,
+        "started_at": time.time(),
+        "phases": [],
+    }
+    _start_tracing()
+    profiler = cProfile.Profile() if PROFILE_CPROFILE else None
+    _local.report = report
+    try:
+        tracemalloc.reset_peak()
+        start_current, _ = tracemalloc.get_traced_memory()
+        before = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        if profiler:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active on a concurrent call
+                profiler = None
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            report["error"] = str(e)
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            report["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            try:
+                current, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                report["traced_peak_bytes"] = peak - start_current
+                report["traced_retained_bytes"] = current - start_current
+                report["top_allocators"] = _top_allocators(before, after)
+                report["peak_rss_kb"] = _peak_rss_kb()
+                if profiler:
+                    stream = io.StringIO()
+                    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP)
+                    report["cprofile"] = stream.getvalue()
+                report["path"] = _write_report(report)
+            except Exception as e:
+                # Profiling is a diagnostic and must never replace the call's result or error
+                report["path"] = None
+                report["report_error"] = f"{type(e).__name__}: {e}"
+            with _lock:
+                _recent.append({k: v for k, v in report.items() if k != "cprofile"})
+    finally:
+        _local.report = None
+        _stop_tracing()
+
+
+def _profile_phase(report: dict, name: str, fn, args, kwargs):
+    """Run fn as a phase inside an already profiled call."""
+    start_current, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        report["phases"].append({
+            "name": name,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "traced_delta_bytes": current - start_current,
+            "traced_peak_so_far_bytes": peak,
+        })
+
+
+def profiled(fn=None, *, name: str = None):
+    """
+    Decorate a function with opt-in profiling.
+
+    The outermost profiled call on a thread is sampled and fully profiled;
+    profiled functions called inside it are recorded as phases of that call.
+    Without LAMBDA_MCP_PROFILE the wrapper calls fn directly.
+
+    Example:
+        mcp.tool(profiled(query_data_explorer))
+
+        @profiled(name="handle_large_response")
+        def handle_large_response(...): ...
+    """
+    if fn is None:
+        return functools.partial(profiled, name=name)
+    call_name = name or fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not PROFILE_ENABLED:
+            return fn(*args, **kwargs)
+        report = getattr(_local, "report", None)
+        if report is not None:
+            return _profile_phase(report, call_name, fn, args, kwargs)
+        if random.random() >= PROFILE_SAMPLE_RATE:
+            return fn(*args, **kwargs)
+        return _profile_call(call_name, fn, args, kwargs)
+
+    return wrapper
+
+
+def get_profiling_reports() -> str:
+    """
+    Get recent tool-call profiling reports.
+
+    Returns:
+        JSON string with profiling settings, peak RSS of the process, the most
+        recent per-call summaries and the top allocators aggregated over them
+    """
+    with _lock:
+        recent = list(_recent)
+
+    allocators = {}
+    for report in recent:
+        for allocator in report.get("top_allocators", []):
+            entry = allocators.setdefault(allocator["location"], {"location": allocator["location"], "size_diff_bytes": 0, "calls": 0})
+            entry["size_diff_bytes"] += allocator["size_diff_bytes"]
+            entry["calls"] += 1
+
+    return json.dumps({
+        "enabled": PROFILE_ENABLED,
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "cprofile": PROFILE_CPROFILE,
+        "report_dir": PROFILE_DIR,
+        "peak_rss_kb": _peak_rss_kb(),
+        "top_allocators": sorted(allocators.values(), key=lambda a: -a["size_diff_bytes"])[:PROFILE_TOP],
+        "recent": [
+            {k: report.get(k) for k in ("name", "started_at", "duration_ms", "traced_peak_bytes", "peak_rss_kb", "error", "path", "report_error")}
+            for report in recent
+        ],
+    }, indent=2)
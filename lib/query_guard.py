@@ -0,0 +1,330 @@
+"""
+Query guardrails for SQL sent through the Data Service API.
+
+Provides LIMIT injection for unbounded SELECT statements and EXPLAIN-based
+cost gating so that accidental full scans do not reach shared databases.
+"""
+import os
+import re
+
+# Default LIMIT injected into unbounded SELECT statements
+DEFAULT_LIMIT = int(os.environ.get("LAMBDA_MCP_QUERY_DEFAULT_LIMIT", "1000"))
+
+# Maximum estimated rows (from EXPLAIN) before a query is rejected or warned about
+MAX_ESTIMATED_ROWS = int(os.environ.get("LAMBDA_MCP_QUERY_MAX_ESTIMATED_ROWS", "1000000"))
+
+# What to do when the estimate exceeds the threshold: "reject" or "warn"
+ON_EXCEED = os.environ.get("LAMBDA_MCP_QUERY_GUARD_ON_EXCEED", "reject")
+
+# MySQL only starts a "--" comment when it is followed by whitespace or the end of input
+_COMMENT_RE = re.compile(r"/\*.*?\*/|--(?=\s|$)[^\n]*|#[^\n]*", re.S)
+# Unquoted identifiers and keywords: a letter or underscore (any script), then word characters
+_WORD_RE = re.compile(r"[^\W\d]\w*")
+_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)(?:\s*,\s*(\d+)|\s+OFFSET\s+(\d+))?", re.I)
+
+# Top-level keywords after which a LIMIT no longer bounds the rows a plan examines
+_NON_STREAMING_WORDS = {"GROUP", "ORDER", "DISTINCT", "DISTINCTROW", "HAVING", "UNION", "INTERSECT", "EXCEPT", "OVER"}
+
+
+class QueryRejected(Exception):
+    """Raised when a query is rejected by the guard."""
+
+
+def _strip_comments(sql: str) -> str:
+    """Remove SQL comments outside of string literals."""
+    out = []
+    pos = 0
+    for match in re.finditer(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`", sql, re.S):
+        out.append(_COMMENT_RE.sub(" ", sql[pos:match.start()]))
+        out.append(match.group(0))
+        pos = match.end()
+    out.append(_COMMENT_RE.sub(" ", sql[pos:]))
+    return "".join(out)
+
+
+def _top_level_words(sql: str) -> list:
+    """
+    Return upper-cased keywords that appear at parenthesis depth 0,
+    ignoring anything inside string literals or quoted identifiers.
+    """
+    return [word for word, _ in _top_level_tokens(sql)]
+
+
+def _top_level_tokens(sql: str) -> list:
+    """Like _top_level_words, but returns (word, start offset) pairs."""
+    words = []
+    depth = 0
+    i = 0
+    n = len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"', "`"):
+            # Skip quoted section
+            j = i + 1
+            while j < n:
+                if sql[j] == "\\" and ch != "`":
+                    j += 2
+                    continue
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            i = j + 1
+        elif ch == "(":
+            depth += 1
+            i += 1
+        elif ch == ")":
+            depth -= 1
+            i += 1
+        elif match := _WORD_RE.match(sql, i):
+            if depth == 0:
+                words.append((match.group(0).upper(), i))
+            i = match.end()
+        else:
+            i += 1
+    return words
+
+
+def normalize_sql(sql: str) -> str:
+    """Strip comments, surrounding whitespace and a trailing semicolon."""
+    sql = _strip_comments(sql).strip()
+    while sql.endswith(";"):
+        sql = sql[:-1].rstrip()
+    return sql
+
+
+def analyze_sql(sql: str) -> dict:
+    """
+    Analyze a SQL statement.
+
+    Args:
+        sql: SQL query string
+
+    Returns:
+        Dictionary with the normalized statement, its leading keyword,
+        whether it is a SELECT and whether it already has a top-level LIMIT.
+
+    Raises:
+        QueryRejected: If the input contains more than one statement
+    """
+    normalized = normalize_sql(sql)
+    words = _top_level_words(normalized)
+    if ";" in _strip_quoted(normalized):
+        raise QueryRejected("Multiple statements are not allowed")
+
+    statement_type = words[0] if words else ""
+    is_select = statement_type in ("SELECT", "WITH") and "SELECT" in words
+    return {
+        "sql": normalized,
+        "statement_type": statement_type,
+        "is_select": is_select and "INTO" not in words,
+        "has_limit": "LIMIT" in words or "FETCH" in words,
+    }
+
+
+def _strip_quoted(sql: str) -> str:
+    """Remove string literals and quoted identifiers from a statement."""
+    return re.sub(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`", "", sql, flags=re.S)
+
+
+def _locking_clause_start(sql: str):
+    """
+    Offset of a trailing top-level locking clause (FOR UPDATE, FOR SHARE,
+    LOCK IN SHARE MODE), or None if the statement has none.
+    """
+    tokens = _top_level_tokens(sql)
+    for i in range(len(tokens) - 1, 0, -1):
+        word, start = tokens[i - 1]
+        following = tokens[i][0]
+        if (word, following) in (("FOR", "UPDATE"), ("FOR", "SHARE")):
+            return start
+        if word == "LOCK" and following == "IN" and [w for w, _ in tokens[i + 1:i + 3]] == ["SHARE", "MODE"]:
+            return start
+    return None
+
+
+def limit_rows(sql: str):
+    """
+    Rows a streaming plan reads to satisfy the top-level LIMIT (offset + count),
+    or None if the statement has no top-level LIMIT.
+    """
+    tokens = _top_level_tokens(sql)
+    starts = [start for word, start in tokens if word == "LIMIT"]
+    if not starts:
+        return None
+    match = _LIMIT_RE.match(sql, starts[-1])
+    if not match:
+        return None
+    if match.group(2) is not None:
+        # LIMIT offset, count
+        return int(match.group(1)) + int(match.group(2))
+    return int(match.group(1)) + int(match.group(3) or 0)
+
+
+def is_streaming_plan(sql: str, plan: list) -> bool:
+    """
+    Whether the query reads a single table without sorting, grouping or a
+    temporary table, so that execution stops once the LIMIT is reached.
+    """
+    rows = [row for row in plan or [] if isinstance(row, dict)]
+    if len(rows) != 1:
+        return False
+    extra = str(rows[0].get("Extra", rows[0].get("EXTRA", "")) or "")
+    if "Using filesort" in extra or "Using temporary" in extra:
+        return False
+    return not _NON_STREAMING_WORDS.intersection(_top_level_words(sql))
+
+
+def inject_limit(sql: str, limit: int = DEFAULT_LIMIT) -> tuple:
+    """
+    Add a LIMIT clause to unbounded SELECT statements.
+
+    The LIMIT is placed before a trailing locking clause (FOR UPDATE,
+    FOR SHARE, LOCK IN SHARE MODE), where MySQL requires it.
+
+    Args:
+        sql: SQL query string
+        limit: LIMIT value to inject (0 disables injection)
+
+    Returns:
+        Tuple of (sql, injected) where injected tells whether a LIMIT was added
+    """
+    info = analyze_sql(sql)
+    if limit <= 0 or not info["is_select"] or info["has_limit"]:
+        return info["sql"], False
+    sql = info["sql"]
+    locking = _locking_clause_start(sql)
+    if locking is not None:
+        return f"{sql[:locking].rstrip()} LIMIT {int(limit)} {sql[locking:]}", True
+    return f"{sql} LIMIT {int(limit)}", True
+
+
+def _plan_number(row: dict, name: str):
+    """Read a numeric EXPLAIN column (either case), or None if missing or not numeric."""
+    value = row.get(name, row.get(name.upper()))
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_rows(plan: list):
+    """
+    Estimate the number of rows examined from EXPLAIN output.
+
+    MySQL returns one row per table access with a "rows" column. Tables of
+    the same query block (same "id") are joined as nested loops: each table
+    is read once per row that survives the tables before it, i.e. its "rows"
+    times the product of rows * filtered/100 of the earlier tables. Query
+    blocks (subqueries, UNION parts) are added up. Returns None when the plan
+    does not expose row estimates (e.g. Presto text plans).
+    """
+    total = None
+    fanouts = {}
+    for row in plan or []:
+        if not isinstance(row, dict):
+            continue
+        rows = _plan_number(row, "rows")
+        if rows is None:
+            continue
+        filtered = _plan_number(row, "filtered")
+        block = row.get("id", row.get("ID"))
+        fanout = fanouts.get(block, 1.0)
+        total = (total or 0) + fanout * rows
+        fanouts[block] = fanout * rows * (filtered if filtered is not None else 100.0) / 100.0
+    return int(total) if total is not None else None
+
+
+class QueryGuard:
+    """Guard layer in front of DataExplorer.query_db."""
+
+    def __init__(
+        self,
+        explorer,
+        default_limit: int = DEFAULT_LIMIT,
+        max_estimated_rows: int = MAX_ESTIMATED_ROWS,
+        on_exceed: str = ON_EXCEED,
+        explain: bool = True,
+    ):
+        """
+        Initialize QueryGuard.
+
+        Args:
+            explorer: DataExplorer client used to run EXPLAIN and the query
+            default_limit: LIMIT injected into unbounded SELECTs (0 disables)
+            max_estimated_rows: Estimated-row threshold (0 disables the check)
+            on_exceed: "reject" to refuse the query or "warn" to run it anyway
+            explain: Whether to run EXPLAIN before SELECT statements
+        """
+        if on_exceed not in ("reject", "warn"):
+            raise ValueError(f"Invalid on_exceed '{on_exceed}', expected 'reject' or 'warn'")
+        self.explorer = explorer
+        self.default_limit = default_limit
+        self.max_estimated_rows = max_estimated_rows
+        self.on_exceed = on_exceed
+        self.explain = explain
+
+    def check(self, dbname: str, sql: str) -> dict:
+        """
+        Rewrite and cost-check a query without executing it.
+
+        MySQL's EXPLAIN row estimate ignores LIMIT. For streaming single-table
+        plans (no filesort, temporary table, GROUP BY, ORDER BY, ...) the
+        estimate is capped at the rows the LIMIT needs (offset + count).
+
+        Returns:
+            Guard report with the final SQL, whether a LIMIT was injected,
+            the estimated row count and any warnings.
+
+        Raises:
+            QueryRejected: If the estimate exceeds the threshold in reject mode
+        """
+        info = analyze_sql(sql)
+        final_sql, injected = inject_limit(info["sql"], self.default_limit)
+        report = {
+            "sql": final_sql,
+            "limit_injected": injected,
+            "estimated_rows": None,
+            "warnings": [],
+        }
+        if injected:
+            report["warnings"].append(f"No LIMIT found, injected LIMIT {self.default_limit}")
+
+        if self.explain and info["is_select"]:
+            try:
+                plan = self.explorer.query_db(dbname, f"EXPLAIN {final_sql}")
+                estimate = estimate_rows(plan)
+                needed = limit_rows(final_sql)
+                if estimate is not None and needed is not None and needed < estimate and is_streaming_plan(final_sql, plan):
+                    report["warnings"].append(
+                        f"EXPLAIN estimated {estimate} rows; capped at {needed} because the plan stops at the LIMIT"
+                    )
+                    estimate = needed
+                report["estimated_rows"] = estimate
+            except Exception as e:
+                report["warnings"].append(f"EXPLAIN failed, cost unknown: {e}")
+
+        estimate = report["estimated_rows"]
+        if self.max_estimated_rows > 0 and estimate is not None and estimate > self.max_estimated_rows:
+            message = (
+                f"Estimated {estimate} rows examined exceeds threshold "
+                f"{self.max_estimated_rows}"
+            )
+            if self.on_exceed == "reject":
+                raise QueryRejected(f"{message}. Add selective WHERE conditions or use an indexed column.")
+            report["warnings"].append(message)
+
+        return report
+
+    def query_db(self, dbname: str, sql: str) -> dict:
+        """
+        Execute a guarded query.
+
+        Returns:
+            Dictionary with "guard" (the report from check) and "data" (query rows)
+        """
+        report = self.check(dbname, sql)
+        data = self.explorer.query_db(dbname, report["sql"])
+        return {"guard": report, "data": data}
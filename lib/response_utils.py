@@ -5,6 +5,8 @@ import json
 import tempfile
 import os
 from tokenizers import Tokenizer
+from lib.cache_utils import SPILL_DIR
+from lib.profiling import profiled
 
 # Load tokenizer for accurate token counting
 tokenizer = Tokenizer.from_pretrained("gpt2")
@@ -13,6 +15,7 @@ tokenizer = Tokenizer.from_pretrained("gpt2")
 MAX_TOKEN_NUM = int(os.environ.get("LAMBDA_MCP_MAX_TOKEN_NUM", "30000"))
 
 
+@profiled(name="handle_large_response")
 def handle_large_response(data, max_tokens: int = MAX_TOKEN_NUM) -> str:
     """
     Handle potentially large response data.
@@ -34,7 +37,8 @@ def handle_large_response(data, max_tokens: int = MAX_TOKEN_NUM) -> str:
             mode='w',
             suffix='.json',
             delete=False,
-            encoding='utf-8'
+            encoding='utf-8',
+            dir=SPILL_DIR
         ) as temp_file:
             temp_file.write(result_str)
             temp_file_path = temp_file.name
@@ -47,3 +51,35 @@ def handle_large_response(data, max_tokens: int = MAX_TOKEN_NUM) -> str:
         })
     else:
         return result_str
+
+
+def paginate_by_tokens(items: list, offset: int = 0, max_tokens: int = MAX_TOKEN_NUM) -> dict:
+    """
+    Return a page of items that fits within a token budget.
+    
+    Args:
+        items: List of JSON-serializable items
+        offset: Index of the first item of the page
+        max_tokens: Token budget for the page (at least one item is always returned)
+        
+    Returns:
+        Dictionary with the page items, the offset, the offset of the next page
+        (None when this is the last page) and the total item count
+    """
+    page = []
+    used_tokens = 0
+    index = offset
+    while index < len(items):
+        item_tokens = len(tokenizer.encode(json.dumps(items[index], ensure_ascii=False)))
+        if page and used_tokens + item_tokens > max_tokens:
+            break
+        page.append(items[index])
+        used_tokens += item_tokens
+        index += 1
+    
+    return {
+        "offset": offset,
+        "next_offset": index if index < len(items) else None,
+        "total": len(items),
+        "items": page,
+    }
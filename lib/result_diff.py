@@ -0,0 +1,238 @@
+"""
+Incremental re-query support: keep the previous result of a query and report
+only inserted, deleted and changed rows on the next run.
+
+Snapshots are keyed by (tool, arguments) and persisted under the cache
+directory. Rows are identified by caller-provided key columns, or by a hash
+of the whole row when no key is given (in which case a change shows up as a
+deletion plus an insertion).
+
+Incremental re-query fetches rows with watermark >= the last value seen, so
+rows sharing the boundary value are not lost; the re-fetched boundary rows
+are deduplicated by key, which is why a watermark requires key columns.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from lib.cache_utils import get_cache_dir, read_json, write_json_atomic
+
+
+def _canonical(value) -> str:
+    """Serialize a value deterministically."""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def get_field(row, path: str):
+    """Get a (dotted) field from a row, returning None when missing."""
+    value = row
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def row_key(row, key_columns: list) -> str:
+    """Compute the identity of a row from key columns, or a hash of the full row."""
+    if key_columns:
+        return _canonical([get_field(row, column) for column in key_columns])
+    return hashlib.sha1(_canonical(row).encode("utf-8")).hexdigest()
+
+
+def keyed_rows(rows: list, key_columns: list) -> dict:
+    """
+    Map row keys to rows.
+
+    Without key columns, identical rows would share a hash, so repeated rows
+    get their occurrence number appended ("<hash>#1", "<hash>#2", ...) and
+    are counted, inserted and deleted individually.
+    """
+    if key_columns:
+        return {row_key(row, key_columns): row for row in rows}
+    keyed = {}
+    occurrences = {}
+    for row in rows:
+        key = row_key(row, key_columns)
+        seen = occurrences.get(key, 0)
+        occurrences[key] = seen + 1
+        keyed[f"{key}#{seen}" if seen else key] = row
+    return keyed
+
+
+def check_watermark_keys(key_columns: list, watermark_column: str) -> None:
+    """
+    Raise ValueError when a watermark is used without key columns.
+
+    Rows at the watermark are fetched again on every run; without keys they
+    could not be matched to the stored copies.
+    """
+    if watermark_column and not key_columns:
+        raise ValueError(f"Watermark '{watermark_column}' requires key columns to deduplicate re-fetched rows")
+
+
+def compute_diff(previous: dict, current: dict, incremental: bool = False) -> dict:
+    """
+    Compare two keyed snapshots.
+
+    Args:
+        previous: Dictionary of row key -> row from the last run
+        current: Dictionary of row key -> row from this run
+        incremental: current only holds rows newer than the watermark, so rows
+            missing from it are unchanged rather than deleted
+
+    Returns:
+        Dictionary with "inserted" (rows), "deleted" (rows), "changed"
+        (list of {"row", "changed_columns"}) and "counts"
+    """
+    inserted = []
+    changed = []
+    deleted = []
+    for key, row in current.items():
+        old_row = previous.get(key)
+        if old_row is None:
+            inserted.append(row)
+        elif _canonical(old_row) != _canonical(row):
+            if isinstance(row, dict) and isinstance(old_row, dict):
+                columns = sorted(
+                    column for column in set(row) | set(old_row)
+                    if _canonical(row.get(column)) != _canonical(old_row.get(column))
+                )
+            else:
+                columns = []
+            changed.append({"row": row, "changed_columns": columns})
+
+    if not incremental:
+        deleted = [row for key, row in previous.items() if key not in current]
+
+    total = len(previous) + len(inserted) - len(deleted)
+    return {
+        "counts": {
+            "total": total,
+            "inserted": len(inserted),
+            "deleted": len(deleted),
+            "changed": len(changed),
+            "unchanged": total - len(inserted) - len(changed),
+        },
+        "inserted": inserted,
+        "deleted": deleted,
+        "changed": changed,
+    }
+
+
+class DiffStore:
+    """Persisted snapshots of previous query results."""
+
+    def __init__(self, cache_dir: str = None):
+        """
+        Initialize DiffStore.
+
+        Args:
+            cache_dir: Directory where snapshots are persisted
+        """
+        self.cache_dir = cache_dir or get_cache_dir("result_diff")
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def snapshot_id(tool: str, args: dict) -> str:
+        """Identify a snapshot by tool name and query arguments."""
+        return hashlib.sha256(_canonical([tool, args]).encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, snapshot_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{snapshot_id}.json")
+
+    def load(self, snapshot_id: str):
+        """Load a snapshot, or None if there is no previous run."""
+        return read_json(self._path(snapshot_id))
+
+    def reset(self, snapshot_id: str) -> None:
+        """Forget the previous result."""
+        try:
+            os.remove(self._path(snapshot_id))
+        except FileNotFoundError:
+            pass
+
+    def update(self, snapshot_id: str, rows: list, key_columns: list, watermark_column: str = "") -> dict:
+        """
+        Diff rows against the previous snapshot and store the new one.
+
+        Args:
+            snapshot_id: Snapshot identity from snapshot_id()
+            rows: Rows of this run (only rows at or past the watermark in incremental mode)
+            key_columns: Columns identifying a row, empty to use a row hash
+            watermark_column: Column used for incremental re-query; when the
+                previous snapshot has a watermark, rows are merged instead of replaced
+
+        Returns:
+            Diff from compute_diff plus "first_run" and the new "watermark"
+
+        Raises:
+            ValueError: If watermark_column is set without key_columns
+        """
+        check_watermark_keys(key_columns, watermark_column)
+        with self._lock:
+            snapshot = self.load(snapshot_id)
+            first_run = snapshot is None
+            previous = snapshot["rows"] if snapshot else {}
+            incremental = bool(watermark_column) and bool(snapshot and snapshot.get("watermark") is not None)
+
+            current = keyed_rows(rows, key_columns)
+            diff = compute_diff(previous, current, incremental=incremental)
+
+            merged = dict(previous, **current) if incremental else current
+            watermark = snapshot.get("watermark") if snapshot else None
+            if watermark_column:
+                values = [get_field(row, watermark_column) for row in current.values()]
+                values = [v for v in values if v is not None]
+                if values:
+                    newest = max(values)
+                    watermark = newest if watermark is None else max(watermark, newest)
+
+            write_json_atomic(self._path(snapshot_id), {
+                "updated_at": time.time(),
+                "watermark": watermark,
+                "rows": merged,
+            })
+
+        diff["first_run"] = first_run
+        diff["incremental"] = incremental
+        diff["watermark"] = watermark
+        return diff
+
+
+def sql_with_watermark(sql: str, column: str, watermark) -> str:
+    """
+    Wrap a SQL query so it only returns rows at or past the watermark.
+
+    Args:
+        sql: Original SQL query
+        column: Watermark column (e.g. mtime) present in the query output
+        watermark: Highest value seen on the previous run
+
+    Returns:
+        SQL string selecting rows with column >= watermark
+    """
+    if isinstance(watermark, bool) or not isinstance(watermark, (int, float)):
+        watermark = "'" + str(watermark).replace("\\", "\\\\").replace("'", "''") + "'"
+    quoted_column = "`" + column.replace("`", "``") + "`"
+    return f"SELECT * FROM ({sql.strip().rstrip(';')}) AS _incremental WHERE {quoted_column} >= {watermark}"
+
+
+def es_body_with_watermark(body: dict, field: str, watermark) -> dict:
+    """
+    Add a range filter on the watermark field to an Elasticsearch search body.
+
+    Returns:
+        New body whose query only matches documents with field >= watermark
+    """
+    body = dict(body)
+    original_query = body.get("query", {"match_all": {}})
+    body["query"] = {
+        "bool": {
+            "must": [original_query],
+            "filter": [{"range": {field: {"gte": watermark}}}],
+        }
+    }
+    return body
@@ -0,0 +1,316 @@
+"""
+Searchable schema index over databases, tables and columns.
+
+The index is built from the Data Service API (database list, SHOW TABLES and
+SHOW CREATE TABLE), persisted per environment and refreshed incrementally.
+Lookups are served from an in-memory inverted index, which is reloaded when
+another server process sharing the cache directory writes a newer file.
+"""
+import bisect
+import os
+import re
+import threading
+import time
+
+from lib.cache_utils import get_cache_dir, read_json, write_json_atomic
+from lib.ddl_parser import parse_create_table
+from lib.table_profiler import quote_identifier
+
+# Seconds after which an environment is considered stale and refreshed
+SCHEMA_INDEX_TTL = int(os.environ.get("LAMBDA_MCP_SCHEMA_INDEX_TTL", "86400"))
+
+# Seconds after a failed refresh before a stale environment is refreshed automatically again
+SCHEMA_INDEX_RETRY_INTERVAL = int(os.environ.get("LAMBDA_MCP_SCHEMA_INDEX_RETRY_INTERVAL", "600"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Score weights
+_EXACT_NAME_SCORE = 100
+_TOKEN_SCORE = 10
+_PREFIX_SCORE = 4
+_TYPE_SCORE = 1
+_KIND_BONUS = {"table": 3, "column": 2, "database": 1}
+
+
+def tokenize(text: str) -> list:
+    """Split an identifier or query into lower-case alphanumeric tokens."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+class _EnvIndex:
+    """In-memory inverted index of a single environment."""
+
+    def __init__(self, env_name: str, data: dict):
+        self.env_name = env_name
+        self.entries = []
+        self.postings = {}
+        self.type_postings = {}
+
+        for dbname, db in data.get("databases", {}).items():
+            self._add({"kind": "database", "db": dbname}, dbname)
+            for table_name, table in db.get("tables", {}).items():
+                self._add({"kind": "table", "db": dbname, "table": table_name}, table_name)
+                for column_name, column_type in table.get("columns", []):
+                    self._add(
+                        {"kind": "column", "db": dbname, "table": table_name,
+                         "column": column_name, "type": column_type},
+                        column_name,
+                        column_type,
+                    )
+        self.vocabulary = sorted(self.postings)
+
+    def _add(self, entry: dict, name: str, column_type: str = "") -> None:
+        entry["env"] = self.env_name
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        for token in set(tokenize(name)):
+            self.postings.setdefault(token, []).append(entry_id)
+        for token in set(tokenize(column_type)):
+            self.type_postings.setdefault(token, []).append(entry_id)
+
+    def _name(self, entry: dict) -> str:
+        return entry.get("column") or entry.get("table") or entry["db"]
+
+    def search(self, query: str, kind: str = "") -> dict:
+        """Return {entry_id: score} for a query."""
+        scores = {}
+        query_lower = query.strip().lower()
+        for token in tokenize(query):
+            for entry_id in self.postings.get(token, ()):
+                scores[entry_id] = scores.get(entry_id, 0) + _TOKEN_SCORE
+            # Prefix matches over the sorted vocabulary
+            start = bisect.bisect_left(self.vocabulary, token)
+            for word in self.vocabulary[start:]:
+                if not word.startswith(token):
+                    break
+                if word == token:
+                    continue
+                for entry_id in self.postings[word]:
+                    scores[entry_id] = scores.get(entry_id, 0) + _PREFIX_SCORE
+            for entry_id in self.type_postings.get(token, ()):
+                scores[entry_id] = scores.get(entry_id, 0) + _TYPE_SCORE
+
+        for entry_id in list(scores):
+            entry = self.entries[entry_id]
+            if kind and entry["kind"] != kind:
+                del scores[entry_id]
+                continue
+            if self._name(entry).lower() == query_lower:
+                scores[entry_id] += _EXACT_NAME_SCORE
+            scores[entry_id] += _KIND_BONUS[entry["kind"]]
+        return scores
+
+
+class SchemaIndex:
+    """Persisted, incrementally refreshed schema index across environments."""
+
+    def __init__(self, cache_dir: str = None, ttl: int = SCHEMA_INDEX_TTL, retry_interval: int = SCHEMA_INDEX_RETRY_INTERVAL):
+        """
+        Initialize SchemaIndex.
+
+        Args:
+            cache_dir: Directory where per-environment index files are stored
+            ttl: Seconds after which environments and tables are re-fetched
+            retry_interval: Seconds after a failed refresh during which the
+                environment is not considered stale
+        """
+        self.cache_dir = cache_dir or get_cache_dir("schema_index")
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._data = {}
+        self._indexes = {}
+        # mtime of the file each in-memory environment was loaded from or written to
+        self._mtimes = {}
+        self._refreshing = {}
+        self._errors = {}
+        self._failed_at = {}
+
+    def _path(self, env_name: str) -> str:
+        return os.path.join(self.cache_dir, f"{env_name}.json")
+
+    def _file_mtime(self, env_name: str):
+        try:
+            return os.stat(self._path(env_name)).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self, env_name: str) -> None:
+        """
+        Load a persisted environment index from disk if it is not loaded yet
+        or the file is newer than the in-memory copy (e.g. written by another
+        server process). An environment being refreshed by this process is
+        kept, since the refresh writes the file itself.
+        """
+        mtime = self._file_mtime(env_name)
+        with self._lock:
+            if env_name in self._data and (
+                mtime is None or mtime <= self._mtimes.get(env_name, 0)
+                or self._refreshing.get(env_name) is not None
+            ):
+                return
+        data = read_json(self._path(env_name), {"databases": {}, "updated_at": 0})
+        index = _EnvIndex(env_name, data)
+        with self._lock:
+            if self._refreshing.get(env_name) is not None and env_name in self._data:
+                return
+            self._data[env_name] = data
+            self._indexes[env_name] = index
+            self._mtimes[env_name] = mtime or 0
+
+    def is_stale(self, env_name: str) -> bool:
+        """
+        Check whether an environment needs a refresh.
+
+        An environment whose last refresh failed (e.g. missing credentials)
+        is not stale again until retry_interval has passed.
+        """
+        self.load(env_name)
+        now = time.time()
+        with self._lock:
+            if now - self._failed_at.get(env_name, 0) < self.retry_interval:
+                return False
+            return now - self._data[env_name].get("updated_at", 0) > self.ttl
+
+    def status(self) -> dict:
+        """Return per-environment index status."""
+        with self._lock:
+            return {
+                env_name: {
+                    "updated_at": data.get("updated_at", 0),
+                    "databases": len(data.get("databases", {})),
+                    "refreshing": self._refreshing.get(env_name) is not None,
+                    "error": self._errors.get(env_name),
+                }
+                for env_name, data in self._data.items()
+            }
+
+    def refresh(self, env_name: str, explorer, force: bool = False) -> None:
+        """
+        Refresh an environment incrementally.
+
+        Databases and tables that disappeared are dropped; new tables and tables
+        older than ttl (or all tables with force) get their DDL fetched. The index
+        is persisted and rebuilt after each database so progress is never lost.
+
+        Args:
+            env_name: Environment name
+            explorer: DataExplorer client for the environment
+            force: Re-fetch every table regardless of age
+        """
+        self.load(env_name)
+        with self._lock:
+            data = self._data[env_name]
+        now = time.time()
+
+        dbnames = explorer.explore_db()
+        databases = data.setdefault("databases", {})
+        for dbname in list(databases):
+            if dbname not in dbnames:
+                del databases[dbname]
+
+        for dbname in dbnames:
+            try:
+                rows = explorer.query_db(dbname, "SHOW TABLES")
+            except Exception:
+                # Database not accessible with these credentials
+                continue
+            table_names = [next(iter(row.values())) for row in rows if row]
+            db = databases.setdefault(dbname, {"tables": {}})
+            tables = db["tables"]
+            for table_name in list(tables):
+                if table_name not in table_names:
+                    del tables[table_name]
+
+            for table_name in table_names:
+                table = tables.get(table_name)
+                if table and not force and now - table.get("refreshed_at", 0) < self.ttl:
+                    continue
+                try:
+                    result = explorer.query_db(dbname, f"SHOW CREATE TABLE {quote_identifier(table_name)}")
+                except Exception:
+                    continue
+                ddl = result[0].get("Create Table", "") if result else ""
+                columns = parse_create_table(ddl)["columns"]
+                tables[table_name] = {
+                    "columns": [[column["name"], column["type"]] for column in columns],
+                    "refreshed_at": now,
+                }
+
+            self._commit(env_name, data)
+
+        data["updated_at"] = time.time()
+        self._commit(env_name, data)
+
+    def _commit(self, env_name: str, data: dict) -> None:
+        """Persist an environment and swap in a rebuilt inverted index."""
+        write_json_atomic(self._path(env_name), data)
+        mtime = self._file_mtime(env_name)
+        index = _EnvIndex(env_name, data)
+        with self._lock:
+            self._data[env_name] = data
+            self._indexes[env_name] = index
+            self._mtimes[env_name] = mtime or 0
+
+    def refresh_in_background(self, env_name: str, explorer_factory, force: bool = False) -> bool:
+        """
+        Start a background refresh of an environment unless one is running.
+
+        Args:
+            env_name: Environment name
+            explorer_factory: Callable returning a DataExplorer for env_name
+            force: Re-fetch every table regardless of age
+
+        Returns:
+            True if a new refresh was started
+        """
+        with self._lock:
+            if self._refreshing.get(env_name) is not None:
+                return False
+
+            def run():
+                error = None
+                try:
+                    self.refresh(env_name, explorer_factory(env_name), force=force)
+                except Exception as e:
+                    error = str(e)
+                finally:
+                    with self._lock:
+                        self._refreshing[env_name] = None
+                        if error is None:
+                            self._errors.pop(env_name, None)
+                            self._failed_at.pop(env_name, None)
+                        else:
+                            self._errors[env_name] = error
+                            self._failed_at[env_name] = time.time()
+
+            thread = threading.Thread(target=run, name=f"schema-index-{env_name}", daemon=True)
+            self._refreshing[env_name] = thread
+        thread.start()
+        return True
+
+    def search(self, query: str, env_names: list, kind: str = "", limit: int = 20) -> list:
+        """
+        Search loaded environments.
+
+        Args:
+            query: Free text query, matched against database, table and column names
+                (and column types with a lower weight)
+            env_names: Environments to search
+            kind: Restrict results to "database", "table" or "column"
+            limit: Maximum number of results
+
+        Returns:
+            Ranked list of matching entries with their score
+        """
+        for env_name in env_names:
+            self.load(env_name)
+        with self._lock:
+            indexes = [self._indexes[env_name] for env_name in env_names]
+
+        ranked = []
+        for index in indexes:
+            for entry_id, score in index.search(query, kind).items():
+                ranked.append((score, index.entries[entry_id]))
+        ranked.sort(key=lambda item: -item[0])
+        return [dict(entry, score=score) for score, entry in ranked[:limit]]
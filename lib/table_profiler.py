@@ -0,0 +1,106 @@
+"""
+Table profiling through a single pushed-down aggregate SQL query.
+
+The profile (row count, null counts, distinct counts, min/max and top values)
+is computed inside the database so only a small summary crosses the wire.
+"""
+import json
+
+# Types for which MIN/MAX and top values are not meaningful or too expensive
+_LARGE_TYPES = ("blob", "text", "json", "geometry", "point", "linestring", "polygon", "binary", "bit")
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a MySQL identifier with backticks."""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _is_large_type(column_type: str) -> bool:
+    """Check whether a column type is a large/opaque type."""
+    base_type = column_type.split("(")[0].strip().lower()
+    return any(base_type.endswith(t) for t in _LARGE_TYPES)
+
+
+def build_profile_sql(table_name: str, columns: list, sample_rows: int = 100000, top_values: int = 5) -> str:
+    """
+    Build one aggregate SQL statement profiling a table.
+
+    With sampling, the sample is a CTE read once and shared by the aggregates
+    and every top-values subquery, so all statistics describe the same rows.
+    Without sampling (sample_rows=0), each top-values subquery is a separate
+    full-table GROUP BY per column, which is expensive on large tables.
+
+    Args:
+        table_name: Table to profile
+        columns: Column definitions as returned by parse_create_table
+        sample_rows: Profile only the first N rows (0 profiles the whole table)
+        top_values: Number of most frequent values to return per column (0 disables)
+
+    Returns:
+        SQL string producing a single row. Aliases are positional
+        (c0_non_null, c0_distinct, c0_min, c0_max, c0_top, ...) and are
+        decoded by parse_profile_row.
+    """
+    table = quote_identifier(table_name)
+    if sample_rows > 0:
+        prefix = f"WITH s AS (SELECT * FROM {table} LIMIT {int(sample_rows)}) "
+        source = "s"
+    else:
+        prefix = ""
+        source = table
+
+    select_items = ["COUNT(*) AS row_count"]
+    for i, column in enumerate(columns):
+        col = quote_identifier(column["name"])
+        select_items.append(f"COUNT({col}) AS c{i}_non_null")
+        if _is_large_type(column["type"]):
+            continue
+        select_items.append(f"COUNT(DISTINCT {col}) AS c{i}_distinct")
+        select_items.append(f"MIN({col}) AS c{i}_min")
+        select_items.append(f"MAX({col}) AS c{i}_max")
+        if top_values > 0:
+            select_items.append(
+                f"(SELECT JSON_ARRAYAGG(JSON_ARRAY(tv.v, tv.c)) FROM "
+                f"(SELECT {col} AS v, COUNT(*) AS c FROM {source} AS ts "
+                f"GROUP BY {col} ORDER BY c DESC LIMIT {int(top_values)}) AS tv) AS c{i}_top"
+            )
+
+    return f"{prefix}SELECT {', '.join(select_items)} FROM {source} AS p"
+
+
+def parse_profile_row(row: dict, columns: list) -> dict:
+    """
+    Decode the single row returned by build_profile_sql into a per-column profile.
+
+    Args:
+        row: Result row of the profile query
+        columns: Column definitions used to build the query
+
+    Returns:
+        Dictionary with "row_count" and a "columns" list of per-column statistics
+    """
+    row_count = int(row.get("row_count") or 0)
+    profiled_columns = []
+    for i, column in enumerate(columns):
+        non_null = int(row.get(f"c{i}_non_null") or 0)
+        stats = {
+            "name": column["name"],
+            "type": column["type"],
+            "null_count": row_count - non_null,
+            "null_ratio": round((row_count - non_null) / row_count, 4) if row_count else 0.0,
+        }
+        if f"c{i}_distinct" in row:
+            stats["distinct"] = row.get(f"c{i}_distinct")
+            stats["min"] = row.get(f"c{i}_min")
+            stats["max"] = row.get(f"c{i}_max")
+        top = row.get(f"c{i}_top")
+        if isinstance(top, str):
+            try:
+                top = json.loads(top)
+            except ValueError:
+                top = None
+        if top:
+            stats["top_values"] = sorted(top, key=lambda item: item[1], reverse=True)
+        profiled_columns.append(stats)
+
+    return {"row_count": row_count, "columns": profiled_columns}
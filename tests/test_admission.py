@@ -0,0 +1,151 @@
+"""
+Tests for per-backend admission control.
+"""
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from lib.admission import AdmissionController, BackendBusy, BackendLimiter, SharedSlots
+
+
+def _hold(limiter, seconds, started=None):
+    with limiter:
+        if started:
+            started.set()
+        time.sleep(seconds)
+
+
+def test_limiter_caps_concurrency():
+    limiter = BackendLimiter("db", max_concurrency=2, max_queue=10, queue_timeout=5)
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with limiter:
+            with lock:
+                peak.append(limiter.active)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 2
+    assert limiter.stats()["active"] == 0
+
+
+def test_limiter_rejects_when_queue_full():
+    limiter = BackendLimiter("db", max_concurrency=1, max_queue=0, queue_timeout=5)
+    started = threading.Event()
+    holder = threading.Thread(target=_hold, args=(limiter, 0.3, started))
+    holder.start()
+    started.wait()
+    with pytest.raises(BackendBusy):
+        with limiter:
+            pass
+    holder.join()
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_limiter_times_out():
+    limiter = BackendLimiter("db", max_concurrency=1, max_queue=5, queue_timeout=0.1)
+    started = threading.Event()
+    holder = threading.Thread(target=_hold, args=(limiter, 0.5, started))
+    holder.start()
+    started.wait()
+    with pytest.raises(BackendBusy):
+        with limiter:
+            pass
+    holder.join()
+    assert limiter.stats()["waiting"] == 0
+
+
+def test_shared_slots_cap_across_limiters(tmp_path):
+    # Two limiters on the same slot files behave like two server processes
+    first = BackendLimiter("db", 1, 5, 0.2, SharedSlots("db", str(tmp_path)))
+    second = BackendLimiter("db", 1, 5, 0.2, SharedSlots("db", str(tmp_path)))
+    started = threading.Event()
+    holder = threading.Thread(target=_hold, args=(first, 0.6, started))
+    holder.start()
+    started.wait()
+    with pytest.raises(BackendBusy, match="slots held"):
+        with second:
+            pass
+    holder.join()
+    with second:
+        assert second.stats()["active"] == 1
+    assert second.stats()["active"] == 0
+
+
+def test_shared_slots_cap_across_processes(tmp_path):
+    code = (
+        "import sys, time; sys.path.insert(0, '.');"
+        "from lib.admission import BackendLimiter, SharedSlots;"
+        f"limiter = BackendLimiter('db', 1, 5, 1, SharedSlots('db', {str(tmp_path)!r}));"
+        "limiter.__enter__(); print('held', flush=True); time.sleep(1)"
+    )
+    child = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+    try:
+        assert child.stdout.readline().strip() == "held"
+        limiter = BackendLimiter("db", 1, 5, 0.2, SharedSlots("db", str(tmp_path)))
+        with pytest.raises(BackendBusy):
+            with limiter:
+                pass
+        child.wait()
+        # Slots of an exited process are released by the OS
+        with limiter:
+            pass
+    finally:
+        child.kill()
+
+
+def test_controller_applies_overrides():
+    controller = AdmissionController(max_concurrency=4, max_queue=16, queue_timeout=60, shared=False)
+    controller.configure("data_explorer:test", max_concurrency=2, max_queue=0)
+    limiter = controller.limiter("data_explorer:test")
+    assert (limiter.max_concurrency, limiter.max_queue, limiter.queue_timeout) == (2, 0, 60)
+    assert controller.limiter("data_explorer:test") is limiter
+    assert controller.limiter("other").max_concurrency == 4
+
+
+def test_controller_reconfigure_keeps_running_requests():
+    controller = AdmissionController(max_concurrency=2, max_queue=16, queue_timeout=5, shared=False)
+    limiter = controller.limiter("data_explorer:test")
+    started = threading.Event()
+    holder = threading.Thread(target=_hold, args=(limiter, 0.3, started))
+    holder.start()
+    started.wait()
+
+    # A reload resizes the live limiter instead of replacing it
+    controller.configure("data_explorer:test", max_concurrency=1, max_queue=0, queue_timeout=0.05)
+    assert controller.limiter("data_explorer:test") is limiter
+    assert limiter.stats()["active"] == 1
+    with pytest.raises(BackendBusy):
+        with limiter:
+            pass
+    holder.join()
+
+    with limiter:
+        assert limiter.stats()["active"] == 1
+
+
+def test_limiter_resize_admits_waiting_requests():
+    limiter = BackendLimiter("db", max_concurrency=1, max_queue=10, queue_timeout=5)
+    started = threading.Event()
+    holder = threading.Thread(target=_hold, args=(limiter, 1.0, started))
+    holder.start()
+    started.wait()
+
+    admitted = threading.Event()
+    waiter = threading.Thread(target=_hold, args=(limiter, 0, admitted))
+    waiter.start()
+    time.sleep(0.05)
+    assert not admitted.is_set()
+    limiter.resize(2, 10, 5)
+    assert admitted.wait(0.5)
+    waiter.join()
+    holder.join()
@@ -0,0 +1,148 @@
+"""
+Tests for the hot-reloaded backend registry.
+"""
+import os
+
+import pytest
+
+from lib.config import DEFAULT_DATA_EXPLORER_ENVS, Registry, RegistryConfig
+
+CONFIG = """
+[defaults]
+timeout = 30
+
+[cache]
+ddl_ttl = 60
+
+[data_explorer.local]
+url = "https://data-service.example.com/api/v1/service"
+module_name = "example_module"
+secret_env = "TEST_LOCAL_SECRET"
+pool_size = 4
+
+[kibana.sg]
+url = "https://kibana.sg.example.com/"
+username = "reader"
+password_env = "TEST_KIBANA_PASSWORD"
+timeout = 120
+"""
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("LAMBDA_MCP_KIBANA_CLUSTERS", "DATA_EXPLORER_MODULE_NAME", "DATA_EXPLORER_SECRET"):
+        monkeypatch.delenv(name, raising=False)
+    for env_name in DEFAULT_DATA_EXPLORER_ENVS:
+        monkeypatch.delenv(f"{env_name.upper()}_DATA_EXPLORER_MODULE_NAME", raising=False)
+        monkeypatch.delenv(f"{env_name.upper()}_DATA_EXPLORER_SECRET", raising=False)
+    monkeypatch.setenv("TEST_LOCAL_SECRET", "example-secret")
+    monkeypatch.setenv("TEST_KIBANA_PASSWORD", "example-password")
+
+
+def write_config(path, content, mtime_offset=0):
+    path.write_text(content)
+    mtime = os.stat(path).st_mtime + mtime_offset
+    os.utime(path, (mtime, mtime))
+
+
+def test_secret_and_password_env_resolution(tmp_path):
+    path = tmp_path / "config.toml"
+    write_config(path, CONFIG)
+    config = Registry(str(path), check_interval=0).get()
+
+    env = config.data_explorer["local"]
+    assert (env["module_name"], env["secret"], env["timeout"], env["pool_size"]) == ("example_module", "example-secret", 30, 4)
+    assert config.explorer("local").http is config._sessions["local"][1]
+    assert config.cache["ddl_ttl"] == 60
+
+    cluster = config.kibana["sg"]
+    assert (cluster["url"], cluster["username"], cluster["password"], cluster["timeout"]) == (
+        "https://kibana.sg.example.com", "reader", "example-password", 120
+    )
+
+
+def test_builtin_envs_fall_back_to_environment_credentials(monkeypatch):
+    config = RegistryConfig({})
+    assert set(config.env_names()) == set(DEFAULT_DATA_EXPLORER_ENVS)
+    with pytest.raises(ValueError, match="authentication configuration is missing"):
+        config.explorer("shopee_sg_test")
+    with pytest.raises(ValueError, match="Invalid env_name"):
+        config.explorer("nope")
+
+    monkeypatch.setenv("DATA_EXPLORER_MODULE_NAME", "general_module")
+    monkeypatch.setenv("DATA_EXPLORER_SECRET", "general-secret")
+    monkeypatch.setenv("SHOPEE_SG_LIVE_DATA_EXPLORER_SECRET", "live-secret")
+    config = RegistryConfig({})
+    assert config.explorer("shopee_sg_test").module_name == "general_module"
+    assert (config.data_explorer["shopee_sg_test"]["secret"], config.data_explorer["shopee_sg_live"]["secret"]) == (
+        "general-secret", "live-secret"
+    )
+
+
+def test_kibana_cluster_lookup(monkeypatch):
+    monkeypatch.setenv("LAMBDA_MCP_KIBANA_CLUSTERS", '{"id": {"url": "https://kibana.id.example.com"}}')
+    config = RegistryConfig({"kibana": {"sg": {"url": "https://kibana.sg.example.com/", "username": "u", "password": "p"}}})
+    assert config.kibana_cluster("sg")["username"] == "u"
+    assert config.kibana_cluster("https://kibana.sg.example.com/")["username"] == "u"
+    assert config.kibana_cluster("https://kibana.id.example.com")["url"] == "https://kibana.id.example.com"
+    assert config.kibana_cluster("https://kibana.other.example.com") is None
+
+
+def test_reload_on_mtime_change(tmp_path):
+    path = tmp_path / "config.toml"
+    write_config(path, CONFIG)
+    registry = Registry(str(path), check_interval=0)
+    seen = []
+    registry.on_reload(lambda config: seen.append(config.cache["ddl_ttl"]))
+    first = registry.get()
+    assert registry.get() is first
+    assert seen == [60]
+
+    write_config(path, CONFIG.replace("ddl_ttl = 60", "ddl_ttl = 120"), mtime_offset=10)
+    second = registry.get()
+    assert second is not first and second.cache["ddl_ttl"] == 120
+    assert seen == [60, 120]
+
+
+def test_broken_file_keeps_previous_config(tmp_path):
+    path = tmp_path / "config.toml"
+    write_config(path, CONFIG)
+    registry = Registry(str(path), check_interval=0)
+    first = registry.get()
+
+    write_config(path, "[defaults\ntimeout = ", mtime_offset=10)
+    assert registry.get() is first
+    assert registry.last_error.startswith(f"Failed to load {path}")
+
+    write_config(path, CONFIG, mtime_offset=20)
+    assert registry.get() is not first
+    assert registry.last_error is None
+
+
+def test_broken_file_on_first_load_raises(tmp_path):
+    path = tmp_path / "config.toml"
+    write_config(path, "not toml = = =")
+    with pytest.raises(ValueError, match="Failed to load"):
+        Registry(str(path), check_interval=0).get()
+
+
+def test_reload_reuses_or_closes_sessions(tmp_path):
+    path = tmp_path / "config.toml"
+    write_config(path, CONFIG)
+    registry = Registry(str(path), check_interval=0)
+    first = registry.get()
+    session = first.explorer("local").http
+    closed = []
+    session.close = lambda: closed.append(True)
+
+    # Unchanged pool_size: the connection pool is kept
+    write_config(path, CONFIG.replace("timeout = 30", "timeout = 45"), mtime_offset=10)
+    second = registry.get()
+    assert second.explorer("local").http is session
+    assert closed == []
+
+    # New pool_size: a new pool is built and the old one closed
+    write_config(path, CONFIG.replace("pool_size = 4", "pool_size = 8"), mtime_offset=20)
+    third = registry.get()
+    assert third.explorer("local").http is not session
+    assert closed == [True]
@@ -0,0 +1,135 @@
+"""
+Tests for Data Explorer request signing and prepared queries.
+"""
+import hashlib
+import hmac
+
+import pytest
+import requests
+
+from lib import data_explorer_client
+from lib.data_explorer_client import DataExplorer
+
+SECRET = "example-secret"
+BASE_URL = "https://data-service.example.com/api/v1/service/"
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(1700000000.123)
+    monkeypatch.setattr(data_explorer_client, "time", clock)
+    return clock
+
+
+def legacy_token(timestamp: str) -> str:
+    return hmac.new(SECRET.encode("utf-8"), timestamp.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def make_explorer(**kwargs):
+    return DataExplorer(secret=SECRET, module_name="example_module", base_url=BASE_URL, **kwargs)
+
+
+@pytest.mark.parametrize("timestamp", ["1700000000000", "0", "1700000000123"])
+def test_sign_matches_legacy_hmac(timestamp):
+    explorer = make_explorer()
+    assert explorer._sign(timestamp) == legacy_token(timestamp)
+    # The pre-keyed state is copied, not consumed
+    assert explorer._sign(timestamp) == legacy_token(timestamp)
+
+
+def test_signs_every_request_without_reuse(clock):
+    explorer = make_explorer()
+    first = explorer._generate_auth_headers()
+    assert first["timestamp"] == "1700000000123"
+    assert first["api-token"] == legacy_token("1700000000123")
+    assert first["module-name"] == "example_module"
+
+    clock.now = 1700000000.1245
+    second = explorer._generate_auth_headers()
+    assert second["timestamp"] == "1700000000124"
+    assert second["api-token"] == legacy_token("1700000000124")
+    assert second["trace-id"] != first["trace-id"]
+
+
+def test_token_reused_within_bucket(clock):
+    explorer = make_explorer(token_reuse_ms=1000)
+    first = explorer._generate_auth_headers()
+    assert first["timestamp"] == "1700000000000"
+    assert first["api-token"] == legacy_token("1700000000000")
+
+    clock.now = 1700000000.999
+    second = explorer._generate_auth_headers()
+    assert (second["timestamp"], second["api-token"]) == (first["timestamp"], first["api-token"])
+    assert second["trace-id"] != first["trace-id"]
+
+    clock.now = 1700000001.0
+    third = explorer._generate_auth_headers()
+    assert third["timestamp"] == "1700000001000"
+    assert third["api-token"] == legacy_token("1700000001000")
+
+
+@pytest.mark.parametrize("sql", [
+    'SELECT * FROM t WHERE status = "paid"',
+    "SELECT id,\n\tname FROM users WHERE name = '名字'",
+    "  SELECT 1  ",
+])
+def test_prepared_body_matches_requests_json(sql):
+    explorer = make_explorer()
+    prepared = explorer.prepare_query("order_db", sql)
+    formatted = sql.replace("\n", " ").replace('"', "%22").replace("\t", " ").strip()
+    expected = requests.Request("POST", prepared.url, json={"sql": formatted}).prepare()
+    assert prepared.body == expected.body
+    assert prepared.url == "https://data-service.example.com/api/v1/service/query/order_db"
+
+
+def test_query_url_cached_per_database():
+    explorer = make_explorer()
+    first = explorer.prepare_query("order_db", "SELECT 1")
+    assert explorer.prepare_query("order_db", "SELECT 2").url is first.url
+    assert explorer.prepare_query("user_db", "SELECT 1").url.endswith("/query/user_db")
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, payload):
+        self.payload = payload
+        self.posts = []
+
+    def post(self, url, headers, data, timeout):
+        self.posts.append((url, headers, data, timeout))
+        return FakeResponse(self.payload)
+
+
+def test_execute_sends_prepared_request(clock):
+    session = FakeSession({"code": 0, "data": [{"id": 1}]})
+    explorer = make_explorer(session=session, timeout=5)
+    prepared = explorer.prepare_query("order_db", "SELECT id FROM t")
+    assert explorer.execute(prepared) == [{"id": 1}]
+    assert explorer.query_db("order_db", "SELECT id FROM t") == [{"id": 1}]
+    url, headers, data, timeout = session.posts[0]
+    assert (url, data, timeout) == (prepared.url, prepared.body, 5)
+    assert headers["api-token"] == legacy_token(headers["timestamp"])
+
+
+def test_execute_raises_on_query_error():
+    explorer = make_explorer(session=FakeSession({"code": 1, "msg": "syntax error"}))
+    with pytest.raises(Exception, match="syntax error"):
+        explorer.query_db("order_db", "SELEC 1")
@@ -0,0 +1,41 @@
+"""
+Tests for dispatching blocking tools to worker threads.
+"""
+import inspect
+import threading
+import time
+from typing import Annotated
+
+import anyio
+
+from lib.dispatch import run_in_thread
+
+
+def blocking_tool(value: Annotated[int, "A value"], delay: Annotated[float, "Seconds to sleep"] = 0.2) -> str:
+    """Sleep, then report the thread it ran on."""
+    time.sleep(delay)
+    return f"{value}:{threading.current_thread() is threading.main_thread()}"
+
+
+def test_run_in_thread_keeps_signature():
+    wrapped = run_in_thread(blocking_tool)
+    assert inspect.iscoroutinefunction(wrapped)
+    assert inspect.signature(wrapped) == inspect.signature(blocking_tool)
+    assert wrapped.__doc__ == blocking_tool.__doc__
+
+
+def test_run_in_thread_runs_calls_concurrently():
+    wrapped = run_in_thread(blocking_tool)
+    results = []
+
+    async def main():
+        async with anyio.create_task_group() as tg:
+            for i in range(5):
+                async def call(i=i):
+                    results.append(await wrapped(i, delay=0.2))
+                tg.start_soon(call)
+
+    start = time.monotonic()
+    anyio.run(main)
+    assert time.monotonic() - start < 0.8
+    assert sorted(results) == [f"{i}:False" for i in range(5)]
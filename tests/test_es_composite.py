@@ -0,0 +1,99 @@
+"""
+Tests for composite aggregation paging.
+"""
+import json
+import os
+
+import pytest
+
+from lib import es_composite
+from lib.es_composite import COMPOSITE_AGG_NAME, build_composite_body, stream_composite, terms_to_composite
+
+BODY = {"query": {"term": {"status": 1}}, "aggs": {"by_shop": {"terms": {"field": "shop_id", "size": 10}}}}
+
+
+def fake_search(total, page_size, after_key_on_last_page=True):
+    """Serve total buckets in pages, like Elasticsearch's composite aggregation."""
+    requests = []
+
+    def run_page(body_json):
+        body = json.loads(body_json)
+        requests.append(body)
+        composite = body["aggs"][COMPOSITE_AGG_NAME]["composite"]
+        start = composite.get("after", {}).get("by_shop", -1) + 1
+        buckets = [{"key": {"by_shop": k}, "doc_count": k + 1} for k in range(start, min(start + page_size, total))]
+        result = {"buckets": buckets}
+        if buckets and (len(buckets) == page_size or after_key_on_last_page):
+            result["after_key"] = buckets[-1]["key"]
+        return {"aggregations": {COMPOSITE_AGG_NAME: result}}
+
+    return run_page, requests
+
+
+def run(total, page_size, max_buckets=0, **kwargs):
+    composite = terms_to_composite(BODY, page_size=page_size)
+    run_page, requests = fake_search(total, page_size, **kwargs)
+    summary = stream_composite(run_page, BODY, composite, max_buckets=max_buckets, top_n=2)
+    with open(summary["path"], encoding="utf-8") as f:
+        lines = f.readlines()
+    os.remove(summary["path"])
+    assert len(lines) == summary["buckets"]
+    return summary, requests
+
+
+def test_terms_to_composite():
+    composite = terms_to_composite(BODY, page_size=100)
+    assert composite == {"sources": [{"by_shop": {"terms": {"field": "shop_id"}}}], "aggs": {}, "size": 100}
+    body = build_composite_body(BODY, composite, after_key={"by_shop": 5})
+    assert body["size"] == 0 and body["query"] == BODY["query"]
+    assert body["aggs"][COMPOSITE_AGG_NAME]["composite"]["after"] == {"by_shop": 5}
+
+
+def test_terms_to_composite_rejects_non_terms():
+    with pytest.raises(ValueError):
+        terms_to_composite({"aggs": {"avg_price": {"avg": {"field": "price"}}}})
+
+
+def test_stream_all_buckets():
+    summary, requests = run(total=25, page_size=10)
+    assert (summary["buckets"], summary["pages"], summary["complete"]) == (25, 3, True)
+    assert summary["top_buckets"] == [{"key": {"by_shop": 24}, "doc_count": 25}, {"key": {"by_shop": 23}, "doc_count": 24}]
+    assert "after" not in requests[0]["aggs"][COMPOSITE_AGG_NAME]["composite"]
+
+
+@pytest.mark.parametrize("total, page_size, max_buckets, buckets, pages, complete", [
+    # Cap on the last bucket of a short last page
+    (25, 10, 25, 25, 3, True),
+    # Cap in the middle of a page
+    (25, 10, 15, 15, 2, False),
+    # Cap in the middle of the short last page
+    (25, 10, 22, 22, 3, False),
+    # Cap at the end of a full page: more pages may follow
+    (25, 10, 20, 20, 2, False),
+    # Cap beyond the data
+    (25, 10, 100, 25, 3, True),
+])
+def test_stream_completeness_at_cap(total, page_size, max_buckets, buckets, pages, complete):
+    summary, _ = run(total, page_size, max_buckets=max_buckets)
+    assert (summary["buckets"], summary["pages"], summary["complete"]) == (buckets, pages, complete)
+
+
+def test_stream_cap_on_last_page_without_after_key():
+    # Elasticsearch omits after_key once the last page is returned
+    summary, _ = run(total=25, page_size=10, max_buckets=25, after_key_on_last_page=False)
+    assert summary["complete"]
+
+
+def test_stream_failure_removes_partial_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(es_composite, "SPILL_DIR", str(tmp_path))
+    run_page, requests = fake_search(total=25, page_size=10)
+
+    def failing_page(body_json):
+        if len(requests) == 2:
+            raise RuntimeError("HTTP error: 503")
+        return run_page(body_json)
+
+    with pytest.raises(RuntimeError, match="503"):
+        stream_composite(failing_page, BODY, terms_to_composite(BODY, page_size=10))
+    assert len(requests) == 2
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,125 @@
+"""
+Tests for multi-cluster fan-out and result merging.
+"""
+import threading
+import time
+
+from lib.es_fanout import merge_results, run_fanout
+
+
+def ok(cluster, result, took_ms=1.0):
+    return {"cluster": cluster, "took_ms": took_ms, "result": result}
+
+
+def test_run_fanout_keeps_order_and_errors():
+    def run_one(cluster):
+        if cluster["name"] == "bad":
+            raise RuntimeError("connection refused")
+        time.sleep(0.2)
+        return cluster["name"].upper()
+
+    start = time.perf_counter()
+    outcomes = run_fanout([{"name": "sg"}, {"name": "bad"}, {"name": "id"}], run_one)
+    assert time.perf_counter() - start < 0.35
+    assert [o["cluster"] for o in outcomes] == ["sg", "bad", "id"]
+    assert [o.get("result") for o in outcomes] == ["SG", None, "ID"]
+    assert outcomes[1]["error"] == "connection refused"
+    assert all(isinstance(o["took_ms"], float) for o in outcomes)
+
+
+def test_run_fanout_caps_workers():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def run_one(cluster):
+        with lock:
+            running.append(cluster)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(cluster)
+
+    run_fanout([{"name": str(i)} for i in range(6)], run_one, max_workers=2)
+    assert max(peak) == 2
+    assert run_fanout([], run_one) == []
+
+
+def test_merge_jq_lists_tags_clusters():
+    merged = merge_results([ok("sg", [{"id": 1}, 2]), ok("id", [{"id": 3}])])
+    assert merged["results"] == [
+        {"id": 1, "_cluster": "sg"},
+        {"_cluster": "sg", "value": 2},
+        {"id": 3, "_cluster": "id"},
+    ]
+    assert merged["clusters"] == [{"cluster": "sg", "took_ms": 1.0}, {"cluster": "id", "took_ms": 1.0}]
+
+
+def test_merge_hits_sums_totals_and_sorts_by_score():
+    merged = merge_results([
+        ok("sg", {"hits": {"total": {"value": 10, "relation": "eq"}, "hits": [{"_id": "a", "_score": 1.0}]}}),
+        ok("id", {"hits": {"total": 5, "hits": [{"_id": "b", "_score": 2.5}, {"_id": "c", "_score": 0.5}]}}),
+    ])
+    assert merged["hits"]["total"] == 15
+    assert [(h["_id"], h["_cluster"]) for h in merged["hits"]["hits"]] == [("b", "id"), ("a", "sg"), ("c", "id")]
+
+
+def test_merge_hits_without_scores_keeps_cluster_order():
+    merged = merge_results([
+        ok("sg", {"hits": {"total": 1, "hits": [{"_id": "a", "_score": None}]}}),
+        ok("id", {"hits": {"total": 1, "hits": [{"_id": "b", "_score": 3.0}]}}),
+    ])
+    assert [h["_id"] for h in merged["hits"]["hits"]] == ["a", "b"]
+
+
+def test_merge_counts():
+    merged = merge_results([ok("sg", {"count": 7, "_shards": {}}), ok("id", {"count": 5})])
+    assert merged["count"] == 12
+    assert "hits" not in merged and "results_by_cluster" not in merged
+
+
+def test_merge_aggregation_buckets_by_key():
+    merged = merge_results([
+        ok("sg", {"hits": {"total": 0, "hits": []}, "aggregations": {
+            "by_status": {"buckets": [{"key": 1, "doc_count": 5}, {"key": 2, "doc_count": 1}]},
+            "by_day": {"buckets": [{"key": 1700000000000, "key_as_string": "2023-11-14", "doc_count": 2}]},
+            "avg_price": {"value": 3.5},
+        }}),
+        ok("id", {"hits": {"total": 0, "hits": []}, "aggregations": {
+            "by_status": {"buckets": [{"key": 2, "doc_count": 9}]},
+            "by_day": {"buckets": [{"key": 1700000000000, "key_as_string": "2023-11-14", "doc_count": 3}]},
+        }}),
+    ])
+    aggregations = merged["aggregations"]
+    assert aggregations["by_status"]["buckets"] == [
+        {"key": 2, "doc_count": 10, "clusters": {"sg": 1, "id": 9}},
+        {"key": 1, "doc_count": 5, "clusters": {"sg": 5}},
+    ]
+    assert aggregations["by_day"]["buckets"] == [{"key": "2023-11-14", "doc_count": 5, "clusters": {"sg": 2, "id": 3}}]
+    # Metric aggregations are not merged but kept per cluster
+    assert "avg_price" not in aggregations
+    assert merged["aggregations_by_cluster"]["sg"]["avg_price"] == {"value": 3.5}
+
+
+def test_merge_with_errors_and_other_results():
+    merged = merge_results([
+        {"cluster": "bad", "took_ms": 2.0, "error": "timeout"},
+        ok("sg", "plain text"),
+        ok("id", {"acknowledged": True}),
+        ok("my", {"count": 3}),
+    ])
+    assert merged["clusters"][0] == {"cluster": "bad", "took_ms": 2.0, "error": "timeout"}
+    assert merged["results_by_cluster"] == {"sg": "plain text", "id": {"acknowledged": True}}
+    assert merged["count"] == 3
+
+
+def test_merge_all_failed():
+    merged = merge_results([{"cluster": "sg", "took_ms": 1.0, "error": "boom"}])
+    assert merged == {"clusters": [{"cluster": "sg", "took_ms": 1.0, "error": "boom"}]}
+
+
+def test_merge_mixed_list_and_dict_results_not_concatenated():
+    merged = merge_results([ok("sg", [1, 2]), ok("id", {"count": 1})])
+    assert "results" not in merged
+    assert merged["results_by_cluster"] == {"sg": [1, 2]}
+    assert merged["count"] == 1
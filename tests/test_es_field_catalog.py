@@ -0,0 +1,130 @@
+"""
+Tests for the flattened Elasticsearch field catalog.
+"""
+import os
+import time
+
+import pytest
+
+from lib.es_field_catalog import FieldCatalog, flatten_mapping, merge_fields, search_fields
+
+MAPPING = {
+    "logs-2024.01.01": {
+        "mappings": {
+            "properties": {
+                "message": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
+                "user": {"properties": {"id": {"type": "long"}, "geo": {"properties": {"city": {"type": "keyword"}}}}},
+                "tags": {"type": "nested", "properties": {"name": {"type": "keyword"}}},
+            }
+        }
+    },
+    "logs-2024.01.02": {
+        "mappings": {"properties": {"user": {"properties": {"id": {"type": "keyword"}}}}}
+    },
+}
+
+
+def test_flatten_mapping():
+    fields = flatten_mapping(MAPPING)["logs-2024.01.01"]
+    assert fields == {
+        "message": "text",
+        "message.keyword": "keyword",
+        "user": "object",
+        "user.id": "long",
+        "user.geo": "object",
+        "user.geo.city": "keyword",
+        "tags": "nested",
+        "tags.name": "keyword",
+    }
+
+
+def test_flatten_pre_7x_typed_mapping():
+    mapping = {"old-index": {"mappings": {"_doc": {"properties": {"status": {"type": "integer"}}}}}}
+    assert flatten_mapping(mapping) == {"old-index": {"status": "integer"}}
+
+
+def test_flatten_ignores_non_dict_bodies():
+    assert flatten_mapping({"error": "x", "empty": {"mappings": {}}}) == {"empty": {}}
+    assert flatten_mapping(None) == {}
+
+
+def test_merge_fields_joins_conflicting_types():
+    merged = merge_fields(flatten_mapping(MAPPING))
+    assert merged["user.id"] == "keyword|long"
+    assert merged["message.keyword"] == "keyword"
+    assert list(merged) == sorted(merged)
+
+
+@pytest.mark.parametrize("query, match, expected", [
+    ("", "substring", ["message", "message.keyword", "user.id"]),
+    ("USER", "prefix", ["user.id"]),
+    ("keyword", "prefix", []),
+    ("keyword", "substring", ["message.keyword"]),
+    ("e", "substring", ["message", "message.keyword", "user.id"]),
+])
+def test_search_fields(query, match, expected):
+    fields = {"message": "text", "message.keyword": "keyword", "user.id": "long"}
+    assert list(search_fields(fields, query, match)) == expected
+
+
+def test_search_fields_rejects_unknown_match():
+    with pytest.raises(ValueError):
+        search_fields({}, "a", "regex")
+
+
+class FakeMapping:
+    """Counts _mapping fetches."""
+
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.mapping
+
+
+def test_catalog_cached_in_memory_and_refreshed(tmp_path):
+    catalog = FieldCatalog(str(tmp_path), ttl=3600)
+    fetch = FakeMapping(MAPPING)
+    first = catalog.get("https://kibana.example.com/", "logs-*", fetch)
+    assert (first["indices"], first["fields"]["user.id"]) == (2, "keyword|long")
+    assert catalog.get("https://kibana.example.com", "logs-*", fetch) is first
+    assert fetch.calls == 1
+
+    catalog.get("https://kibana.example.com", "logs-*", fetch, refresh=True)
+    assert fetch.calls == 2
+    # Different index patterns are cached separately
+    catalog.get("https://kibana.example.com", "other-*", fetch)
+    assert fetch.calls == 3
+
+
+def test_catalog_expires_after_ttl(tmp_path):
+    catalog = FieldCatalog(str(tmp_path), ttl=0)
+    fetch = FakeMapping(MAPPING)
+    catalog.get("https://kibana.example.com", "logs-*", fetch)
+    catalog.get("https://kibana.example.com", "logs-*", fetch)
+    assert fetch.calls == 2
+
+
+def test_catalog_reloaded_from_disk(tmp_path):
+    FieldCatalog(str(tmp_path)).get("https://kibana.example.com", "logs-*", FakeMapping(MAPPING))
+    assert len(os.listdir(tmp_path)) == 1
+
+    # Another process (or a restart) reads the persisted catalog
+    fetch = FakeMapping({})
+    catalog = FieldCatalog(str(tmp_path)).get("https://kibana.example.com", "logs-*", fetch)
+    assert fetch.calls == 0
+    assert catalog["fields"]["message"] == "text"
+
+
+def test_expired_memory_copy_rereads_disk(tmp_path):
+    reader = FieldCatalog(str(tmp_path), ttl=3600)
+    reader.get("https://kibana.example.com", "logs-*", FakeMapping({}))
+    reader._catalogs[("https://kibana.example.com", "logs-*")]["fetched_at"] = time.time() - 7200
+
+    # Another process rebuilt the catalog meanwhile
+    FieldCatalog(str(tmp_path)).get("https://kibana.example.com", "logs-*", FakeMapping(MAPPING), refresh=True)
+    fetch = FakeMapping({})
+    assert reader.get("https://kibana.example.com", "logs-*", fetch)["indices"] == 2
+    assert fetch.calls == 0
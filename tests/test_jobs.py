@@ -0,0 +1,97 @@
+"""
+Tests for background jobs and their persisted state.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from lib.jobs import STATUS_SUCCEEDED, JobManager
+
+
+def wait_finished(manager, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = manager.status(job_id)
+        if status["finished_at"] is not None:
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_result_shared_through_state_dir(tmp_path):
+    manager = JobManager(max_workers=2, state_dir=str(tmp_path))
+    job_id = manager.submit("db", "rows", lambda: [{"id": 1}, {"id": 2}])
+    status = wait_finished(manager, job_id)
+    assert (status["status"], status["result_rows"]) == (STATUS_SUCCEEDED, 2)
+
+    # Another process sharing the state directory
+    other = JobManager(max_workers=1, state_dir=str(tmp_path))
+    assert other.status(job_id)["status"] == STATUS_SUCCEEDED
+    assert other.result(job_id) == [{"id": 1}, {"id": 2}]
+
+
+def test_failed_job(tmp_path):
+    manager = JobManager(max_workers=1, state_dir=str(tmp_path))
+
+    def fail():
+        raise RuntimeError("boom")
+
+    job_id = manager.submit("db", "fail", fail)
+    assert wait_finished(manager, job_id)["error"] == "boom"
+    with pytest.raises(ValueError, match="boom"):
+        manager.result(job_id)
+
+
+def test_submit_fails_when_state_cannot_be_written(tmp_path):
+    manager = JobManager(max_workers=1, state_dir=str(tmp_path / "missing"))
+    with pytest.raises(OSError):
+        manager.submit("db", "rows", lambda: [])
+    assert manager.list() == []
+
+
+def test_submit_fails_when_pool_is_shut_down(tmp_path):
+    manager = JobManager(max_workers=1, state_dir=str(tmp_path))
+    manager._executor.shutdown()
+    with pytest.raises(RuntimeError):
+        manager.submit("db", "rows", lambda: [])
+    assert manager.list() == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_result_persisted_without_holding_lock(tmp_path):
+    writing = threading.Event()
+    release = threading.Event()
+
+    class SlowStateJobManager(JobManager):
+        def _persist(self, state):
+            if state["status"] == STATUS_SUCCEEDED:
+                writing.set()
+                release.wait(5)
+            super()._persist(state)
+
+    manager = SlowStateJobManager(max_workers=1, state_dir=str(tmp_path))
+    job_id = manager.submit("db", "rows", lambda: [1, 2, 3])
+    assert writing.wait(5)
+    # Status and new submissions are served while the result is being written
+    start = time.monotonic()
+    assert manager.status(job_id)["status"] == "running"
+    assert manager.submit("other", "rows", lambda: [])
+    assert time.monotonic() - start < 1
+    release.set()
+    assert wait_finished(manager, job_id)["status"] == STATUS_SUCCEEDED
+
+
+def test_sweeps_expired_state_files(tmp_path):
+    now = time.time()
+    for name, age in (("oldjob", 7200), ("newjob", 60)):
+        path = tmp_path / f"{name}.json"
+        path.write_text('{"id": "%s", "status": "succeeded", "finished_at": %f}' % (name, now - age))
+        os.utime(path, (now - age, now - age))
+    (tmp_path / "unrelated.txt").write_text("")
+    os.utime(tmp_path / "unrelated.txt", (now - 7200, now - 7200))
+
+    # Files of other processes or from before a restart are swept at startup
+    JobManager(max_workers=1, ttl=3600, state_dir=str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["newjob.json", "unrelated.txt"]
@@ -0,0 +1,123 @@
+"""
+Tests for jq projection pushdown.
+"""
+import json
+
+import jq
+import pytest
+
+from lib.jq_pushdown import apply_pushdown, build_pushdown, extract_paths
+
+
+def _source_filter(response: dict, includes: list) -> dict:
+    """Apply top-level _source includes to a search response like Elasticsearch does."""
+    response = json.loads(json.dumps(response))
+    for hit in response.get("hits", {}).get("hits", []):
+        if "_source" in hit:
+            hit["_source"] = {k: v for k, v in hit["_source"].items() if k in includes}
+    return response
+
+
+def _run(expression: str, response: dict):
+    return jq.compile(expression).input(response).all()
+
+
+RESPONSES = [
+    {"hits": {"total": {"value": 0}, "hits": []}},
+    {"hits": {"hits": [{"_id": "1", "_source": {"b": 1}}, {"_id": "2", "_source": {}}]}},
+    {"hits": {"hits": [
+        {"_id": "1", "_source": {"a": {"x": 1, "y": 2}, "b": [1, 2], "c": "drop"}},
+        {"_id": "2", "_source": {"a": [{"x": 3}, {"z": 4}], "c": "drop"}},
+        {"_id": "3", "_source": {"b": []}},
+    ]}},
+]
+
+
+@pytest.mark.parametrize("expression, expected", [
+    (".hits.hits[]", [["hits", "hits", "[]"]]),
+    (".hits.hits[] | ._source.a, ._id", [["hits", "hits", "[]", "_source", "a"], ["hits", "hits", "[]", "_id"]]),
+    (".hits.hits[] | {a: ._source.a, id: ._id}", [["hits", "hits", "[]", "_source", "a"], ["hits", "hits", "[]", "_id"]]),
+    ('.hits.hits[0]._source."a.b"', [["hits", "hits", "[]", "_source", "a.b"]]),
+    (".", [[]]),
+    (".[] | .index", [["[]", "index"]]),
+])
+def test_extract_paths(expression, expected):
+    assert extract_paths(expression) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "",
+    ".hits.hits[] | select(._source.a > 1)",
+    ".hits.hits | length",
+    ".hits.hits[] | ._source.a, ._id | .x",
+    ".hits.hits[] |",
+])
+def test_extract_paths_rejects_unsupported(expression):
+    assert extract_paths(expression) is None
+
+
+@pytest.mark.parametrize("expression, includes", [
+    (".hits.hits[] | ._source.a, ._id", ["a"]),
+    (".hits.hits[] | ._source.a.x", ["a"]),
+    (".hits.hits[] | ._source.b[]", ["b"]),
+    (".hits.hits[] | {a: ._source.a, b: ._source.b}", ["a", "b"]),
+    (".hits.hits[] | ._id", None),
+    (".hits.hits[] | ._source", None),
+    (".hits.hits[]", None),
+    (".hits.total, .hits.hits[]._source.a", ["a"]),
+    (".aggregations.top.hits.hits[]._source.a", None),
+])
+def test_build_pushdown(expression, includes):
+    assert build_pushdown(extract_paths(expression)) == {"source_includes": includes}
+
+
+def test_build_pushdown_only_for_search():
+    assert build_pushdown(extract_paths(".hits.hits[]._source.a"), is_search=False) == {"source_includes": None}
+
+
+def test_apply_pushdown_adds_source_includes_only():
+    path, query, applied = apply_pushdown("idx/_search", '{"size": 5}', ".hits.hits[] | ._source.a, ._id")
+    assert path == "idx/_search"
+    assert json.loads(query) == {"size": 5, "_source": {"includes": ["a"]}}
+    assert applied == {"_source": ["a"]}
+
+
+def test_apply_pushdown_merges_explicit_fields():
+    _, query, _ = apply_pushdown("idx/_search", "{}", ".hits.hits[]._source.a", ["b"])
+    assert json.loads(query)["_source"] == {"includes": ["b", "a"]}
+
+
+@pytest.mark.parametrize("path, query, jq_query", [
+    ("_cat/indices", "{}", ".[] | .index"),
+    ("idx/_search", '{"_source": ["x"]}', ".hits.hits[]._source.a"),
+    ("idx/_search", "{}", ".hits.hits[] | select(._source.a)"),
+    ("idx/_mapping", "{}", ".idx.mappings"),
+])
+def test_apply_pushdown_leaves_request_unchanged(path, query, jq_query):
+    assert apply_pushdown(path, query, jq_query) == (path, query, {})
+
+
+@pytest.mark.parametrize("expression", [
+    ".hits.hits[] | ._source.a",
+    ".hits.hits[] | ._source.a, ._id",
+    ".hits.hits[] | {a: ._source.a, b: ._source.b}",
+    ".hits.hits[]._source.b[]",
+])
+@pytest.mark.parametrize("response", RESPONSES)
+def test_pushdown_keeps_jq_result(expression, response):
+    _, query, applied = apply_pushdown("idx/_search", "{}", expression)
+    pushed = _source_filter(response, applied["_source"]) if applied else response
+    try:
+        expected = _run(expression, response)
+    except ValueError as e:
+        with pytest.raises(ValueError, match=str(e)[:20]):
+            _run(expression, pushed)
+        return
+    assert _run(expression, pushed) == expected
+
+
+def test_pushdown_empty_hits():
+    response = {"hits": {"total": {"value": 0}, "hits": []}}
+    path, query, applied = apply_pushdown("idx/_search", "{}", ".hits.hits[] | ._source.a")
+    assert "filter_path" not in path
+    assert _run(".hits.hits[] | ._source.a", _source_filter(response, applied["_source"])) == []
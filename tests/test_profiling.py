@@ -0,0 +1,100 @@
+"""
+Tests for the opt-in profiling hooks.
+"""
+import json
+import os
+
+import pytest
+
+from lib import profiling
+from lib.profiling import get_profiling_reports, profiled
+
+
+@pytest.fixture
+def enabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    profiling._recent.clear()
+    yield tmp_path
+    profiling._recent.clear()
+
+
+@profiled(name="handle_large_response")
+def fake_handle_large_response(data):
+    return json.dumps(data)
+
+
+@profiled
+def tool(n):
+    rows = [{"id": i} for i in range(n)]
+    return fake_handle_large_response(rows)
+
+
+@profiled
+def failing_tool():
+    raise ValueError("boom")
+
+
+def test_disabled_passes_through(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_ENABLED", False)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    profiling._recent.clear()
+    assert tool(3) == json.dumps([{"id": 0}, {"id": 1}, {"id": 2}])
+    assert tool.__name__ == "tool"
+    assert os.listdir(tmp_path) == []
+    assert json.loads(get_profiling_reports())["recent"] == []
+
+
+def test_sampling(enabled, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 0.0)
+    tool(3)
+    assert os.listdir(enabled) == []
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+    tool(3)
+    assert len(os.listdir(enabled)) == 1
+
+
+def test_nested_call_recorded_as_phase(enabled):
+    tool(1000)
+    files = os.listdir(enabled)
+    assert len(files) == 1
+    with open(enabled / files[0], encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["name"] == "tool"
+    assert [phase["name"] for phase in report["phases"]] == ["handle_large_response"]
+    assert report["traced_peak_bytes"] > 0
+    # Phases are not reported as calls of their own
+    recent = json.loads(get_profiling_reports())["recent"]
+    assert [(r["name"], r["path"]) for r in recent] == [("tool", str(enabled / files[0]))]
+
+
+def test_error_is_recorded_and_reraised(enabled):
+    with pytest.raises(ValueError, match="boom"):
+        failing_tool()
+    assert json.loads(get_profiling_reports())["recent"][0]["error"] == "boom"
+
+
+def test_report_write_failure_does_not_fail_call(enabled, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(enabled / "file"))
+    (enabled / "file").write_text("not a directory")
+    assert tool(3) == json.dumps([{"id": 0}, {"id": 1}, {"id": 2}])
+    with pytest.raises(ValueError, match="boom"):
+        failing_tool()
+    recent = json.loads(get_profiling_reports())["recent"]
+    assert [r["path"] for r in recent] == [None, None]
+    assert all(r["report_error"] for r in recent)
+
+
+def test_reports_aggregate_allocators(enabled):
+    profiling._recent.extend([
+        {"name": "a", "top_allocators": [{"location": "x.py:1", "size_diff_bytes": 100}, {"location": "y.py:2", "size_diff_bytes": 10}]},
+        {"name": "b", "top_allocators": [{"location": "x.py:1", "size_diff_bytes": 50}]},
+    ])
+    reports = json.loads(get_profiling_reports())
+    assert reports["enabled"] and reports["report_dir"] == str(enabled)
+    assert reports["top_allocators"] == [
+        {"location": "x.py:1", "size_diff_bytes": 150, "calls": 2},
+        {"location": "y.py:2", "size_diff_bytes": 10, "calls": 1},
+    ]
+    assert [r["name"] for r in reports["recent"]] == ["a", "b"]
@@ -0,0 +1,143 @@
+"""
+Tests for SQL analysis, LIMIT injection and EXPLAIN cost gating.
+"""
+import pytest
+
+from lib.query_guard import QueryGuard, QueryRejected, analyze_sql, estimate_rows, inject_limit, limit_rows
+
+
+class FakeExplorer:
+    """Returns a fixed EXPLAIN plan and records executed statements."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.queries = []
+
+    def query_db(self, dbname, sql):
+        self.queries.append(sql)
+        return self.plan if sql.startswith("EXPLAIN ") else [{"id": 1}]
+
+
+@pytest.mark.parametrize("sql, statement_type, is_select, has_limit", [
+    ("SELECT * FROM t", "SELECT", True, False),
+    ("select * from t limit 5;", "SELECT", True, True),
+    ("SELECT * FROM t -- LIMIT 5", "SELECT", True, False),
+    ("SELECT * FROM t /* LIMIT 5 */ WHERE a = 1", "SELECT", True, False),
+    ("# leading comment\nSELECT 1", "SELECT", True, False),
+    ("SELECT '-- not a comment; LIMIT 1' FROM t", "SELECT", True, False),
+    ("SELECT * FROM (SELECT * FROM t LIMIT 5) x", "SELECT", True, False),
+    ("WITH x AS (SELECT * FROM t LIMIT 5) SELECT * FROM x", "WITH", True, False),
+    ("SELECT a FROM t UNION ALL SELECT a FROM u", "SELECT", True, False),
+    ("SELECT * INTO OUTFILE '/tmp/x' FROM t", "SELECT", False, False),
+    ("SHOW TABLES", "SHOW", False, False),
+    ("UPDATE t SET a = 1", "UPDATE", False, False),
+])
+def test_analyze_sql(sql, statement_type, is_select, has_limit):
+    info = analyze_sql(sql)
+    assert (info["statement_type"], info["is_select"], info["has_limit"]) == (statement_type, is_select, has_limit)
+
+
+def test_analyze_sql_allows_quoted_semicolon():
+    assert analyze_sql("SELECT * FROM t WHERE a = ';' AND `b;c` = 1")["is_select"]
+
+
+@pytest.mark.parametrize("sql", ["SELECT 1; SELECT 2", "SELECT 1; -- x\nDROP TABLE t"])
+def test_analyze_sql_rejects_multiple_statements(sql):
+    with pytest.raises(QueryRejected):
+        analyze_sql(sql)
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t", "SELECT * FROM t LIMIT 10"),
+    ("SELECT * FROM t;", "SELECT * FROM t LIMIT 10"),
+    ("SELECT * FROM t -- trailing", "SELECT * FROM t LIMIT 10"),
+    ("WITH x AS (SELECT 1) SELECT * FROM x", "WITH x AS (SELECT 1) SELECT * FROM x LIMIT 10"),
+    ("SELECT a FROM t UNION SELECT a FROM u", "SELECT a FROM t UNION SELECT a FROM u LIMIT 10"),
+    ("SELECT * FROM t FOR UPDATE", "SELECT * FROM t LIMIT 10 FOR UPDATE"),
+    ("SELECT * FROM t WHERE a = 1 FOR SHARE NOWAIT", "SELECT * FROM t WHERE a = 1 LIMIT 10 FOR SHARE NOWAIT"),
+    ("SELECT * FROM t LOCK IN SHARE MODE", "SELECT * FROM t LIMIT 10 LOCK IN SHARE MODE"),
+    ("SELECT 'for update' FROM t", "SELECT 'for update' FROM t LIMIT 10"),
+    ("SELECT 名字 FROM t", "SELECT 名字 FROM t LIMIT 10"),
+    ("SELECT café, _x1 FROM t WHERE é = 1", "SELECT café, _x1 FROM t WHERE é = 1 LIMIT 10"),
+    ("SELECT 5--3 FROM t", "SELECT 5--3 FROM t LIMIT 10"),
+    ("SELECT 5 -- 3 FROM t", "SELECT 5 LIMIT 10"),
+    ("SELECT a FROM t --\nWHERE b = 1", "SELECT a FROM t  \nWHERE b = 1 LIMIT 10"),
+])
+def test_inject_limit(sql, expected):
+    assert inject_limit(sql, 10) == (expected, True)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t LIMIT 5",
+    "SELECT * FROM t LIMIT 5 FOR UPDATE",
+    "SHOW CREATE TABLE t",
+])
+def test_inject_limit_leaves_statement(sql):
+    assert inject_limit(sql, 10) == (sql, False)
+
+
+def test_inject_limit_disabled():
+    assert inject_limit("SELECT * FROM t", 0) == ("SELECT * FROM t", False)
+
+
+@pytest.mark.parametrize("sql, rows", [
+    ("SELECT * FROM t LIMIT 10", 10),
+    ("SELECT * FROM t LIMIT 5, 10", 15),
+    ("SELECT * FROM t LIMIT 10 OFFSET 20", 30),
+    ("SELECT * FROM (SELECT * FROM t LIMIT 3) x", None),
+])
+def test_limit_rows(sql, rows):
+    assert limit_rows(sql) == rows
+
+
+@pytest.mark.parametrize("plan, rows", [
+    ([{"id": 1, "rows": 1000}], 1000),
+    # Nested loop: the inner table is read once per outer row
+    ([{"id": 1, "rows": 100000}, {"id": 1, "rows": 100000}], 100000 + 100000 * 100000),
+    # Index lookup on the inner table, 10% of outer rows pass the WHERE
+    ([{"id": 1, "rows": "1000", "filtered": "10.00"}, {"id": 1, "rows": "1", "filtered": 100}], 1100),
+    # Separate query blocks are added up
+    ([{"id": 1, "rows": 500}, {"id": 2, "rows": 300}, {"id": None, "rows": None}], 800),
+    ([{"ID": 1, "ROWS": 7}], 7),
+    (["plain text plan"], None),
+])
+def test_estimate_rows(plan, rows):
+    assert estimate_rows(plan) == rows
+
+
+BIG_SCAN = [{"table": "big", "type": "ALL", "rows": 50000000, "Extra": None}]
+
+
+def test_check_caps_estimate_of_streaming_limit():
+    guard = QueryGuard(FakeExplorer(BIG_SCAN), default_limit=1000, max_estimated_rows=1000000)
+    report = guard.check("db", "SELECT * FROM big LIMIT 10")
+    assert report["estimated_rows"] == 10
+    assert any("capped" in warning for warning in report["warnings"])
+
+    # The guard's own injected LIMIT counts too
+    assert guard.check("db", "SELECT * FROM big")["estimated_rows"] == 1000
+
+
+@pytest.mark.parametrize("sql, plan", [
+    ("SELECT * FROM big ORDER BY a LIMIT 10", BIG_SCAN),
+    ("SELECT a, COUNT(*) FROM big GROUP BY a LIMIT 10", BIG_SCAN),
+    ("SELECT * FROM big LIMIT 10", [dict(BIG_SCAN[0], Extra="Using where; Using filesort")]),
+    ("SELECT * FROM big JOIN other USING (id) LIMIT 10", BIG_SCAN + [{"table": "other", "rows": 1}]),
+    ("SELECT * FROM big LIMIT 2000000, 10", BIG_SCAN),
+    # Unindexed join of two 100k-row tables: 10^10 row combinations, even with a LIMIT
+    ("SELECT * FROM a JOIN b ON a.x = b.y LIMIT 10",
+     [{"id": 1, "table": "a", "type": "ALL", "rows": 100000, "filtered": 100.0, "Extra": None},
+      {"id": 1, "table": "b", "type": "ALL", "rows": 100000, "filtered": 10.0, "Extra": "Using where; Using join buffer"}]),
+])
+def test_check_rejects_non_streaming_or_deep_scans(sql, plan):
+    guard = QueryGuard(FakeExplorer(plan), max_estimated_rows=1000000)
+    with pytest.raises(QueryRejected):
+        guard.check("db", sql)
+
+
+def test_check_warn_mode_runs_query():
+    explorer = FakeExplorer(BIG_SCAN)
+    result = QueryGuard(explorer, on_exceed="warn").query_db("db", "SELECT * FROM big ORDER BY a")
+    assert result["data"] == [{"id": 1}]
+    assert explorer.queries[-1] == "SELECT * FROM big ORDER BY a LIMIT 1000"
+    assert any("exceeds threshold" in warning for warning in result["guard"]["warnings"])
@@ -0,0 +1,65 @@
+"""
+Tests for incremental re-query snapshots and watermark predicates.
+"""
+import pytest
+
+from lib.result_diff import DiffStore, es_body_with_watermark, sql_with_watermark
+
+
+def test_sql_with_watermark_includes_boundary():
+    assert sql_with_watermark("SELECT * FROM t;", "mtime", 100) == (
+        "SELECT * FROM (SELECT * FROM t) AS _incremental WHERE `mtime` >= 100"
+    )
+    assert sql_with_watermark("SELECT * FROM t", "m`t", "2024-01-01 'x'").endswith(
+        "WHERE `m``t` >= '2024-01-01 ''x'''"
+    )
+
+
+def test_es_body_with_watermark_includes_boundary():
+    body = es_body_with_watermark({"size": 10, "query": {"term": {"a": 1}}}, "mtime", 100)
+    assert body["size"] == 10
+    assert body["query"]["bool"]["filter"] == [{"range": {"mtime": {"gte": 100}}}]
+    assert body["query"]["bool"]["must"] == [{"term": {"a": 1}}]
+
+
+def test_watermark_requires_key_columns(tmp_path):
+    store = DiffStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.update("snapshot", [{"id": 1, "mtime": 1}], [], "mtime")
+
+
+def test_incremental_update_dedupes_boundary_rows(tmp_path):
+    store = DiffStore(str(tmp_path))
+    first = store.update("snapshot", [{"id": 1, "mtime": 10}, {"id": 2, "mtime": 20}], ["id"], "mtime")
+    assert first["first_run"] and first["watermark"] == 20
+
+    # A row written in the same second as the watermark arrives with the re-fetched boundary row
+    diff = store.update("snapshot", [{"id": 2, "mtime": 20}, {"id": 3, "mtime": 20}], ["id"], "mtime")
+    assert diff["incremental"]
+    assert diff["inserted"] == [{"id": 3, "mtime": 20}]
+    assert diff["changed"] == [] and diff["deleted"] == []
+    assert diff["counts"] == {"total": 3, "inserted": 1, "deleted": 0, "changed": 0, "unchanged": 2}
+    assert diff["watermark"] == 20
+
+
+def test_full_update_reports_changes_and_deletions(tmp_path):
+    store = DiffStore(str(tmp_path))
+    store.update("snapshot", [{"id": 1, "status": 1}, {"id": 2, "status": 1}], ["id"])
+    diff = store.update("snapshot", [{"id": 1, "status": 2}], ["id"])
+    assert diff["changed"] == [{"row": {"id": 1, "status": 2}, "changed_columns": ["status"]}]
+    assert diff["deleted"] == [{"id": 2, "status": 1}]
+
+
+def test_whole_row_mode_counts_duplicates(tmp_path):
+    store = DiffStore(str(tmp_path))
+    first = store.update("snapshot", [{"status": 1}, {"status": 1}, {"status": 2}], [])
+    assert first["counts"]["total"] == 3
+    assert first["inserted"] == [{"status": 1}, {"status": 1}, {"status": 2}]
+
+    diff = store.update("snapshot", [{"status": 1}, {"status": 2}], [])
+    assert diff["deleted"] == [{"status": 1}]
+    assert diff["counts"] == {"total": 2, "inserted": 0, "deleted": 1, "changed": 0, "unchanged": 2}
+
+    diff = store.update("snapshot", [{"status": 2}, {"status": 1}, {"status": 1}, {"status": 1}], [])
+    assert diff["inserted"] == [{"status": 1}, {"status": 1}]
+    assert diff["counts"]["total"] == 4
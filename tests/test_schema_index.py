@@ -0,0 +1,94 @@
+"""
+Tests for the persisted schema index.
+"""
+import os
+import time
+
+from lib.schema_index import SchemaIndex
+
+
+class FakeExplorer:
+    """Serves a fixed set of databases and table DDLs."""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.calls = 0
+
+    def explore_db(self):
+        self.calls += 1
+        return list(self.tables)
+
+    def query_db(self, dbname, sql):
+        if sql == "SHOW TABLES":
+            return [{"Tables_in_db": name} for name in self.tables[dbname]]
+        table_name = sql.rsplit(" ", 1)[1].strip("`")
+        return [{"Create Table": self.tables[dbname][table_name]}]
+
+
+ORDERS_DDL = "CREATE TABLE `orders` (\n  `id` bigint NOT NULL,\n  `shop_id` bigint unsigned NOT NULL\n)"
+SHOPS_DDL = "CREATE TABLE `shops` (\n  `shop_id` bigint unsigned NOT NULL\n)"
+
+
+def wait_refreshed(index, env_name, timeout=5):
+    deadline = time.monotonic() + timeout
+    while index._refreshing.get(env_name) is not None:
+        assert time.monotonic() < deadline, "refresh did not finish"
+        time.sleep(0.01)
+
+
+def test_refresh_and_search(tmp_path):
+    index = SchemaIndex(str(tmp_path))
+    index.refresh("test", FakeExplorer({"order_db": {"orders": ORDERS_DDL}}))
+    results = index.search("shop_id", ["test"], kind="column")
+    assert (results[0]["db"], results[0]["table"], results[0]["column"]) == ("order_db", "orders", "shop_id")
+    assert [r["column"] for r in results] == ["shop_id", "id"]
+    assert not index.is_stale("test")
+
+
+def test_reloads_file_written_by_other_process(tmp_path):
+    reader = SchemaIndex(str(tmp_path))
+    assert reader.is_stale("test")
+    assert reader.search("shops", ["test"]) == []
+
+    # Another worker crawls the environment and writes the shared file
+    SchemaIndex(str(tmp_path)).refresh("test", FakeExplorer({"order_db": {"shops": SHOPS_DDL}}))
+    assert not reader.is_stale("test")
+    assert reader.search("shops", ["test"], kind="table")[0]["table"] == "shops"
+
+
+def test_keeps_in_memory_copy_when_file_unchanged(tmp_path):
+    index = SchemaIndex(str(tmp_path))
+    index.refresh("test", FakeExplorer({"order_db": {"orders": ORDERS_DDL}}))
+    data = index._data["test"]
+    index.load("test")
+    assert index._data["test"] is data
+
+
+def test_failed_refresh_backs_off(tmp_path):
+    index = SchemaIndex(str(tmp_path), retry_interval=3600)
+
+    def no_credentials(env_name):
+        raise ValueError(f"No credentials for {env_name}")
+
+    assert index.is_stale("test")
+    assert index.refresh_in_background("test", no_credentials)
+    wait_refreshed(index, "test")
+    assert index.status()["test"]["error"] == "No credentials for test"
+    assert not index.is_stale("test")
+
+    # An explicit refresh still runs and clears the failure
+    assert index.refresh_in_background("test", lambda env_name: FakeExplorer({"order_db": {"orders": ORDERS_DDL}}))
+    wait_refreshed(index, "test")
+    assert index.status()["test"]["error"] is None
+    assert os.path.exists(tmp_path / "test.json")
+
+
+def test_failed_refresh_retried_after_interval(tmp_path):
+    index = SchemaIndex(str(tmp_path), retry_interval=0)
+
+    def no_credentials(env_name):
+        raise ValueError("no credentials")
+
+    index.refresh_in_background("test", no_credentials)
+    wait_refreshed(index, "test")
+    assert index.is_stale("test")
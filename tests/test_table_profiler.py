@@ -0,0 +1,57 @@
+"""
+Tests for the pushed-down table profile query.
+
+The SQL is executed on SQLite, with MySQL's JSON_ARRAYAGG/JSON_ARRAY mapped
+to their SQLite equivalents.
+"""
+import sqlite3
+
+import pytest
+
+from lib.table_profiler import build_profile_sql, parse_profile_row
+
+COLUMNS = [
+    {"name": "id", "type": "int"},
+    {"name": "status", "type": "tinyint"},
+    {"name": "note", "type": "text"},
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, status INTEGER, note TEXT)")
+    # The first 100 rows all have status 1; the rest of the table is dominated by status 2
+    rows = [(i, 1 if i <= 100 else 2, None if i % 2 else "x") for i in range(1, 1001)]
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?)", rows)
+    yield conn
+    conn.close()
+
+
+def run_profile(conn, sample_rows, top_values=3):
+    sql = build_profile_sql("orders", COLUMNS, sample_rows=sample_rows, top_values=top_values)
+    sql = sql.replace("JSON_ARRAYAGG(", "json_group_array(").replace("JSON_ARRAY(", "json_array(")
+    return parse_profile_row(dict(conn.execute(sql).fetchone()), COLUMNS)
+
+
+def test_profile_sample_shared_by_top_values(conn):
+    profile = run_profile(conn, sample_rows=100)
+    assert profile["row_count"] == 100
+    id_stats, status_stats, note_stats = profile["columns"]
+    assert (id_stats["min"], id_stats["max"], id_stats["distinct"]) == (1, 100, 100)
+    assert status_stats["top_values"] == [[1, 100]]
+    assert note_stats["null_count"] == 50
+    assert "top_values" not in note_stats and "distinct" not in note_stats
+
+
+def test_profile_whole_table(conn):
+    profile = run_profile(conn, sample_rows=0)
+    assert profile["row_count"] == 1000
+    assert profile["columns"][1]["top_values"] == [[2, 900], [1, 100]]
+
+
+def test_profile_without_top_values():
+    sql = build_profile_sql("orders", COLUMNS, sample_rows=100, top_values=0)
+    assert sql.startswith("WITH s AS (SELECT * FROM `orders` LIMIT 100) SELECT ")
+    assert "_top" not in sql
@@ -1,44 +1,62 @@
 """
 Data Explorer tool for querying databases through Data Service API.
 """
-from typing import Annotated,Tuple
+import time
+import threading
+from typing import Annotated
 from lib.data_explorer_client import DataExplorer
 from lib.response_utils import handle_large_response
+from lib.profiling import profiled
+from lib.dispatch import run_in_thread
+from lib.query_guard import QueryGuard
+from lib.ddl_parser import parse_create_table
+from lib.table_profiler import build_profile_sql, parse_profile_row
+from lib.result_diff import DiffStore, check_watermark_keys, sql_with_watermark
+from lib.config import registry
 
-EXPLORER_CONFIG_LIST = {
-    "shopee_sg_test": ("https://data-service.test.sz.shopee.io/api/v1/service"),
-    "shopee_sg_staging": ("https://data-service.staging.sz.shopee.io/api/v1/service"),
-    "shopee_sg_uat": ("https://data-service.uat.sz.shopee.io/api/v1/service"),
-    "shopee_sg_live": ("https://data-service.sz.shopee.io/api/v1/service"),
-    "shopee_cn_live": ("https://cn.entrance.csinfra.shopee.io/dataservice"),
-    "tutid_live": ("http://data-service.sz.tutid.io/api/v1/service"),
-}
+# Cached SHOW CREATE TABLE results: (env_name, dbname, table_name) -> (fetched_at, ddl_info).
+# TTL comes from [cache] ddl_ttl in the config file (default: LAMBDA_MCP_DDL_CACHE_TTL or 600).
+_ddl_cache = {}
+_ddl_cache_lock = threading.Lock()
 
-def get_auth_config_from_env(env_name: str) -> Tuple[str, str]:
-    """Get Data Explorer auth config from environment name."""
-    GENERAL_MODULE_NAME_KEY = "DATA_EXPLORER_MODULE_NAME"
-    GENERAL_SECRET_KEY = "DATA_EXPLORER_SECRET"
-    ENV_MODULE_NAME_KEY = f"{env_name.upper()}_DATA_EXPLORER_MODULE_NAME"
-    ENV_SECRET_KEY = f"{env_name.upper()}_DATA_EXPLORER_SECRET"
-    import os
+# Previous results for query_data_explorer_changes, persisted under LAMBDA_MCP_CACHE_DIR/result_diff
+diff_store = DiffStore()
 
-    general_module_name = os.getenv(GENERAL_MODULE_NAME_KEY, "")
-    general_secret = os.getenv(GENERAL_SECRET_KEY, "")
-    env_module_name = os.getenv(ENV_MODULE_NAME_KEY, general_module_name)
-    env_secret = os.getenv(ENV_SECRET_KEY, general_secret)
+def create_explorer(env_name: str) -> DataExplorer:
+    """Get the pre-built DataExplorer client for an environment, validating the env name."""
+    return registry.get().explorer(env_name)
 
-    if not env_module_name or not env_secret:
-        if not general_module_name or not general_secret:
-            raise ValueError("Data Explorer authentication configuration is missing.")
-        else:
-            return general_module_name, general_secret
+def get_table_ddl(explorer: DataExplorer, env_name: str, dbname: str, table_name: str, refresh: bool = False) -> dict:
+    """
+    Get the SHOW CREATE TABLE result for a table, served from cache when fresh.
+    
+    Returns:
+        Dictionary with 'Table' and 'Create Table' keys, or an 'error' key if no DDL was found
+    """
+    key = (env_name, dbname, table_name)
+    now = time.time()
+    if not refresh:
+        with _ddl_cache_lock:
+            cached = _ddl_cache.get(key)
+        if cached and now - cached[0] < registry.get().cache["ddl_ttl"]:
+            return cached[1]
+
+    result = explorer.query_db(dbname, f"SHOW CREATE TABLE {table_name}")
+
+    # Result is typically a list with one dict containing 'Table' and 'Create Table' keys
+    if result and len(result) > 0:
+        ddl_info = result[0]
+        with _ddl_cache_lock:
+            _ddl_cache[key] = (now, ddl_info)
     else:
-        return env_module_name, env_secret
+        ddl_info = {"error": f"No DDL found for table {table_name}"}
+    return ddl_info
 
 def query_data_explorer(
     env_name: Annotated[str, "Environment name (e.g., shopee_sg_test, shopee_sg_live, shopee_cn_live, tutid_live)"],
     dbname: Annotated[str, "Database name to query"],
-    sql: Annotated[str, "SQL query string to execute"]
+    sql: Annotated[str, "SQL query string to execute"],
+    guard: Annotated[bool, "Enable query guardrails: inject a default LIMIT into unbounded SELECTs and reject queries whose EXPLAIN estimate is too large"] = False
 ) -> str:
     """
     Query database through Data Service API.
@@ -46,11 +64,17 @@ def query_data_explorer(
     This tool allows you to execute SQL queries on databases through a Data Service API.
     It uses HMAC-SHA256 authentication and returns results as JSON.
     
-    Authentication credentials (secret and module_name) are automatically retrieved from environment variables
-    based on the env_name. The base URL is configured in EXPLORER_CONFIG_LIST.
+    The base URL and authentication credentials (secret and module_name) come from the config file
+    (LAMBDA_MCP_CONFIG), falling back to the built-in environments and environment variables.
+    
+    When guard is enabled, the query is wrapped by QueryGuard: a LIMIT is injected into unbounded
+    SELECT statements (LAMBDA_MCP_QUERY_DEFAULT_LIMIT), EXPLAIN is run first and the query is rejected
+    (or warned about, see LAMBDA_MCP_QUERY_GUARD_ON_EXCEED) if the estimated rows examined exceed
+    LAMBDA_MCP_QUERY_MAX_ESTIMATED_ROWS.
         
     Returns:
-        The query result as a JSON string, or a JSON object with file info if result is too large
+        The query result as a JSON string, or a JSON object with file info if result is too large.
+        With guard enabled, the result is {"guard": {...report...}, "data": [...rows...]}
         
     Example:
         query_data_explorer(
@@ -60,26 +84,14 @@ def query_data_explorer(
         )
     """
     try:
-        # Validate environment name
-        if env_name not in EXPLORER_CONFIG_LIST:
-            available_envs = ", ".join(EXPLORER_CONFIG_LIST.keys())
-            raise ValueError(f"Invalid env_name '{env_name}'. Available environments: {available_envs}")
-        
-        # Get authentication config from environment variables
-        module_name, secret = get_auth_config_from_env(env_name)
-        
-        # Get base URL from config
-        base_url = EXPLORER_CONFIG_LIST[env_name]
-        
-        # Create DataExplorer client
-        explorer = DataExplorer(
-            secret=secret,
-            module_name=module_name,
-            base_url=base_url,
-        )
+        # Get DataExplorer client (validates env name)
+        explorer = create_explorer(env_name)
             
         # Execute query
-        result = explorer.query_db(dbname, sql)
+        if guard:
+            result = QueryGuard(explorer).query_db(dbname, sql)
+        else:
+            result = explorer.query_db(dbname, sql)
             
         # Handle large response
         return handle_large_response(result)
@@ -94,7 +106,7 @@ def list_dbnames(
     List all available databases in the specified environment.
     
     This tool retrieves a list of all database names accessible in the given environment.
-    Authentication credentials are automatically retrieved from environment variables.
+    Authentication credentials are taken from the config file or environment variables.
     
     Args:
         env_name: Environment name to query
@@ -113,23 +125,8 @@ def list_dbnames(
         list_dbnames(env_name="shopee_sg_test")
     """
     try:
-        # Validate environment name
-        if env_name not in EXPLORER_CONFIG_LIST:
-            available_envs = ", ".join(EXPLORER_CONFIG_LIST.keys())
-            raise ValueError(f"Invalid env_name '{env_name}'. Available environments: {available_envs}")
-        
-        # Get authentication config from environment variables
-        module_name, secret = get_auth_config_from_env(env_name)
-        
-        # Get base URL from config
-        base_url = EXPLORER_CONFIG_LIST[env_name]
-        
-        # Create DataExplorer client
-        explorer = DataExplorer(
-            secret=secret,
-            module_name=module_name,
-            base_url=base_url,
-        )
+        # Get DataExplorer client (validates env name)
+        explorer = create_explorer(env_name)
             
         # Get database list
         result = explorer.explore_db()
@@ -148,7 +145,7 @@ def list_tables(
     List all tables in the specified database.
     
     This tool retrieves a list of all table names in the given database by executing a SHOW TABLES query.
-    Authentication credentials are automatically retrieved from environment variables.
+    Authentication credentials are taken from the config file or environment variables.
     
     Args:
         env_name: Environment name to query
@@ -171,23 +168,8 @@ def list_tables(
         )
     """
     try:
-        # Validate environment name
-        if env_name not in EXPLORER_CONFIG_LIST:
-            available_envs = ", ".join(EXPLORER_CONFIG_LIST.keys())
-            raise ValueError(f"Invalid env_name '{env_name}'. Available environments: {available_envs}")
-        
-        # Get authentication config from environment variables
-        module_name, secret = get_auth_config_from_env(env_name)
-        
-        # Get base URL from config
-        base_url = EXPLORER_CONFIG_LIST[env_name]
-        
-        # Create DataExplorer client
-        explorer = DataExplorer(
-            secret=secret,
-            module_name=module_name,
-            base_url=base_url,
-        )
+        # Get DataExplorer client (validates env name)
+        explorer = create_explorer(env_name)
             
         # Execute SHOW TABLES query
         result = explorer.query_db(dbname, "SHOW TABLES")
@@ -211,18 +193,22 @@ def list_tables(
 def show_table_ddl(
     env_name: Annotated[str, "Environment name (e.g., shopee_sg_test, shopee_sg_live, shopee_cn_live, tutid_live)"],
     dbname: Annotated[str, "Database name"],
-    table_name: Annotated[str, "Table name to get DDL for"]
+    table_name: Annotated[str, "Table name to get DDL for"],
+    refresh: Annotated[bool, "Bypass the DDL cache and re-run SHOW CREATE TABLE (e.g. after ALTER TABLE)"] = False
 ) -> str:
     """
     Show the CREATE TABLE statement (DDL) for a specific table.
     
     This tool retrieves the table structure definition by executing a SHOW CREATE TABLE query.
-    Authentication credentials are automatically retrieved from environment variables.
+    Results are cached for the ddl_ttl cache setting (default: LAMBDA_MCP_DDL_CACHE_TTL or 600 seconds);
+    use refresh=True to fetch the current DDL after a schema change.
+    Authentication credentials are taken from the config file or environment variables.
     
     Args:
         env_name: Environment name to query
         dbname: Database name
         table_name: Name of the table to get DDL for
+        refresh: Re-fetch the DDL instead of serving it from the cache
         
     Returns:
         JSON string containing the CREATE TABLE statement
@@ -241,39 +227,158 @@ def show_table_ddl(
         )
     """
     try:
-        # Validate environment name
-        if env_name not in EXPLORER_CONFIG_LIST:
-            available_envs = ", ".join(EXPLORER_CONFIG_LIST.keys())
-            raise ValueError(f"Invalid env_name '{env_name}'. Available environments: {available_envs}")
+        # Get DataExplorer client (validates env name)
+        explorer = create_explorer(env_name)
+            
+        # Execute SHOW CREATE TABLE query (cached per env/db/table)
+        ddl_info = get_table_ddl(explorer, env_name, dbname, table_name, refresh=refresh)
+            
+        # Handle large response
+        return handle_large_response(ddl_info)
+            
+    except Exception as e:
+        raise RuntimeError(f"Failed to get table DDL: {str(e)}")
+
+def profile_table(
+    env_name: Annotated[str, "Environment name (e.g., shopee_sg_test, shopee_sg_live, shopee_cn_live, tutid_live)"],
+    dbname: Annotated[str, "Database name"],
+    table_name: Annotated[str, "Table name to profile"],
+    sample_rows: Annotated[int, "Profile only the first N rows of the table, 0 for the whole table (one full-table GROUP BY per column for top values)"] = 100000,
+    top_values: Annotated[int, "Number of most frequent values to return per column, 0 to disable"] = 5
+) -> str:
+    """
+    Profile a table with a single aggregate query executed inside the database.
+    
+    The column list is read from the cached DDL (see show_table_ddl), and one SQL statement computing
+    row count, null counts, distinct counts, min/max and top values per column is pushed down to the
+    database. Only the summary is returned, regardless of table size. Large types (text, blob, json)
+    only get null counts. All statistics, top values included, are computed over the same sample.
+    With sample_rows=0 the top values need one full-table GROUP BY per column; prefer a sample (or
+    top_values=0) on large tables.
+    
+    Args:
+        env_name: Environment name to query
+        dbname: Database name
+        table_name: Name of the table to profile
+        sample_rows: Number of rows to profile (0 profiles the whole table)
+        top_values: Number of top values per column
         
-        # Get authentication config from environment variables
-        module_name, secret = get_auth_config_from_env(env_name)
+    Returns:
+        JSON string containing the table profile
         
-        # Get base URL from config
-        base_url = EXPLORER_CONFIG_LIST[env_name]
+    Example return:
+        {
+            "table": "users",
+            "sample_rows": 100000,
+            "row_count": 1523,
+            "columns": [
+                {"name": "id", "type": "int", "null_count": 0, "null_ratio": 0.0,
+                 "distinct": 1523, "min": 1, "max": 1523, "top_values": [[1, 1], [2, 1]]}
+            ]
+        }
         
-        # Create DataExplorer client
-        explorer = DataExplorer(
-            secret=secret,
-            module_name=module_name,
-            base_url=base_url,
+    Example:
+        profile_table(
+            env_name="shopee_sg_test",
+            dbname="chatbot_api_db_sg",
+            table_name="users"
         )
-            
-        # Execute SHOW CREATE TABLE query
-        sql = f"SHOW CREATE TABLE {table_name}"
+    """
+    try:
+        explorer = create_explorer(env_name)
+        
+        # Read columns from cached DDL
+        ddl_info = get_table_ddl(explorer, env_name, dbname, table_name)
+        if "error" in ddl_info:
+            raise ValueError(ddl_info["error"])
+        columns = parse_create_table(ddl_info.get("Create Table", ""))["columns"]
+        if not columns:
+            raise ValueError(f"No columns found in DDL of table {table_name}")
+        
+        # Run a single pushed-down aggregate query
+        sql = build_profile_sql(table_name, columns, sample_rows=sample_rows, top_values=top_values)
         result = explorer.query_db(dbname, sql)
+        profile = parse_profile_row(result[0] if result else {}, columns)
         
-        # Result is typically a list with one dict containing 'Table' and 'Create Table' keys
-        if result and len(result) > 0:
-            ddl_info = result[0]
-        else:
-            ddl_info = {"error": f"No DDL found for table {table_name}"}
+        response = {
+            "table": table_name,
+            "sample_rows": sample_rows,
+            **profile,
+        }
+        if sample_rows <= 0 and top_values > 0:
+            response["warnings"] = [
+                "sample_rows=0 ran one full-table GROUP BY per column for top values; "
+                "use a sample or top_values=0 on large tables"
+            ]
+        return handle_large_response(response)
             
-        # Handle large response
-        return handle_large_response(ddl_info)
+    except Exception as e:
+        raise RuntimeError(f"Failed to profile table: {str(e)}")
+
+def query_data_explorer_changes(
+    env_name: Annotated[str, "Environment name (e.g., shopee_sg_test, shopee_sg_live, shopee_cn_live, tutid_live)"],
+    dbname: Annotated[str, "Database name to query"],
+    sql: Annotated[str, "SQL query string to execute"],
+    key_columns: Annotated[str, "Comma-separated columns identifying a row (e.g., id), empty string to compare whole rows"] = "",
+    watermark_column: Annotated[str, "Monotonic column (e.g., mtime) used to fetch only rows not older than the last run (requires key_columns), empty string to re-run the full query"] = "",
+    reset: Annotated[bool, "Forget the previous result and start over"] = False
+) -> str:
+    """
+    Re-run a query and return only the rows that changed since the last call with the same arguments.
+    
+    The previous result is kept per (env_name, dbname, sql, key_columns, watermark_column). Rows are matched by
+    key_columns; without keys, whole rows are compared so an update shows up as a deletion plus an insertion.
+    With watermark_column, the query is wrapped as `SELECT * FROM (<sql>) WHERE <watermark_column> >= <last value>`
+    so only new or updated rows are fetched; rows at the last value are fetched again and matched by key_columns,
+    which are therefore required. Deletions cannot be detected in that mode.
+    The first call returns every row as inserted.
+    
+    Returns:
+        JSON string with counts and the inserted, deleted and changed rows
+        
+    Example return:
+        {
+            "first_run": false,
+            "incremental": false,
+            "watermark": null,
+            "counts": {"total": 120, "inserted": 1, "deleted": 0, "changed": 1, "unchanged": 118},
+            "inserted": [{"id": 121, "status": 1}],
+            "deleted": [],
+            "changed": [{"row": {"id": 7, "status": 2}, "changed_columns": ["status"]}]
+        }
+        
+    Example:
+        query_data_explorer_changes(
+            env_name="shopee_sg_test",
+            dbname="my_database",
+            sql="SELECT id, status, mtime FROM tasks WHERE status != 3",
+            key_columns="id",
+            watermark_column="mtime"
+        )
+    """
+    try:
+        explorer = create_explorer(env_name)
+        keys = [column.strip() for column in key_columns.split(",") if column.strip()]
+        check_watermark_keys(keys, watermark_column)
+        snapshot_id = DiffStore.snapshot_id("query_data_explorer", {
+            "env_name": env_name, "dbname": dbname, "sql": sql,
+            "key_columns": keys, "watermark_column": watermark_column,
+        })
+        if reset:
+            diff_store.reset(snapshot_id)
+        
+        # Push the watermark predicate down to the database
+        snapshot = diff_store.load(snapshot_id)
+        run_sql = sql
+        if watermark_column and snapshot and snapshot.get("watermark") is not None:
+            run_sql = sql_with_watermark(sql, watermark_column, snapshot["watermark"])
+        
+        rows = explorer.query_db(dbname, run_sql)
+        diff = diff_store.update(snapshot_id, rows, keys, watermark_column)
+        return handle_large_response(diff)
             
     except Exception as e:
-        raise RuntimeError(f"Failed to get table DDL: {str(e)}")
+        raise RuntimeError(f"Query failed: {str(e)}")
 
 def get_data_explorer_env_names() -> str:
     """
@@ -286,8 +391,8 @@ def get_data_explorer_env_names() -> str:
     
     env_info = {
         "environments": [
-            {"name": env_name, "url": url}
-            for env_name, url in EXPLORER_CONFIG_LIST.items()
+            {"name": env_name, "url": env["url"]}
+            for env_name, env in registry.get().data_explorer.items()
         ]
     }
     return json.dumps(env_info, indent=2)
@@ -295,9 +400,11 @@ def get_data_explorer_env_names() -> str:
 def register_data_explorer_tool(mcp):
     """Register Data Explorer tool and resources with MCP server."""
     
-    mcp.tool(query_data_explorer)
-    mcp.tool(list_dbnames)
-    mcp.tool(list_tables)
-    mcp.tool(show_table_ddl)
+    mcp.tool(run_in_thread(profiled(query_data_explorer)))
+    mcp.tool(run_in_thread(profiled(list_dbnames)))
+    mcp.tool(run_in_thread(profiled(list_tables)))
+    mcp.tool(run_in_thread(profiled(show_table_ddl)))
+    mcp.tool(run_in_thread(profiled(profile_table)))
+    mcp.tool(run_in_thread(profiled(query_data_explorer_changes)))
     # Register resource with proper URI scheme (data://, resource://, etc.)
     mcp.resource("data://explorer/env-names")(get_data_explorer_env_names)
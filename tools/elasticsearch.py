@@ -2,10 +2,85 @@
 Elasticsearch tool for querying via Kibana proxy.
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import os
+import hashlib
+import threading
 import jq
 from typing import Annotated
 from lib.response_utils import handle_large_response
+from lib.profiling import profiled
+from lib.dispatch import run_in_thread
+from lib.es_field_catalog import FieldCatalog, search_fields
+from lib.jq_pushdown import apply_pushdown
+from lib.es_composite import terms_to_composite, stream_composite
+from lib.result_diff import DiffStore, check_watermark_keys, es_body_with_watermark
+from lib.es_fanout import run_fanout, merge_results
+from lib.admission import admission
+from lib.config import registry
+
+# Logged-in Kibana sessions: (base_url, username, password digest) -> requests.Session
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Shared field catalog cache, persisted under LAMBDA_MCP_CACHE_DIR/es_fields
+field_catalog = FieldCatalog()
+registry.on_reload(lambda config: setattr(field_catalog, "ttl", config.cache["es_field_ttl"]))
+
+# Previous results for query_elasticsearch_changes, persisted under LAMBDA_MCP_CACHE_DIR/result_diff
+diff_store = DiffStore()
+
+# Maximum concurrent requests of a fan-out query
+FANOUT_MAX_WORKERS = int(os.environ.get("LAMBDA_MCP_ES_FANOUT_MAX_WORKERS", "8"))
+
+
+def get_cluster_profiles():
+    """
+    Get named Kibana cluster profiles.
+
+    Profiles come from the [kibana.<name>] tables of the config file (LAMBDA_MCP_CONFIG) and from
+    LAMBDA_MCP_KIBANA_CLUSTERS, a JSON object mapping a name to {"url": ..., "username": ..., "password": ...}.
+    """
+    return registry.get().kibana
+
+
+def resolve_kibana(base_url, username, password):
+    """
+    Resolve a Kibana base URL or configured cluster name.
+
+    Credentials of a configured cluster are used when username/password are empty.
+
+    Returns:
+        Tuple of (base_url, username, password, cluster settings or None)
+    """
+    cluster = registry.get().kibana_cluster(base_url)
+    if cluster is None:
+        return base_url, username, password, None
+    return cluster["url"], username or cluster["username"], password or cluster["password"], cluster
+
+
+def resolve_clusters(clusters, username, password):
+    """Resolve comma-separated profile names or base URLs into cluster dicts."""
+    profiles = get_cluster_profiles()
+    resolved = []
+    for item in [c.strip() for c in clusters.split(",") if c.strip()]:
+        if item in profiles:
+            profile = profiles[item]
+            resolved.append({
+                "name": item,
+                "url": profile["url"],
+                "username": profile["username"] or username,
+                "password": profile["password"] or password,
+            })
+        elif "://" in item:
+            resolved.append({"name": item, "url": item, "username": username, "password": password})
+        else:
+            available = ", ".join(profiles.keys()) or "none configured"
+            raise ValueError(f"Unknown cluster '{item}'. Use a base URL or a profile name ({available})")
+    if not resolved:
+        raise ValueError("No clusters given")
+    return resolved
 
 
 def login(session, base_url, username, password):
@@ -19,7 +94,32 @@ def login(session, base_url, username, password):
     return True
 
 
-def query_es(session, base_url, path, query_json):
+def get_session(base_url, username, password, pool_size=None):
+    """Get a cached, logged-in Kibana session, logging in on first use."""
+    key = (base_url, username, hashlib.sha256(password.encode('utf-8')).hexdigest())
+    with _sessions_lock:
+        session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    session = requests.Session()
+    if pool_size:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    login(session, base_url, username, password)
+    with _sessions_lock:
+        return _sessions.setdefault(key, session)
+
+
+def drop_session(base_url, username, password):
+    """Drop a cached session, e.g. after an authentication failure."""
+    key = (base_url, username, hashlib.sha256(password.encode('utf-8')).hexdigest())
+    with _sessions_lock:
+        _sessions.pop(key, None)
+
+
+def query_es(session, base_url, path, query_json, timeout=None):
     """Query Elasticsearch via Kibana proxy."""
     url = base_url + '/api/console/proxy'
     params = {
@@ -29,7 +129,7 @@ def query_es(session, base_url, path, query_json):
     # For _cat endpoints, don't send query body
     data = '' if path.startswith('_cat') or path.startswith('/_cat') else query_json
     headers = {'Content-Type': 'application/json', 'kbn-xsrf': 'true'} if data else {'kbn-xsrf': 'true'}
-    response = session.post(url, params=params, data=data, headers=headers)
+    response = session.post(url, params=params, data=data, headers=headers, timeout=timeout)
     response.raise_for_status()
     # Try to parse as JSON, fallback to text
     try:
@@ -38,17 +138,88 @@ def query_es(session, base_url, path, query_json):
         return response.text
 
 
+def query_es_cached(base_url, username, password, path, query_json):
+    """
+    Query Elasticsearch over a cached session, logging in again once on 401.
+
+    base_url may be a configured cluster name; its credentials, pool size and timeout are then used.
+    Requests go through the admission limiter of the Kibana cluster.
+    """
+    base_url, username, password, cluster = resolve_kibana(base_url, username, password)
+    pool_size = cluster["pool_size"] if cluster else None
+    timeout = cluster["timeout"] if cluster else None
+    session = get_session(base_url, username, password, pool_size)
+    limiter = admission.limiter(f"elasticsearch:{base_url.rstrip('/')}")
+    try:
+        with limiter:
+            return query_es(session, base_url, path, query_json, timeout)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code != 401:
+            raise
+        # Cached credentials are no longer valid, log in again once
+        drop_session(base_url, username, password)
+        session = get_session(base_url, username, password, pool_size)
+        with limiter:
+            return query_es(session, base_url, path, query_json, timeout)
+
+
+def apply_jq(result, jq_query):
+    """Apply a jq filter to a result, returning all outputs as a list."""
+    try:
+        compiled_jq = jq.compile(jq_query)
+        return compiled_jq.input(result).all()
+    except Exception as e:
+        raise ValueError(f"Invalid jq query: {e}")
+
+
+def run_es_query(base_url, username, password, path, jq_query="", query="{}", fields="", pushdown=True):
+    """
+    Run an Elasticsearch query with projection pushdown and local jq filtering.
+
+    Returns:
+        The (filtered) query result as parsed JSON
+
+    Raises:
+        ValueError: If the query body or the jq filter is invalid
+        requests.exceptions.RequestException: If the request fails
+    """
+    try:
+        # Validate JSON query
+        json.loads(query)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in query: {e}")
+
+    # Push projection down to Elasticsearch
+    field_list = [f.strip() for f in fields.split(",") if f.strip()]
+    path, query, _ = apply_pushdown(path, query, jq_query if pushdown else "", field_list)
+
+    result = query_es_cached(base_url, username, password, path, query)
+
+    # Apply jq filter if provided
+    if jq_query:
+        result = apply_jq(result, jq_query)
+    return result
+
+
 def query_elasticsearch_via_kibana(
-    base_url: Annotated[str, "Kibana base URL (e.g., https://kibana.example.com)"],
-    username: Annotated[str, "Username for Kibana authentication, if no auth, use empty string"],
-    password: Annotated[str, "Password for Kibana authentication, if no auth, use empty string"],
+    base_url: Annotated[str, "Kibana base URL (e.g., https://kibana.example.com) or configured cluster name"],
+    username: Annotated[str, "Username for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    password: Annotated[str, "Password for Kibana authentication, empty string for no auth or the configured cluster credentials"],
     path: Annotated[str, "Elasticsearch query path (e.g., index/_search)"],
     jq_query: Annotated[str, "jq query to filter the result, if no filter, use empty string. You must use filter when the result is long. Example: .[] | select(.index | contains(\"myindex\"))"] = "",
-    query: Annotated[str, "JSON query body as string"] = "{}"
+    query: Annotated[str, "JSON query body as string"] = "{}",
+    fields: Annotated[str, "Comma-separated _source fields to fetch for _search requests, empty string for all"] = "",
+    pushdown: Annotated[bool, "Push the _source fields read by simple jq paths down to Elasticsearch as _source includes"] = True
 ) -> str:
     """
     Query Elasticsearch via Kibana proxy.
 
+    When pushdown is enabled and jq_query is a simple path expression (e.g. `.hits.hits[] | ._source.a, ._id`
+    or `.hits.hits[] | {a: ._source.a}`), the top-level `_source` fields it reads are sent as `_source`
+    includes of the `_search`, so other document fields are not transferred or decoded. Other jq expressions
+    fall back to fetching the full response. jq is always applied locally afterwards and returns the same
+    result as without pushdown.
+
     Returns:
         The query result as a JSON string, or a JSON object with file info if result is too large
 
@@ -63,34 +234,260 @@ def query_elasticsearch_via_kibana(
         )
     """
     try:
-        # Validate JSON query
-        json.loads(query)
+        result = run_es_query(base_url, username, password, path, jq_query, query, fields, pushdown)
+
+        # Handle large response using common utility
+        return handle_large_response(result)
+            
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Request error: {e}")
+
+def search_es_fields(
+    base_url: Annotated[str, "Kibana base URL (e.g., https://kibana.example.com) or configured cluster name"],
+    username: Annotated[str, "Username for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    password: Annotated[str, "Password for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    index_pattern: Annotated[str, "Index name or pattern (e.g., logs-*)"],
+    query: Annotated[str, "Text to match against field paths, empty string for all fields"] = "",
+    match: Annotated[str, "Match mode: 'prefix' or 'substring'"] = "substring",
+    refresh: Annotated[bool, "Rebuild the catalog from _mapping instead of using the cache"] = False,
+    limit: Annotated[int, "Maximum number of fields to return"] = 200
+) -> str:
+    """
+    Look up field names and types of an index pattern from a cached field catalog.
+
+    Use this instead of querying _mapping directly. The catalog is built from <index_pattern>/_mapping once,
+    flattened to field path -> type and merged across all matching indices, then cached per Kibana cluster
+    and index pattern for the es_field_ttl cache setting (default: LAMBDA_MCP_ES_FIELD_CACHE_TTL or 3600 seconds).
+
+    Returns:
+        JSON string with matching fields. Fields mapped with different types across indices
+        have their types joined with "|".
+
+    Example return:
+        {
+            "index_pattern": "logs-*",
+            "indices": 30,
+            "fetched_at": 1700000000.0,
+            "total_fields": 2,
+            "truncated": false,
+            "fields": {"user.id": "long", "user.name": "text", "user.name.keyword": "keyword"}
+        }
+
+    Example:
+        search_es_fields(
+            base_url="http://kibana.example.io",
+            username="user_name",
+            password="passwd",
+            index_pattern="logs-*",
+            query="user."
+        )
+    """
+    try:
+        def fetch_mapping():
+            return query_es_cached(base_url, username, password, f"{index_pattern}/_mapping", "")
+
+        catalog = field_catalog.get(resolve_kibana(base_url, username, password)[0], index_pattern, fetch_mapping, refresh=refresh)
+        matched = search_fields(catalog["fields"], query, match)
+        fields = dict(list(matched.items())[:limit]) if limit > 0 else matched
+
+        return handle_large_response({
+            "index_pattern": index_pattern,
+            "indices": catalog["indices"],
+            "fetched_at": catalog["fetched_at"],
+            "total_fields": len(matched),
+            "truncated": len(fields) < len(matched),
+            "fields": fields,
+        })
+
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Request error: {e}")
+
+def aggregate_es_composite(
+    base_url: Annotated[str, "Kibana base URL (e.g., https://kibana.example.com) or configured cluster name"],
+    username: Annotated[str, "Username for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    password: Annotated[str, "Password for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    index: Annotated[str, "Index name or pattern (e.g., logs-*)"],
+    query: Annotated[str, "JSON search body as string. Either contains a (nested) terms aggregation to rewrite, or only a query when group_by is used"] = "{}",
+    group_by: Annotated[str, "Comma-separated fields to group by; if set, aggregations in query are used as per-bucket metrics"] = "",
+    page_size: Annotated[int, "Buckets per composite page"] = 1000,
+    max_buckets: Annotated[int, "Stop after this many buckets, 0 for all"] = 0,
+    top_n: Annotated[int, "Number of largest buckets (by doc_count) to include in the summary"] = 20
+) -> str:
+    """
+    Retrieve all buckets of a high-cardinality grouping using a composite aggregation.
+
+    The terms aggregation (or group_by fields) is rewritten into a composite aggregation and paged with
+    after_key over one cached Kibana session, so no single request asks the cluster for all buckets at once.
+    Every bucket is streamed to a JSON Lines file; the response is a small summary with the file path.
+
+    Returns:
+        JSON string with bucket/page counts, total doc_count, completeness, the JSONL file path and top buckets
+
+    Example return:
+        {
+            "buckets": 183204,
+            "pages": 184,
+            "doc_count": 912345678,
+            "complete": true,
+            "path": "/tmp/tmpab12cd.jsonl",
+            "format": "jsonl",
+            "sources": ["shop_id"],
+            "top_buckets": [{"key": {"shop_id": 42}, "doc_count": 1200000}]
+        }
+
+    Example:
+        aggregate_es_composite(
+            base_url="http://kibana.example.io",
+            username="user_name",
+            password="passwd",
+            index="orders-*",
+            query="{\"query\": {\"range\": {\"ctime\": {\"gte\": \"now-1d\"}}}, \"aggs\": {\"by_shop\": {\"terms\": {\"field\": \"shop_id\"}}}}"
+        )
+    """
+    try:
+        body = json.loads(query)
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in query: {e}")
 
-    session = requests.Session()
+    if group_by:
+        composite = {
+            "sources": [{field.strip(): {"terms": {"field": field.strip()}}} for field in group_by.split(",") if field.strip()],
+            "aggs": body.get("aggs", body.get("aggregations", {})),
+            "size": page_size,
+        }
+    else:
+        composite = terms_to_composite(body, page_size)
+
+    path = f"{index}/_search"
 
     try:
-        login(session, base_url, username, password)
-        result = query_es(session, base_url, path, query)
-            
-        # Apply jq filter if provided
-        if jq_query:
-            try:
-                compiled_jq = jq.compile(jq_query)
-                filtered_result = compiled_jq.input(result).all()
-                result = filtered_result
-            except Exception as e:
-                raise ValueError(f"Invalid jq query: {e}")
-            
-        # Handle large response using common utility
-        return handle_large_response(result)
-            
+        def run_page(page_body):
+            return query_es_cached(base_url, username, password, path, page_body)
+
+        summary = stream_composite(run_page, body, composite, max_buckets=max_buckets, top_n=top_n)
+        return handle_large_response(summary)
+
     except requests.exceptions.RequestException as e:
         raise RuntimeError(f"Request error: {e}")
 
+def query_elasticsearch_changes(
+    base_url: Annotated[str, "Kibana base URL (e.g., https://kibana.example.com) or configured cluster name"],
+    username: Annotated[str, "Username for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    password: Annotated[str, "Password for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    path: Annotated[str, "Elasticsearch search path (e.g., index/_search)"],
+    jq_query: Annotated[str, "jq query producing the rows to compare, empty string to use hits.hits"] = "",
+    query: Annotated[str, "JSON query body as string"] = "{}",
+    key_field: Annotated[str, "Comma-separated fields identifying a row (dotted paths allowed), empty string to compare whole rows"] = "_id",
+    watermark_field: Annotated[str, "Monotonic document field (e.g., mtime) used to fetch only documents not older than the last run (requires key_field)"] = "",
+    reset: Annotated[bool, "Forget the previous result and start over"] = False
+) -> str:
+    """
+    Re-run an Elasticsearch search and return only the rows that changed since the last call with the same arguments.
+
+    Rows are the jq output (when it is a list) or the raw hits. They are matched by key_field (default: _id).
+    With watermark_field, a range filter `watermark_field >= last value` is added to the query so only new or
+    updated documents are fetched; documents at the last value are fetched again and matched by key_field, which
+    is therefore required. Deletions cannot be detected in that mode. For raw hits the watermark is read from
+    _source. The first call returns every row as inserted.
+
+    Returns:
+        JSON string with counts and the inserted, deleted and changed rows
+
+    Example:
+        query_elasticsearch_changes(
+            base_url="http://kibana.example.io",
+            username="user_name",
+            password="passwd",
+            path="tasks/_search",
+            query="{\"size\": 1000, \"query\": {\"term\": {\"status\": 1}}}",
+            watermark_field="mtime"
+        )
+    """
+    try:
+        body = json.loads(query)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in query: {e}")
+
+    keys = [field.strip() for field in key_field.split(",") if field.strip()]
+    check_watermark_keys(keys, watermark_field)
+    snapshot_id = DiffStore.snapshot_id("query_elasticsearch_via_kibana", {
+        "base_url": base_url, "path": path, "jq_query": jq_query, "query": body,
+        "key_field": keys, "watermark_field": watermark_field,
+    })
+    if reset:
+        diff_store.reset(snapshot_id)
+
+    # Push the watermark predicate down as a range filter
+    snapshot = diff_store.load(snapshot_id)
+    if watermark_field and snapshot and snapshot.get("watermark") is not None:
+        body = es_body_with_watermark(body, watermark_field, snapshot["watermark"])
+
+    try:
+        result = run_es_query(base_url, username, password, path, jq_query, json.dumps(body))
+        if isinstance(result, dict):
+            rows = result.get("hits", {}).get("hits", [])
+            watermark_path = f"_source.{watermark_field}" if watermark_field else ""
+        else:
+            rows = result if isinstance(result, list) else [result]
+            watermark_path = watermark_field
+
+        diff = diff_store.update(snapshot_id, rows, keys, watermark_path)
+        return handle_large_response(diff)
+
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Request error: {e}")
+
+def query_elasticsearch_multi(
+    clusters: Annotated[str, "Comma-separated Kibana base URLs or cluster profile names (from LAMBDA_MCP_KIBANA_CLUSTERS)"],
+    path: Annotated[str, "Elasticsearch query path (e.g., index/_search, index/_count)"],
+    jq_query: Annotated[str, "jq query applied to each cluster's result, if no filter, use empty string"] = "",
+    query: Annotated[str, "JSON query body as string"] = "{}",
+    username: Annotated[str, "Username for clusters given by URL or profiles without credentials"] = "",
+    password: Annotated[str, "Password for clusters given by URL or profiles without credentials"] = ""
+) -> str:
+    """
+    Run the same Elasticsearch request on several Kibana clusters concurrently and merge the results.
+
+    Each cluster is queried over its cached session in parallel, jq_query is applied per cluster, and the
+    results are merged: jq output rows and search hits are concatenated with a "_cluster" tag, hit totals
+    and _count results are summed, and bucket aggregations are merged by key (doc_count summed, per-cluster
+    counts kept). Per-cluster timing and errors are reported; one failing cluster does not fail the call.
+
+    Returns:
+        JSON string with "clusters" (name, took_ms, error) and the merged results
+
+    Example return:
+        {
+            "clusters": [{"cluster": "sg", "took_ms": 85.2}, {"cluster": "br", "took_ms": 140.7}],
+            "count": 1523
+        }
+
+    Example:
+        query_elasticsearch_multi(
+            clusters="sg,br,https://kibana.id.example.io",
+            path="orders-*/_count",
+            query="{\"query\": {\"term\": {\"status\": 4}}}"
+        )
+    """
+    try:
+        json.loads(query)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in query: {e}")
+
+    targets = resolve_clusters(clusters, username, password)
+
+    def run_one(cluster):
+        return run_es_query(cluster["url"], cluster["username"], cluster["password"], path, jq_query, query)
+
+    outcomes = run_fanout(targets, run_one, max_workers=FANOUT_MAX_WORKERS)
+    return handle_large_response(merge_results(outcomes))
+
 def register_elasticsearch_tool(mcp):
-    """Register Elasticsearch tool with MCP server."""
-    mcp.tool(query_elasticsearch_via_kibana)
+    """Register Elasticsearch tools with MCP server."""
+    mcp.tool(run_in_thread(profiled(query_elasticsearch_via_kibana)))
+    mcp.tool(run_in_thread(profiled(search_es_fields)))
+    mcp.tool(run_in_thread(profiled(aggregate_es_composite)))
+    mcp.tool(run_in_thread(profiled(query_elasticsearch_changes)))
+    mcp.tool(run_in_thread(profiled(query_elasticsearch_multi)))
 
 
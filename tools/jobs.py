@@ -0,0 +1,152 @@
+"""
+Background query job tools: submit long queries and poll for their results.
+"""
+import json
+from typing import Annotated
+from lib.cache_utils import get_cache_dir
+from lib.jobs import JobManager
+from lib.query_guard import QueryGuard
+from lib.response_utils import MAX_TOKEN_NUM, handle_large_response, paginate_by_tokens
+from lib.profiling import profiled
+from lib.dispatch import run_in_thread
+from tools.data_explorer import create_explorer
+from tools.elasticsearch import run_es_query
+
+# Shared job manager (LAMBDA_MCP_JOB_MAX_WORKERS workers, LAMBDA_MCP_JOB_MAX_PER_KEY per backend).
+# State is persisted under LAMBDA_MCP_CACHE_DIR/jobs so every server worker can answer job_status/job_result.
+job_manager = JobManager(state_dir=get_cache_dir("jobs"))
+
+
+def _run_data_explorer_query(env_name: str, dbname: str, sql: str, guard: bool):
+    """Execute a Data Explorer query on a worker thread."""
+    explorer = create_explorer(env_name)
+    if guard:
+        return QueryGuard(explorer).query_db(dbname, sql)
+    return explorer.query_db(dbname, sql)
+
+
+def submit_query(
+    env_name: Annotated[str, "Environment name (e.g., shopee_sg_test, shopee_sg_live, shopee_cn_live, tutid_live)"],
+    dbname: Annotated[str, "Database name to query"],
+    sql: Annotated[str, "SQL query string to execute"],
+    guard: Annotated[bool, "Enable query guardrails (see query_data_explorer)"] = False
+) -> str:
+    """
+    Submit a Data Explorer SQL query as a background job and return immediately.
+
+    Use this for long analytical queries instead of query_data_explorer. Poll with job_status and
+    fetch rows with job_result. Jobs run on a bounded worker pool with a per-environment queue.
+
+    Returns:
+        JSON string with the job id and its initial status
+
+    Example:
+        submit_query(
+            env_name="shopee_sg_test",
+            dbname="my_database",
+            sql="SELECT shop_id, COUNT(*) FROM orders GROUP BY shop_id"
+        )
+    """
+    try:
+        # Validate env name up front so bad requests fail synchronously
+        create_explorer(env_name)
+        job_id = job_manager.submit(
+            f"data_explorer:{env_name}",
+            f"{env_name}/{dbname}: {sql[:200]}",
+            _run_data_explorer_query, env_name, dbname, sql, guard,
+        )
+        return json.dumps(job_manager.status(job_id), indent=2)
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to submit query: {str(e)}")
+
+
+def submit_es_query(
+    base_url: Annotated[str, "Kibana base URL (e.g., https://kibana.example.com) or configured cluster name"],
+    username: Annotated[str, "Username for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    password: Annotated[str, "Password for Kibana authentication, empty string for no auth or the configured cluster credentials"],
+    path: Annotated[str, "Elasticsearch query path (e.g., index/_search)"],
+    jq_query: Annotated[str, "jq query to filter the result, if no filter, use empty string"] = "",
+    query: Annotated[str, "JSON query body as string"] = "{}"
+) -> str:
+    """
+    Submit an Elasticsearch query (see query_elasticsearch_via_kibana) as a background job.
+
+    Use this for big aggregations that would exceed client timeouts. Poll with job_status and
+    fetch the result with job_result. Jobs are queued per Kibana base URL.
+
+    Returns:
+        JSON string with the job id and its initial status
+    """
+    try:
+        json.loads(query)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in query: {e}")
+
+    job_id = job_manager.submit(
+        f"elasticsearch:{base_url}",
+        f"{base_url} {path}",
+        run_es_query, base_url, username, password, path, jq_query, query,
+    )
+    return json.dumps(job_manager.status(job_id), indent=2)
+
+
+def job_status(
+    job_id: Annotated[str, "Job id returned by submit_query or submit_es_query, empty string to list all jobs"] = ""
+) -> str:
+    """
+    Report the status of a background job (queued, running, succeeded, failed) or list all jobs.
+
+    Returns:
+        JSON string with status, timestamps, elapsed seconds, queue position and result row count
+
+    Example:
+        job_status(job_id="3f2a9c1e0b7d4e55")
+    """
+    try:
+        if not job_id:
+            return handle_large_response(job_manager.list())
+        return json.dumps(job_manager.status(job_id), indent=2)
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to get job status: {str(e)}")
+
+
+def job_result(
+    job_id: Annotated[str, "Job id returned by submit_query or submit_es_query"],
+    offset: Annotated[int, "Index of the first row to return (use next_offset from the previous page)"] = 0,
+    max_tokens: Annotated[int, "Token budget for this page"] = MAX_TOKEN_NUM
+) -> str:
+    """
+    Fetch the result of a finished background job.
+
+    List results are returned in pages that fit within max_tokens; continue with the returned
+    next_offset until it is null. Non-list results are returned whole (or as file info if too large).
+
+    Returns:
+        JSON string with {"job_id", "offset", "next_offset", "total", "items"} for list results
+
+    Example:
+        job_result(job_id="3f2a9c1e0b7d4e55", offset=0)
+    """
+    try:
+        result = job_manager.result(job_id)
+        # Guarded queries return {"guard": ..., "data": [...]}
+        if isinstance(result, dict) and isinstance(result.get("data"), list) and "guard" in result:
+            page = paginate_by_tokens(result["data"], offset, max_tokens)
+            return json.dumps({"job_id": job_id, "guard": result["guard"], **page}, ensure_ascii=False, indent=2)
+        if isinstance(result, list):
+            page = paginate_by_tokens(result, offset, max_tokens)
+            return json.dumps({"job_id": job_id, **page}, ensure_ascii=False, indent=2)
+        return handle_large_response(result, max_tokens)
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to get job result: {str(e)}")
+
+
+def register_jobs_tool(mcp):
+    """Register background job tools with MCP server."""
+    mcp.tool(run_in_thread(profiled(submit_query)))
+    mcp.tool(run_in_thread(profiled(submit_es_query)))
+    mcp.tool(run_in_thread(profiled(job_status)))
+    mcp.tool(run_in_thread(profiled(job_result)))
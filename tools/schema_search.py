@@ -0,0 +1,106 @@
+"""
+Schema search tool over all Data Explorer environments.
+"""
+from typing import Annotated
+from lib.response_utils import handle_large_response
+from lib.profiling import profiled
+from lib.dispatch import run_in_thread
+from lib.schema_index import SchemaIndex
+from lib.config import registry
+from tools.data_explorer import create_explorer
+
+# Shared schema index, persisted under LAMBDA_MCP_CACHE_DIR/schema_index
+schema_index = SchemaIndex()
+registry.on_reload(lambda config: setattr(schema_index, "ttl", config.cache["schema_index_ttl"]))
+
+
+def _resolve_env_names(env_name: str) -> list:
+    """Resolve an optional env name to the list of environments to use."""
+    env_names = registry.get().env_names()
+    if not env_name:
+        return env_names
+    if env_name not in env_names:
+        available_envs = ", ".join(env_names)
+        raise ValueError(f"Invalid env_name '{env_name}'. Available environments: {available_envs}")
+    return [env_name]
+
+
+def search_schema(
+    query: Annotated[str, "Search text matched against database, table and column names (e.g., shop_id)"],
+    env_name: Annotated[str, "Environment name to search, empty string for all environments"] = "",
+    kind: Annotated[str, "Restrict results to 'database', 'table' or 'column', empty string for all"] = "",
+    limit: Annotated[int, "Maximum number of results"] = 20
+) -> str:
+    """
+    Search the local schema index for databases, tables and columns.
+
+    The index covers every configured Data Explorer environment and is built in the background from
+    SHOW TABLES / SHOW CREATE TABLE, persisted to disk and refreshed incrementally once it is older
+    than the schema_index_ttl cache setting (default: LAMBDA_MCP_SCHEMA_INDEX_TTL or 86400 seconds). Lookups never hit the database.
+    If an environment has not been indexed yet, a background build is started and results for it
+    appear on later calls. After a failed build (e.g. missing credentials) it is retried only after
+    LAMBDA_MCP_SCHEMA_INDEX_RETRY_INTERVAL seconds; refresh_schema_index retries immediately.
+
+    Returns:
+        JSON string with ranked results and the index status per environment
+
+    Example return:
+        {
+            "results": [
+                {"kind": "column", "env": "shopee_sg_test", "db": "order_db", "table": "orders",
+                 "column": "shop_id", "type": "bigint unsigned", "score": 115}
+            ],
+            "status": {"shopee_sg_test": {"updated_at": 1700000000.0, "databases": 12, "refreshing": false, "error": null}}
+        }
+
+    Example:
+        search_schema(query="shop_id", kind="column")
+    """
+    try:
+        if kind not in ("", "database", "table", "column"):
+            raise ValueError(f"Invalid kind '{kind}'. Use 'database', 'table', 'column' or empty string")
+        env_names = _resolve_env_names(env_name)
+
+        # Kick off background refresh for missing or stale environments
+        for name in env_names:
+            if schema_index.is_stale(name):
+                schema_index.refresh_in_background(name, create_explorer)
+
+        results = schema_index.search(query, env_names, kind=kind, limit=limit)
+        status = {name: info for name, info in schema_index.status().items() if name in env_names}
+        return handle_large_response({"results": results, "status": status})
+
+    except Exception as e:
+        raise RuntimeError(f"Schema search failed: {str(e)}")
+
+
+def refresh_schema_index(
+    env_name: Annotated[str, "Environment name to refresh, empty string for all environments"] = "",
+    force: Annotated[bool, "Re-fetch the DDL of every table instead of only new or stale ones"] = False
+) -> str:
+    """
+    Start a background refresh of the schema index.
+
+    Returns:
+        JSON string with the environments for which a refresh was started and the index status
+
+    Example:
+        refresh_schema_index(env_name="shopee_sg_test")
+    """
+    try:
+        env_names = _resolve_env_names(env_name)
+        started = [
+            name for name in env_names
+            if schema_index.refresh_in_background(name, create_explorer, force=force)
+        ]
+        status = {name: info for name, info in schema_index.status().items() if name in env_names}
+        return handle_large_response({"started": started, "status": status})
+
+    except Exception as e:
+        raise RuntimeError(f"Failed to refresh schema index: {str(e)}")
+
+
+def register_schema_search_tool(mcp):
+    """Register schema search tools with MCP server."""
+    mcp.tool(run_in_thread(profiled(search_schema)))
+    mcp.tool(run_in_thread(profiled(refresh_schema_index)))